@@ -6,6 +6,11 @@ from tqdm import tqdm
 from ultralytics import YOLO
 import subprocess
 import time
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "utils"))
+from roi_merge import merge_overlapping_rois
+
 # ==============================
 # YUV Reader
 # ==============================
@@ -95,44 +100,6 @@ def mask_to_bboxes(mask, min_area):
             rois.append((x, y, x+w, y+h))
     return rois
 
-def overlap(a, b):
-    return not (
-        a[2] <= b[0] or  # A bên trái B
-        a[0] >= b[2] or  # A bên phải B
-        a[3] <= b[1] or  # A phía trên B
-        a[1] >= b[3]     # A phía dưới B
-    )
-
-def merge_two_boxes(a, b):
-    return (
-        min(a[0], b[0]),
-        min(a[1], b[1]),
-        max(a[2], b[2]),
-        max(a[3], b[3])
-    )
-def merge_overlapping_rois(rois):
-    rois = rois.copy()
-    merged = True
-
-    while merged:
-        merged = False
-        result = []
-
-        while rois:
-            current = rois.pop(0)
-            i = 0
-            while i < len(rois):
-                if overlap(current, rois[i]):
-                    current = merge_two_boxes(current, rois[i])
-                    rois.pop(i)
-                    merged = True
-                else:
-                    i += 1
-            result.append(current)
-
-        rois = result
-
-    return rois
 def round_up_32(x):
     return (x + 31) // 32 * 32
 # ==============================
@@ -1,10 +1,15 @@
 import os
+import sys
 import argparse
 import numpy as np
 import cv2
 from tqdm import tqdm
 from ultralytics import YOLO
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "utils"))
+from roi_motion import motion_roi
+from roi_merge import merge_overlapping_rois
+
 # ==============================
 # PNG Reader
 # ==============================
@@ -22,36 +27,6 @@ def read_png_frame_rgb(frame_path):
     return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
 
-# ==============================
-# Motion-based ROI
-# ==============================
-def motion_roi(prev, curr, block, th):
-    diff = cv2.absdiff(curr, prev)
-    h, w = diff.shape
-
-    mh = h // block
-    mw = w // block
-    motion_map = np.zeros((mh, mw), np.float32)
-
-    for by in range(mh):
-        for bx in range(mw):
-            blk = diff[
-                by * block:(by + 1) * block,
-                bx * block:(bx + 1) * block
-            ]
-            motion_map[by, bx] = np.mean(blk)
-
-    mask = (motion_map > th).astype(np.uint8)
-    mask = cv2.morphologyEx(
-        mask,
-        cv2.MORPH_CLOSE,
-        np.ones((3, 3), np.uint8)
-    )
-
-    mask = cv2.resize(mask, (w, h), interpolation=cv2.INTER_NEAREST)
-    return mask
-
-
 # ==============================
 # Saliency (Spectral Residual)
 # ==============================
@@ -101,47 +76,6 @@ def mask_to_bboxes(mask, min_area):
     return rois
 
 
-def overlap(a, b):
-    return not (
-        a[2] <= b[0] or
-        a[0] >= b[2] or
-        a[3] <= b[1] or
-        a[1] >= b[3]
-    )
-
-
-def merge_two_boxes(a, b):
-    return (
-        min(a[0], b[0]),
-        min(a[1], b[1]),
-        max(a[2], b[2]),
-        max(a[3], b[3])
-    )
-
-
-def merge_overlapping_rois(rois):
-    rois = rois.copy()
-    merged = True
-
-    while merged:
-        merged = False
-        result = []
-
-        while rois:
-            current = rois.pop(0)
-            i = 0
-            while i < len(rois):
-                if overlap(current, rois[i]):
-                    current = merge_two_boxes(current, rois[i])
-                    rois.pop(i)
-                    merged = True
-                else:
-                    i += 1
-            result.append(current)
-
-        rois = result
-
-    return rois
 
 
 # ==============================
@@ -1,4 +1,5 @@
 import os
+import sys
 import argparse
 import time
 import subprocess
@@ -7,6 +8,10 @@ import cv2
 from tqdm import tqdm
 from ultralytics import YOLO
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "utils"))
+from roi_motion import motion_roi
+from roi_merge import merge_overlapping_rois
+
 # ==============================
 # FFmpeg extract frames
 # ==============================
@@ -39,27 +44,6 @@ def read_rgb_img(path):
     return cv2.imread(path, cv2.IMREAD_COLOR)[:, :, ::-1]
 
 
-# ==============================
-# Motion-based ROI
-# ==============================
-def motion_roi(prev, curr, block, th):
-    diff = cv2.absdiff(curr, prev)
-    h, w = diff.shape
-
-    mh, mw = h // block, w // block
-    motion_map = np.zeros((mh, mw), np.float32)
-
-    for y in range(mh):
-        for x in range(mw):
-            blk = diff[y*block:(y+1)*block, x*block:(x+1)*block]
-            motion_map[y, x] = np.mean(blk)
-
-    mask = (motion_map > th).astype(np.uint8)
-    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((3,3), np.uint8))
-    mask = cv2.resize(mask, (w, h), interpolation=cv2.INTER_NEAREST)
-    return mask
-
-
 # ==============================
 # Saliency (Spectral Residual)
 # ==============================
@@ -96,31 +80,6 @@ def mask_to_bboxes(mask, min_area):
             rois.append((x, y, x+w, y+h))
     return rois
 
-def overlap(a, b):
-    return not (a[2] <= b[0] or a[0] >= b[2] or a[3] <= b[1] or a[1] >= b[3])
-
-def merge_two_boxes(a, b):
-    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
-
-def merge_overlapping_rois(rois):
-    rois = rois.copy()
-    merged = True
-    while merged:
-        merged = False
-        result = []
-        while rois:
-            cur = rois.pop(0)
-            i = 0
-            while i < len(rois):
-                if overlap(cur, rois[i]):
-                    cur = merge_two_boxes(cur, rois[i])
-                    rois.pop(i)
-                    merged = True
-                else:
-                    i += 1
-            result.append(cur)
-        rois = result
-    return rois
 
 
 # ==============================
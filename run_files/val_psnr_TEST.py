@@ -2,6 +2,13 @@ import torch
 import numpy as np
 import os
 import re
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "utils"))
+from yuv_reader import YUVReader
+from eval_runner import enumerate_jobs, run_jobs_cached
+from metric_cache import MetricCache, DEFAULT_CACHE_FILE
+from roi_container import ROI_EXT, open_rois
 
 # --- CONFIG ---
 INPUT_DIR = "./input_yuv/class_B"
@@ -9,6 +16,8 @@ OUTPUT_ROOT = "./output"
 ROI_DIR = "./roi/yolov5"
 REPORT_FILE = "psnr_3_7_results.txt"
 TARGET_QPS = [22, 27, 32, 37, 42, 47]
+NUM_WORKERS = None  # worker processes for (method, QP, sequence) jobs; None = all cores
+CACHE_FILE = DEFAULT_CACHE_FILE  # results reused until an input file changes
 
 # --------------------------------------------------
 def parse_res(name):
@@ -16,22 +25,25 @@ def parse_res(name):
     return (int(m.group(1)), int(m.group(2))) if m else (1920, 1080)
 
 # --------------------------------------------------
-def load_roi_mask(roi_file, h, w):
+def rois_to_mask(rois, h, w):
     mask = np.zeros((h, w), dtype=np.bool_)
 
+    for x1, y1, x2, y2 in rois:
+        x1 = max(0, int(x1))
+        y1 = max(0, int(y1))
+        x2 = min(w, int(x2))
+        y2 = min(h, int(y2))
+        mask[y1:y2, x1:x2] = True
+
+    return mask
+
+def load_roi_mask(roi_file, h, w):
     if not os.path.exists(roi_file):
-        return mask
+        return np.zeros((h, w), dtype=np.bool_)
 
     with open(roi_file, "r") as f:
-        for line in f:
-            x1, y1, x2, y2 = map(int, line.strip().split(","))
-            x1 = max(0, x1)
-            y1 = max(0, y1)
-            x2 = min(w, x2)
-            y2 = min(h, y2)
-            mask[y1:y2, x1:x2] = True
-
-    return mask
+        rois = [map(int, line.strip().split(",")[:4]) for line in f]
+        return rois_to_mask(rois, h, w)
 
 # --------------------------------------------------
 def psnr_masked(a, b, mask):
@@ -49,26 +61,59 @@ def psnr_masked(a, b, mask):
 
 # --------------------------------------------------
 def read_y_only(path, w, h):
-    frame_size = w * h * 3 // 2
-    y_size = w * h
+    reader = YUVReader(path, w, h)
+    return reader.y_range(0, len(reader)), len(reader)
+
+# --------------------------------------------------
+def evaluate_job(job):
+    method, qp, fname, dec_path = job
+    w, h = parse_res(fname)
+
+    oy, n1 = read_y_only(os.path.join(INPUT_DIR, fname), w, h)
+    dy, n2 = read_y_only(dec_path, w, h)
+    n = min(n1, n2)
+
+    roi_root = os.path.join(ROI_DIR, os.path.splitext(fname)[0])
+    # <seq>.roi container if present, else frame_XXXX_roi.txt files
+    container = open_rois(roi_root)
+
+    roi_vals, nonroi_vals = [], []
+
+    for i in range(n):
+        if container is not None:
+            mask = torch.from_numpy(rois_to_mask(container.boxes(i), h, w))
+        else:
+            roi_file = os.path.join(roi_root, f"frame_{i:04d}_roi.txt")
+            mask = torch.from_numpy(load_roi_mask(roi_file, h, w))
+
+        o = torch.from_numpy(oy[i].astype(np.float32))
+        d = torch.from_numpy(dy[i].astype(np.float32))
 
-    raw = np.fromfile(path, dtype=np.uint8)
-    n_frames = raw.size // frame_size
-    raw = raw.reshape(n_frames, frame_size)
+        r = psnr_masked(o, d, mask)
+        nr = psnr_masked(o, d, ~mask)
 
-    Y = raw[:, :y_size].reshape(n_frames, h, w)
-    return torch.from_numpy(Y).float(), n_frames
+        if not np.isnan(r):
+            roi_vals.append(r)
+        if not np.isnan(nr):
+            nonroi_vals.append(nr)
+
+    return float(np.mean(roi_vals)), float(np.mean(nonroi_vals))
+
+def job_paths(job):
+    # files the cached result depends on
+    roi_root = os.path.join(ROI_DIR, os.path.splitext(job[2])[0])
+    if os.path.exists(roi_root + ROI_EXT):
+        roi_root += ROI_EXT
+    return [job[3], os.path.join(INPUT_DIR, job[2]), roi_root]
 
 # --------------------------------------------------
 def main():
-    methods = sorted(
-        d for d in os.listdir(OUTPUT_ROOT)
-        if os.path.isdir(os.path.join(OUTPUT_ROOT, d))
-    )
+    methods, jobs = enumerate_jobs(OUTPUT_ROOT, TARGET_QPS, ".yuv")
+    jobs = [j for j in jobs if os.path.exists(os.path.join(INPUT_DIR, j[2]))]
 
     summary = {m: {qp: [] for qp in TARGET_QPS} for m in methods}
 
-    with open(REPORT_FILE, "w") as f:
+    with open(REPORT_FILE, "w") as f, MetricCache(CACHE_FILE) as cache:
         header = (
             f"{'Method':<10} | {'Sequence':<25} | {'QP':<4} | "
             f"{'ROI-Y':<8} | {'nonROI-Y':<10} | {'AVG(0.7/0.3)':<12}"
@@ -77,49 +122,21 @@ def main():
         f.write(header + "\n")
         f.write("-" * 90 + "\n")
 
-        for method in methods:
-            for qp in TARGET_QPS:
-                qp_dir = os.path.join(OUTPUT_ROOT, method, f"qp{qp}")
-                if not os.path.exists(qp_dir):
-                    continue
-
-                for fname in sorted(x for x in os.listdir(qp_dir) if x.endswith(".yuv")):
-                    w, h = parse_res(fname)
-
-                    oy, n1 = read_y_only(os.path.join(INPUT_DIR, fname), w, h)
-                    dy, n2 = read_y_only(os.path.join(qp_dir, fname), w, h)
-                    n = min(n1, n2)
-
-                    roi_root = os.path.join(ROI_DIR, os.path.splitext(fname)[0])
-
-                    roi_vals, nonroi_vals = [], []
-
-                    for i in range(n):
-                        roi_file = os.path.join(roi_root, f"frame_{i:04d}_roi.txt")
-                        mask = torch.from_numpy(load_roi_mask(roi_file, h, w))
-
-                        r = psnr_masked(oy[i], dy[i], mask)
-                        nr = psnr_masked(oy[i], dy[i], ~mask)
-
-                        if not np.isnan(r):
-                            roi_vals.append(r)
-                        if not np.isnan(nr):
-                            nonroi_vals.append(nr)
-
-                    roi_psnr = np.mean(roi_vals)
-                    nonroi_psnr = np.mean(nonroi_vals)
-
-                    # ✅ WEIGHT AFTER AVERAGING (CORRECT)
-                    avg_psnr = 0.7 * roi_psnr + 0.3 * nonroi_psnr
-
-                    line = (
-                        f"{method:<10} | {fname[:25]:<25} | {qp:<4} | "
-                        f"{roi_psnr:8.2f} | {nonroi_psnr:10.2f} | {avg_psnr:12.2f}"
-                    )
-                    print(line)
-                    f.write(line + "\n")
-
-                    summary[method][qp].append(avg_psnr)
+        for (method, qp, fname, _), (roi_psnr, nonroi_psnr) in run_jobs_cached(
+            evaluate_job, jobs, cache, "psnr_roi_masked", {"roi_dir": ROI_DIR},
+            job_paths, workers=NUM_WORKERS
+        ):
+            # ✅ WEIGHT AFTER AVERAGING (CORRECT)
+            avg_psnr = 0.7 * roi_psnr + 0.3 * nonroi_psnr
+
+            line = (
+                f"{method:<10} | {fname[:25]:<25} | {qp:<4} | "
+                f"{roi_psnr:8.2f} | {nonroi_psnr:10.2f} | {avg_psnr:12.2f}"
+            )
+            print(line)
+            f.write(line + "\n")
+
+            summary[method][qp].append(avg_psnr)
 
         # ---------------- SUMMARY ----------------
         f.write("\n" + "=" * 90 + "\n")
@@ -48,7 +48,7 @@ def read_rois_from_txt(txt_path):
             line = line.strip()
             if not line:
                 continue
-            x1, y1, x2, y2 = map(int, line.split(','))
+            x1, y1, x2, y2 = map(int, line.split(',')[:4])
             rois.append((x1, y1, x2, y2))
     return rois
 import cv2
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "utils"))
+from roi_merge import merge_overlapping_rois, merge_overlapping_rois_ref
+
+
+# ==============================
+# Benchmark: sweep-line merge vs repeated-pass reference
+# ==============================
+def synthetic_boxes(n, width, height, max_size, rng):
+    """n random boxes of up to max_size px, like mask components on a frame."""
+    x1 = rng.integers(0, width, n)
+    y1 = rng.integers(0, height, n)
+    w = rng.integers(1, max_size + 1, n)
+    h = rng.integers(1, max_size + 1, n)
+    return [
+        (int(a), int(b), int(min(a + c, width)), int(min(b + d, height)))
+        for a, b, c, d in zip(x1, y1, w, h)
+    ]
+
+
+def time_ms(fn, rois, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        out = fn(rois)
+    return (time.perf_counter() - start) / repeat * 1000, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=str, default="10,100,1000,10000")
+    ap.add_argument("--width", type=int, default=1920)
+    ap.add_argument("--height", type=int, default=1080)
+    ap.add_argument("--max_sizes", type=str, default="48,200,400",
+                    help="max box side in pixels, one table each; the larger "
+                         "sizes are dense sets where most boxes overlap")
+    ap.add_argument("--ref_limit", type=int, default=2000,
+                    help="skip the reference above this many boxes (0 = never)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for max_size in map(int, args.max_sizes.split(",")):
+        print(f"\n{args.width}x{args.height}, boxes up to {max_size}px")
+        print(f"{'boxes':>7} | {'merged':>7} | {'ref ms':>9} | {'sweep ms':>9} | {'speedup':>8} | same")
+        print("-" * 62)
+
+        for n in map(int, args.sizes.split(",")):
+            rois = synthetic_boxes(n, args.width, args.height, max_size, rng)
+            repeat = max(1, 1000 // n)
+
+            fast_ms, fast = time_ms(merge_overlapping_rois, rois, repeat)
+            if args.ref_limit and n > args.ref_limit:
+                print(f"{n:7d} | {len(fast):7d} | {'-':>9} | {fast_ms:9.3f} | {'-':>8} | -")
+                continue
+
+            ref_ms, ref = time_ms(merge_overlapping_rois_ref, rois, repeat)
+            print(
+                f"{n:7d} | {len(fast):7d} | {ref_ms:9.3f} | {fast_ms:9.3f} | "
+                f"{ref_ms / fast_ms:8.2f} | {'yes' if ref == fast else 'NO'}"
+            )
+
+
+if __name__ == "__main__":
+    main()
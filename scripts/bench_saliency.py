@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "utils"))
+from yuv_reader import YUVReader
+from roi_saliency import spectral_residual, SpectralResidual, saliency_mask
+
+
+# ==============================
+# Benchmark: fast SR vs full-resolution reference
+# ==============================
+def mask_iou(a, b):
+    union = np.count_nonzero(a | b)
+    if union == 0:
+        return 1.0
+    return np.count_nonzero(a & b) / union
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("input", help="YUV420p sequence, name_WxH_N.yuv")
+    ap.add_argument("--frames", type=int, default=20)
+    ap.add_argument("--t_saliency", type=float, default=0.15)
+    ap.add_argument("--widths", type=str, default="0,960,640,320,128,64",
+                    help="working widths to test (0 = full resolution)")
+    args = ap.parse_args()
+
+    name = os.path.basename(args.input).split(".")[0]
+    _, wxh, _ = name.split("_")
+    w, h = map(int, wxh.split("x"))
+
+    reader = YUVReader(args.input, w, h, args.frames)
+    frames = [reader.y(i) for i in range(len(reader))]
+
+    # reference masks (original float64 complex-FFT path)
+    start = time.perf_counter()
+    ref_masks = [saliency_mask(spectral_residual(y), args.t_saliency) for y in frames]
+    ref_ms = (time.perf_counter() - start) / len(frames) * 1000
+
+    print(f"{name}: {len(frames)} frames, threshold {args.t_saliency}")
+    print(f"{'work size':<12} | {'FFT size':<12} | {'ms/frame':>9} | {'speedup':>8} | {'ROI IoU':>8}")
+    print("-" * 62)
+    print(f"{'reference':<12} | {f'{w}x{h}':<12} | {ref_ms:9.2f} | {1.0:8.2f} | {1.0:8.3f}")
+
+    for ww in map(int, args.widths.split(",")):
+        sr = SpectralResidual(w, h, ww)
+        sr(frames[0])   # warm up FFT plan cache
+
+        start = time.perf_counter()
+        sals = [sr(y) for y in frames]
+        ms = (time.perf_counter() - start) / len(frames) * 1000
+
+        iou = np.mean([
+            mask_iou(saliency_mask(s, args.t_saliency), m)
+            for s, m in zip(sals, ref_masks)
+        ])
+        print(
+            f"{f'{sr.work_w}x{sr.work_h}':<12} | {f'{sr.fft_w}x{sr.fft_h}':<12} | "
+            f"{ms:9.2f} | {ref_ms / ms:8.2f} | {iou:8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
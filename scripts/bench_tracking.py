@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "utils"))
+from yuv_reader import YUVReader
+from roi_merge import merge_overlapping_rois
+from roi_track import BoxTracker, detect_and_track
+from roi_qgmap import qg_grid
+from extract_roi import read_yuv420_frame, yolo_boxes, round_up_32, roi_weights
+from ultralytics import YOLO
+
+
+# ==============================
+# Benchmark: detect every K frames + tracking vs per-frame detection
+# ==============================
+#   python scripts/bench_tracking.py input_yuv/class_B --roi_method yolov8 --ks 1,2,3,5,10
+#
+# The detector runs once on every frame; those boxes are the reference and
+# also stand in for the detector calls of the tracked runs (the detector
+# is deterministic), so each K only costs its tracking time. ms/frame of a
+# K is tracking time + detector calls * measured detector ms.
+def box_mask(boxes, w, h, qg=1):
+    """Union of the boxes as a binary mask, at pixel or QG resolution."""
+    rows, cols = qg_grid(w, h, qg) if qg > 1 else (h, w)
+    m = np.zeros((rows, cols), bool)
+    for x1, y1, x2, y2 in boxes:
+        m[y1 // qg:-(-y2 // qg), x1 // qg:-(-x2 // qg)] = True
+    return m
+
+
+def mask_iou(a, b):
+    union = np.count_nonzero(a | b)
+    if union == 0:
+        return 1.0
+    return np.count_nonzero(a & b) / union
+
+
+def reference_boxes(reader, model, imgsz):
+    """Per-frame detector boxes and detector ms/frame (colour conversion included)."""
+    boxes = []
+    start = time.perf_counter()
+    for idx in range(len(reader)):
+        rgb, _ = read_yuv420_frame(reader, idx)
+        rois = []
+        for r in model(rgb, imgsz=imgsz, conf=0.25, iou=0.5, half=True, verbose=False):
+            rois.extend(yolo_boxes(r))
+        boxes.append(merge_overlapping_rois(rois))
+    return boxes, (time.perf_counter() - start) / max(len(reader), 1) * 1000
+
+
+def bench_sequence(path, args, model):
+    name = os.path.basename(path).split(".")[0]
+    _, wxh, _ = name.split("_")
+    w, h = map(int, wxh.split("x"))
+
+    with YUVReader(path, w, h, args.frames or None) as reader:
+        imgsz = [round_up_32(w), round_up_32(h)] if args.fullresol else 640
+        ref, det_ms = reference_boxes(reader, model, imgsz)
+        n = len(ref)
+        ref_px = [box_mask(b, w, h) for b in ref]
+        ref_qg = [box_mask(b, w, h, args.qg_size) for b in ref]
+
+        print(f"\n{name}: {n} frames, detector {det_ms:.2f} ms/frame")
+        print(f"{'K':>4} | {'detections':>10} | {'ms/frame':>9} | {'fps':>8} | "
+              f"{'cost':>6} | {'ROI IoU':>8} | {'QG IoU':>7} | {'min IoU':>7}")
+        print("-" * 82)
+
+        for k in map(int, args.ks.split(",")):
+            tracker = BoxTracker(w, h, args.track_scale, args.track_search, args.track_err,
+                                 args.block, args.t_motion, args.track_new_motion)
+            luma = ((idx, reader.y(idx)) for idx in range(n))
+
+            start = time.perf_counter()
+            out = list(detect_and_track(luma, lambda i: (ref[i], None), tracker, k))
+            track_ms = (time.perf_counter() - start) * 1000
+
+            detections = sum(d for _, _, _, d in out)
+            ms = (track_ms + detections * det_ms) / n
+            ious = [mask_iou(box_mask(b, w, h), ref_px[i]) for i, b, _, _ in out]
+            qg_ious = [mask_iou(box_mask(b, w, h, args.qg_size), ref_qg[i]) for i, b, _, _ in out]
+            print(f"{k:4d} | {detections:4d}/{n:<5d} | {ms:9.2f} | {1000 / ms:8.2f} | "
+                  f"{ms / det_ms:5.2f}x | {np.mean(ious):8.3f} | {np.mean(qg_ious):7.3f} | "
+                  f"{np.min(ious):7.3f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Detector cost and ROI IoU of --detect_every K")
+    ap.add_argument("input", help="YUV420p sequence (name_WxH_N.yuv) or a directory of them")
+    ap.add_argument("--roi_method", default="yolov8",
+                    choices=["yolov5", "yolov8", "yolov9", "yolov10", "yolov11"])
+    ap.add_argument("--openvino", type=int, default=1)
+    ap.add_argument("--fullresol", type=int, default=0)
+    ap.add_argument("--frames", type=int, default=0, help="frames per sequence (0 = all)")
+    ap.add_argument("--ks", type=str, default="1,2,3,5,8,10")
+    ap.add_argument("--qg_size", type=int, default=16)
+    # tracker, as extract_roi.py
+    ap.add_argument("--block", type=int, default=32)
+    ap.add_argument("--t_motion", type=float, default=35.0)
+    ap.add_argument("--track_scale", type=int, default=4)
+    ap.add_argument("--track_search", type=int, default=16)
+    ap.add_argument("--track_err", type=float, default=0.25)
+    ap.add_argument("--track_new_motion", type=float, default=0.005)
+    args = ap.parse_args()
+
+    args.sal_width = 0
+    args.keep_alive, args.ema, args.qg_hold = 0, 1.0, 0
+    _, weights = roi_weights(args)
+    model = YOLO(weights, task="detect")
+
+    paths = [args.input]
+    if os.path.isdir(args.input):
+        paths = [os.path.join(args.input, f) for f in sorted(os.listdir(args.input))]
+    for path in paths:
+        bench_sequence(path, args, model)
+
+
+if __name__ == "__main__":
+    main()
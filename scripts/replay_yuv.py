@@ -0,0 +1,123 @@
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "utils"))
+from yuv_reader import YUVReader
+from roi_container import ROIContainer, read_roi_dir, pack_stream_packet
+
+
+# ==============================
+# Live-source stand-in: replay a YUV file (+ ROIs) at a fixed frame rate
+# ==============================
+#   interleaved, one stream:
+#     python scripts/replay_yuv.py --input seq.yuv --rois roi/motion/seq.roi --fps 30 \
+#       | ./roi_x265 --input - --framed 1 --output - --tune zerolatency ... > out.hevc
+#   split, raw frames on stdout and ROI packets on a FIFO:
+#     mkfifo /tmp/rois
+#     python scripts/replay_yuv.py --input seq.yuv --rois roi/motion/seq --mode split --roi_pipe /tmp/rois \
+#       | ./roi_x265 --input - --roi-stream /tmp/rois --output - ... > out.hevc
+def load_rois(path, num_frames):
+    """
+    frame -> (box list, weights or None) from a .roi container (its scores)
+    or a frame_XXXX_roi.txt directory (its fifth column).
+    """
+    if not path:
+        return lambda idx: ([], None)
+    if path.endswith(".roi"):
+        container = ROIContainer(path)
+        return lambda idx: (container[idx], container.scores(idx))
+    frames, weights = read_roi_dir(path, num_frames, weights=True)
+
+    def read(idx):
+        if idx >= len(frames):
+            return [], None
+        return frames[idx], None if weights is None else weights[idx]
+    return read
+
+
+def seq_size(path):
+    m = re.search(r"_(\d+)x(\d+)", os.path.basename(path))
+    return (int(m.group(1)), int(m.group(2))) if m else (None, None)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay a YUV file as a live roi_x265 input")
+    ap.add_argument("--input", required=True)
+    ap.add_argument("--width", type=int, default=0, help="default: from the file name")
+    ap.add_argument("--height", type=int, default=0)
+    ap.add_argument("--fps", type=float, default=30.0, help="0 = as fast as the reader takes it")
+    ap.add_argument("--frames", type=int, default=0, help="stop after this many frames (0 = all)")
+    ap.add_argument("--loop", type=int, default=1, help="play the file this many times")
+    ap.add_argument("--rois", default="", help="<seq>.roi container or frame_XXXX_roi.txt directory")
+    ap.add_argument("--mode", choices=["interleaved", "split"], default="interleaved")
+    ap.add_argument("--out", default="-", help="YUV / packet output: - for stdout, or a FIFO path")
+    ap.add_argument("--roi_pipe", default="", help="ROI packet FIFO for --mode split")
+    args = ap.parse_args()
+
+    w, h = seq_size(args.input)
+    w, h = args.width or w, args.height or h
+    if not w or not h:
+        ap.error("--width/--height needed, the file name has no WxH")
+    if args.mode == "split" and not args.roi_pipe:
+        ap.error("--mode split needs --roi_pipe")
+
+    with YUVReader(args.input, w, h) as yuv:
+        n = len(yuv)
+        rois = load_rois(args.rois, n)
+        total = n * args.loop
+        if args.frames:
+            total = min(total, args.frames)
+
+        # the encoder opens the ROI FIFO before it reads a frame, so open
+        # it first or both ends wait on each other
+        roi_out = open(args.roi_pipe, "wb") if args.mode == "split" else None
+        out = sys.stdout.buffer if args.out == "-" else open(args.out, "wb")
+
+        period = 1.0 / args.fps if args.fps > 0 else 0.0
+        late, max_late = 0, 0.0
+        start = time.perf_counter()
+        sent = 0
+        try:
+            for i in range(total):
+                due = start + i * period
+                now = time.perf_counter()
+                if now < due:
+                    time.sleep(due - now)
+                elif period and now - due > period:
+                    # the consumer held us up by more than a frame
+                    late += 1
+                    max_late = max(max_late, now - due)
+
+                boxes, weights = rois(i % n)
+                frame = yuv.frame(i % n)
+                if roi_out is not None:
+                    roi_out.write(pack_stream_packet(i, boxes, weights))
+                    roi_out.flush()
+                    out.write(memoryview(frame).cast("B"))
+                else:
+                    out.write(pack_stream_packet(i, boxes, weights, yuv=frame))
+                out.flush()
+                sent += 1
+        except BrokenPipeError:
+            pass
+        finally:
+            for f in (roi_out, out):
+                if f is not None and f is not sys.stdout.buffer:
+                    try:
+                        f.close()
+                    except BrokenPipeError:
+                        pass
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"replayed {sent} frames in {elapsed:.2f}s ({sent / max(elapsed, 1e-9):.2f} fps), "
+        f"{late} late by > 1 frame (max {max_late * 1000:.1f} ms)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,13 @@ import torch
 import numpy as np
 import os
 import re
+import sys
+import contextlib
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "utils"))
+from yuv_reader import open_yuv
+from eval_runner import enumerate_jobs, run_jobs_cached
+from metric_cache import MetricCache, DEFAULT_CACHE_FILE
 
 # --- CONFIGURATION ---
 INPUT_DIR = "./input_yuv/class_B"
@@ -10,64 +17,31 @@ REPORT_FILE__PATH = "./results/psnr_results_preset.txt"
 REPORT_FILE = "psnr_results_preset.txt"
 TARGET_QPS = [22, 27, 32, 37, 42, 47]
 
+# Streaming mode: accumulate int64 SSE over CHUNK_FRAMES frames at a time
+# instead of loading whole sequences as float32 tensors.
+STREAMING = True
+CHUNK_FRAMES = 8
+PER_FRAME_FILE = "./results/psnr_per_frame_preset.csv"
+
+# Worker processes for the (method, QP, sequence) jobs; None = all cores
+NUM_WORKERS = None
+# Results are reused across runs until the decoded/original file changes
+CACHE_FILE = DEFAULT_CACHE_FILE
+
 # --------------------------------------------------
 # Read YUV420p (Y, U, V)
 # --------------------------------------------------
-def read_yuv_all_planes(file_path, width, height, num_frames=None):
-    if not os.path.exists(file_path):
+def read_yuv_all_planes(reader, num_frames):
+    if reader is None or num_frames == 0:
         return None, None, None
 
-    y_size = width * height
-    uv_width = width // 2
-    uv_height = height // 2
-    uv_size = uv_width * uv_height
-    frame_size = y_size + 2 * uv_size
-
-    try:
-        with open(file_path, 'rb') as f:
-            raw_data = f.read()
-
-        total_frames = len(raw_data) // frame_size
-        if num_frames is not None:
-            total_frames = min(total_frames, num_frames)
-
-        y_data, u_data, v_data = [], [], []
-
-        for i in range(total_frames):
-            frame_start = i * frame_size
-
-            # Y
-            y = np.frombuffer(
-                raw_data, dtype=np.uint8,
-                count=y_size, offset=frame_start
-            ).reshape((height, width))
-
-            # U
-            u_start = frame_start + y_size
-            u = np.frombuffer(
-                raw_data, dtype=np.uint8,
-                count=uv_size, offset=u_start
-            ).reshape((uv_height, uv_width))
-
-            # V (FIXED OFFSET)
-            v_start = u_start + uv_size
-            v = np.frombuffer(
-                raw_data, dtype=np.uint8,
-                count=uv_size, offset=v_start
-            ).reshape((uv_height, uv_width))
-
-            y_data.append(y)
-            u_data.append(u)
-            v_data.append(v)
-
-        return (
-            torch.tensor(np.array(y_data), dtype=torch.float32),
-            torch.tensor(np.array(u_data), dtype=torch.float32),
-            torch.tensor(np.array(v_data), dtype=torch.float32)
-        )
-
-    except Exception:
-        return None, None, None
+    # single uint8 -> float32 copy straight from the memory map
+    y, u, v = reader[:num_frames]
+    return (
+        torch.from_numpy(y.astype(np.float32)),
+        torch.from_numpy(u.astype(np.float32)),
+        torch.from_numpy(v.astype(np.float32))
+    )
 
 # --------------------------------------------------
 # PSNR
@@ -78,6 +52,39 @@ def calculate_psnr(original, decoded):
         return 100.0
     return (20 * torch.log10(255.0 / torch.sqrt(mse))).item()
 
+def sse_to_psnr(sse, count):
+    if sse == 0:
+        return 100.0
+    mse = sse / count
+    return float(10 * np.log10(255.0 ** 2 / mse))
+
+def calculate_psnr_streaming(org, dec, num_frames, chunk_frames=CHUNK_FRAMES):
+    """
+    Per-plane PSNR from int64 sum-of-squared-errors accumulated over
+    chunks of frames read straight from the memory maps.
+
+    Returns (p_y, p_u, p_v) for the whole sequence and a (num_frames, 3)
+    array of per-frame PSNR-Y/U/V.
+    """
+    frame_sse = np.zeros((num_frames, 3), dtype=np.int64)
+
+    for start in range(0, num_frames, chunk_frames):
+        stop = min(start + chunk_frames, num_frames)
+        for p, (a, b) in enumerate(zip(org[start:stop], dec[start:stop])):
+            d = a.astype(np.int64) - b
+            frame_sse[start:stop, p] = (d * d).reshape(stop - start, -1).sum(axis=1)
+
+    counts = (org.y_size, org.uv_size, org.uv_size)
+    total_sse = frame_sse.sum(axis=0)
+    seq_psnr = tuple(
+        sse_to_psnr(int(total_sse[p]), counts[p] * num_frames) for p in range(3)
+    )
+    per_frame = np.array([
+        [sse_to_psnr(int(frame_sse[i, p]), counts[p]) for p in range(3)]
+        for i in range(num_frames)
+    ])
+    return seq_psnr, per_frame
+
 # --------------------------------------------------
 # Parse resolution from filename
 # --------------------------------------------------
@@ -87,23 +94,60 @@ def parse_filename(filename):
         return int(match.group(1)), int(match.group(2))
     return 1920, 1080
 
+# --------------------------------------------------
+# One (method, QP, sequence) job, run in a worker process
+# --------------------------------------------------
+def evaluate_job(job):
+    method, qp, filename, dec_path = job
+    org_path = os.path.join(INPUT_DIR, filename)
+    width, height = parse_filename(filename)
+
+    org = open_yuv(org_path, width, height)
+    dec = open_yuv(dec_path, width, height)
+    if org is None or dec is None:
+        return None
+
+    min_frames = min(len(org), len(dec))
+    if min_frames == 0:
+        return None
+
+    if STREAMING:
+        seq_psnr, per_frame = calculate_psnr_streaming(org, dec, min_frames)
+        return seq_psnr, per_frame.tolist()
+
+    org_y, org_u, org_v = read_yuv_all_planes(org, min_frames)
+    dec_y, dec_u, dec_v = read_yuv_all_planes(dec, min_frames)
+
+    p_y = calculate_psnr(org_y, dec_y)
+    p_u = calculate_psnr(org_u, dec_u)
+    p_v = calculate_psnr(org_v, dec_v)
+    return (p_y, p_u, p_v), []
+
+def job_paths(job):
+    # files the cached result depends on
+    return [job[3], os.path.join(INPUT_DIR, job[2])]
+
 # --------------------------------------------------
 # MAIN
 # --------------------------------------------------
 def main():
     print("Running PSNR evaluation (YUV420p)")
 
-    methods = [
-        d for d in os.listdir(OUTPUT_ROOT)
-        if os.path.isdir(os.path.join(OUTPUT_ROOT, d))
-    ]
-    methods.sort()
+    methods, jobs = enumerate_jobs(OUTPUT_ROOT, TARGET_QPS, ".yuv")
+    jobs = [j for j in jobs if os.path.exists(os.path.join(INPUT_DIR, j[2]))]
+    print(f"{len(jobs)} jobs on {NUM_WORKERS or os.cpu_count()} workers")
 
     summary_stats = {m: {qp: [] for qp in TARGET_QPS} for m in methods}
     
     os.makedirs(os.path.dirname(REPORT_FILE__PATH), exist_ok=True)
     
-    with open(REPORT_FILE, "w") as f:
+    # per-frame values only come out of the streaming path
+    per_frame_file = open(PER_FRAME_FILE, "w") if STREAMING else contextlib.nullcontext()
+    with open(REPORT_FILE, "w") as f, per_frame_file as frame_f, \
+            MetricCache(CACHE_FILE) as cache:
+        if frame_f is not None:
+            frame_f.write("method,sequence,qp,frame,psnr_y,psnr_u,psnr_v,psnr_yuv\n")
+
         header = (
             f"{'Method':<30} | {'Sequence':<25} | {'QP':<5} | "
             f"{'PSNR-Y':<10} | {'PSNR-U':<30} | {'PSNR-V':<30} | {'AVG-YUV':<30}"
@@ -112,51 +156,32 @@ def main():
         f.write(header + "\n")
         f.write("-" * 100 + "\n")
 
-        for method in methods:
-            method_path = os.path.join(OUTPUT_ROOT, method)
-
-            for qp in TARGET_QPS:
-                qp_path = os.path.join(method_path, f"qp{qp}")
-                if not os.path.exists(qp_path):
-                    continue
-
-                decoded_files = sorted(
-                    x for x in os.listdir(qp_path) if x.endswith(".yuv")
+        for (method, qp, filename, _), result in run_jobs_cached(
+            evaluate_job, jobs, cache, "psnr_yuv420", {"streaming": STREAMING},
+            job_paths, workers=NUM_WORKERS
+        ):
+            if result is None:
+                continue
+
+            (p_y, p_u, p_v), per_frame = result
+            for i, (fy, fu, fv) in enumerate(per_frame if frame_f is not None else []):
+                frame_f.write(
+                    f"{method},{filename},{qp},{i},"
+                    f"{fy:.4f},{fu:.4f},{fv:.4f},{(6 * fy + fu + fv) / 8:.4f}\n"
                 )
 
-                for filename in decoded_files:
-                    org_path = os.path.join(INPUT_DIR, filename)
-                    dec_path = os.path.join(qp_path, filename)
-
-                    if not os.path.exists(org_path):
-                        continue
-
-                    width, height = parse_filename(filename)
-
-                    org_y, org_u, org_v = read_yuv_all_planes(org_path, width, height)
-                    dec_y, dec_u, dec_v = read_yuv_all_planes(dec_path, width, height)
-
-                    if org_y is None or dec_y is None:
-                        continue
-
-                    min_frames = min(org_y.shape[0], dec_y.shape[0])
-
-                    p_y = calculate_psnr(org_y[:min_frames], dec_y[:min_frames])
-                    p_u = calculate_psnr(org_u[:min_frames], dec_u[:min_frames])
-                    p_v = calculate_psnr(org_v[:min_frames], dec_v[:min_frames])
-
-                    # YUV420 WEIGHTED AVERAGE (CORRECT)
-                    p_avg = (6 * p_y + p_u + p_v) / 8
+            # YUV420 WEIGHTED AVERAGE (CORRECT)
+            p_avg = (6 * p_y + p_u + p_v) / 8
 
-                    line = (
-                        f"{method:<10} | {filename[:25]:<25} | {qp:<5} | "
-                        f"{p_y:10.4f} | {p_u:10.4f} | {p_v:10.4f} | {p_avg:10.4f}"
-                    )
+            line = (
+                f"{method:<10} | {filename[:25]:<25} | {qp:<5} | "
+                f"{p_y:10.4f} | {p_u:10.4f} | {p_v:10.4f} | {p_avg:10.4f}"
+            )
 
-                    print(line)
-                    f.write(line + "\n")
+            print(line)
+            f.write(line + "\n")
 
-                    summary_stats[method][qp].append(p_avg)
+            summary_stats[method][qp].append(p_avg)
 
         # SUMMARY
         f.write("\n" + "=" * 80 + "\n")
@@ -2,13 +2,21 @@ import torch
 import numpy as np
 import os
 import re
+import sys
 from torchmetrics.image import StructuralSimilarityIndexMeasure
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "utils"))
+from yuv_reader import YUVReader
+from eval_runner import enumerate_jobs, run_jobs_cached
+from metric_cache import MetricCache, DEFAULT_CACHE_FILE
+
 # --- CONFIGURATION ---
 INPUT_DIR = "./input_yuv/class_B"
 OUTPUT_ROOT = "./output"
 REPORT_FILE = "ssim_results.txt"
 TARGET_QPS = [22, 27, 32, 37, 42, 47]
+NUM_WORKERS = None  # worker processes for (method, QP, sequence) jobs; None = all cores
+CACHE_FILE = DEFAULT_CACHE_FILE  # results reused until an input file changes
 
 device = torch.device("cpu")
 
@@ -16,25 +24,13 @@ device = torch.device("cpu")
 # Read YUV420p (Y, U, V)
 # --------------------------------------------------
 def read_yuv_all_planes(path, w, h):
-    y_size = w * h
-    uv_w, uv_h = w // 2, h // 2
-    uv_size = uv_w * uv_h
-    frame_size = y_size + 2 * uv_size
-
-    raw = np.fromfile(path, dtype=np.uint8)
-    n_frames = raw.size // frame_size
-    raw = raw.reshape(n_frames, frame_size)
-
-    Y = raw[:, :y_size].reshape(n_frames, h, w)
-    U = raw[:, y_size:y_size+uv_size].reshape(n_frames, uv_h, uv_w)
-    V = raw[:, y_size+uv_size:].reshape(n_frames, uv_h, uv_w)
-
-    return (
-        torch.from_numpy(Y).float(),
-        torch.from_numpy(U).float(),
-        torch.from_numpy(V).float(),
-        n_frames
-    )
+    """
+    Returns uint8 memory-mapped (N, H, W) views; frames are converted to
+    float one at a time in calculate_ssim_video.
+    """
+    reader = YUVReader(path, w, h)
+    Y, U, V = reader[:]
+    return Y, U, V, len(reader)
 
 # --------------------------------------------------
 # Parse resolution from filename
@@ -48,7 +44,7 @@ def parse_filename(filename):
 # --------------------------------------------------
 def calculate_ssim_video(video1, video2, data_range=255.0):
     """
-    video: (N, H, W)
+    video: (N, H, W) uint8 array (memory-mapped views are fine)
     """
     metric = StructuralSimilarityIndexMeasure(
         data_range=data_range
@@ -57,26 +53,48 @@ def calculate_ssim_video(video1, video2, data_range=255.0):
     ssim_vals = []
 
     for i in range(video1.shape[0]):
-        x = video1[i].unsqueeze(0).unsqueeze(0).to(device)
-        y = video2[i].unsqueeze(0).unsqueeze(0).to(device)
+        x = torch.from_numpy(video1[i].astype(np.float32))[None, None].to(device)
+        y = torch.from_numpy(video2[i].astype(np.float32))[None, None].to(device)
         ssim_vals.append(metric(x, y).item())
 
     return np.mean(ssim_vals)
 
+# --------------------------------------------------
+# One (method, QP, sequence) job, run in a worker process
+# --------------------------------------------------
+def evaluate_job(job):
+    method, qp, filename, dec_path = job
+    org_path = os.path.join(INPUT_DIR, filename)
+    w, h = parse_filename(filename)
+
+    oy, ou, ov, n1 = read_yuv_all_planes(org_path, w, h)
+    dy, du, dv, n2 = read_yuv_all_planes(dec_path, w, h)
+
+    n = min(n1, n2)
+
+    return (
+        float(calculate_ssim_video(oy[:n], dy[:n])),
+        float(calculate_ssim_video(ou[:n], du[:n])),
+        float(calculate_ssim_video(ov[:n], dv[:n]))
+    )
+
+def job_paths(job):
+    # files the cached result depends on
+    return [job[3], os.path.join(INPUT_DIR, job[2])]
+
 # --------------------------------------------------
 # MAIN
 # --------------------------------------------------
 def main():
     print("Running SSIM evaluation (torchmetrics | YUV420p)")
 
-    methods = sorted(
-        d for d in os.listdir(OUTPUT_ROOT)
-        if os.path.isdir(os.path.join(OUTPUT_ROOT, d))
-    )
+    methods, jobs = enumerate_jobs(OUTPUT_ROOT, TARGET_QPS, ".yuv")
+    jobs = [j for j in jobs if os.path.exists(os.path.join(INPUT_DIR, j[2]))]
+    print(f"{len(jobs)} jobs on {NUM_WORKERS or os.cpu_count()} workers")
 
     summary_stats = {m: {qp: [] for qp in TARGET_QPS} for m in methods}
 
-    with open(REPORT_FILE, "w") as f:
+    with open(REPORT_FILE, "w") as f, MetricCache(CACHE_FILE) as cache:
         header = (
             f"{'Method':<10} | {'Sequence':<25} | {'QP':<5} | "
             f"{'SSIM-Y':<10} | {'SSIM-U':<10} | {'SSIM-V':<10} | {'AVG-YUV':<10}"
@@ -85,42 +103,22 @@ def main():
         f.write(header + "\n")
         f.write("-" * 100 + "\n")
 
-        for method in methods:
-            for qp in TARGET_QPS:
-                qp_path = os.path.join(OUTPUT_ROOT, method, f"qp{qp}")
-                if not os.path.exists(qp_path):
-                    continue
-
-                for filename in sorted(x for x in os.listdir(qp_path) if x.endswith(".yuv")):
-                    org_path = os.path.join(INPUT_DIR, filename)
-                    dec_path = os.path.join(qp_path, filename)
-
-                    if not os.path.exists(org_path):
-                        continue
-
-                    w, h = parse_filename(filename)
-
-                    oy, ou, ov, n1 = read_yuv_all_planes(org_path, w, h)
-                    dy, du, dv, n2 = read_yuv_all_planes(dec_path, w, h)
-
-                    n = min(n1, n2)
-
-                    ssim_y = calculate_ssim_video(oy[:n], dy[:n])
-                    ssim_u = calculate_ssim_video(ou[:n], du[:n])
-                    ssim_v = calculate_ssim_video(ov[:n], dv[:n])
-
-                    # YUV420 weighted SSIM
-                    ssim_avg = (6 * ssim_y + ssim_u + ssim_v) / 8
-
-                    line = (
-                        f"{method:<10} | {filename[:25]:<25} | {qp:<5} | "
-                        f"{ssim_y:10.6f} | {ssim_u:10.6f} | "
-                        f"{ssim_v:10.6f} | {ssim_avg:10.6f}"
-                    )
-
-                    print(line)
-                    f.write(line + "\n")
-                    summary_stats[method][qp].append(ssim_avg)
+        for (method, qp, filename, _), (ssim_y, ssim_u, ssim_v) in run_jobs_cached(
+            evaluate_job, jobs, cache, "ssim_yuv420", {"data_range": 255.0},
+            job_paths, workers=NUM_WORKERS
+        ):
+            # YUV420 weighted SSIM
+            ssim_avg = (6 * ssim_y + ssim_u + ssim_v) / 8
+
+            line = (
+                f"{method:<10} | {filename[:25]:<25} | {qp:<5} | "
+                f"{ssim_y:10.6f} | {ssim_u:10.6f} | "
+                f"{ssim_v:10.6f} | {ssim_avg:10.6f}"
+            )
+
+            print(line)
+            f.write(line + "\n")
+            summary_stats[method][qp].append(ssim_avg)
 
         # SUMMARY
         f.write("\n" + "=" * 80 + "\n")
@@ -14,6 +14,10 @@ OUT_ROOT="./vmaf_results"
 
 QPS=(22 27 32 37 42 47)
 
+# metric cache shared with val_psnr.py / val_ssim.py: an entry is only
+# valid while the distorted and reference YUVs are unchanged
+METRIC_CACHE="python $(dirname "$0")/../src/utils/metric_cache.py"
+
 # ==============================
 # CHECK
 # ==============================
@@ -46,14 +50,15 @@ for REF_YUV in "$REF_DIR"/*.yuv; do
       DIST_YUV="$METHOD_DIR/qp${QP}/$BASENAME"
       OUT_JSON="$SEQ_OUT_DIR/vmaf_qp${QP}.json"
 
-      # ---- CHECK DONE ----
-      if [ -s "$OUT_JSON" ]; then
-        echo "    [SKIP] QP${QP} already done"
+      if [ ! -f "$DIST_YUV" ]; then
+        echo "    [MISS] QP${QP} YUV not found"
         continue
       fi
 
-      if [ ! -f "$DIST_YUV" ]; then
-        echo "    [MISS] QP${QP} YUV not found"
+      # ---- CHECK DONE (and still valid) ----
+      if [ -s "$OUT_JSON" ] && \
+         $METRIC_CACHE has --metric vmaf "$DIST_YUV" "$REF_YUV"; then
+        echo "    [SKIP] QP${QP} already done"
         continue
       fi
 
@@ -67,6 +72,7 @@ for REF_YUV in "$REF_DIR"/*.yuv; do
 
       # ---- VERIFY RESULT ----
       if [ -s "$OUT_JSON" ]; then
+        $METRIC_CACHE put --metric vmaf --value "$OUT_JSON" "$DIST_YUV" "$REF_YUV"
         echo "    ✔ Done QP${QP}"
       else
         echo "    ✖ Failed QP${QP}, will retry next run"
@@ -4,39 +4,18 @@ import numpy as np
 import cv2
 from tqdm import tqdm
 from ultralytics import YOLO
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "utils"))
+from yuv_reader import YUVReader
+from roi_container import open_rois
 # ==============================
 # YUV Reader
 # ==============================
-def read_yuv_frame(fp, w, h, idx):
-    frame_size = w * h * 3 // 2
-    fp.seek(idx * frame_size)
-    y = np.fromfile(fp, np.uint8, w * h)
-    return y.reshape((h, w))
-
-# def read_yuv420_frame(fp, w, h, idx):
-#     frame_size = w * h * 3 // 2
-#     fp.seek(idx * frame_size)
-
-#     y = np.fromfile(fp, np.uint8, w * h).reshape((h, w))
-#     u = np.fromfile(fp, np.uint8, w * h // 4).reshape((h//2, w//2))
-#     v = np.fromfile(fp, np.uint8, w * h // 4).reshape((h//2, w//2))
-
-#     u_up = cv2.resize(u, (w, h), interpolation=cv2.INTER_LINEAR)
-#     v_up = cv2.resize(v, (w, h), interpolation=cv2.INTER_LINEAR)
-
-#     yuv = cv2.merge([y, u_up, v_up])
-#     rgb = cv2.cvtColor(yuv, cv2.COLOR_YUV2RGB)
-
-#     return rgb, y
-def read_yuv420_frame(fp, w, h, idx):
-    frame_size = w * h * 3 // 2
-    fp.seek(idx * frame_size)
-
-    yuv = np.fromfile(fp, np.uint8, frame_size)
-    yuv = yuv.reshape((h * 3 // 2, w))
-
+def read_yuv420_frame(reader, idx):
+    yuv = reader.frame(idx)
     rgb = cv2.cvtColor(yuv, cv2.COLOR_YUV2RGB_I420)
-    y = yuv[:h, :]   # Y plane
+    y = reader.y(idx)   # Y plane
 
     return rgb, y
 
@@ -48,7 +27,7 @@ def read_rois_from_txt(txt_path):
             line = line.strip()
             if not line:
                 continue
-            x1, y1, x2, y2 = map(int, line.split(','))
+            x1, y1, x2, y2 = map(int, line.split(',')[:4])
             rois.append((x1, y1, x2, y2))
     return rois
 import cv2
@@ -84,22 +63,28 @@ def main():
                 print(f"Processing {file_path} with {roi_method}...")
                 out_folder = f'{output_vis}/{roi_method}/{seq[:-4]}'
                 os.makedirs(out_folder, exist_ok=True)
-                with open(file_path, "rb") as fp:
+                # <seq>.roi container if present, else per-frame text files
+                container = open_rois(f'roi/{roi_method}/{seq[:-4]}')
+                with YUVReader(file_path, w, h, nfs) as reader:
                     prev = None
 
-                    for idx in tqdm(range(nfs)):
+                    for idx in tqdm(range(len(reader))):
 
                         rois = []
-                        rgb, curr_y = read_yuv420_frame(fp, w, h, idx)
+                        rgb, curr_y = read_yuv420_frame(reader, idx)
 
-                        roi_txt = f'roi/{roi_method}/{seq[:-4]}/frame_{idx:04d}_roi.txt'
+                        if container is not None:
+                            # 1. đọc ROI
+                            rois = container[idx]
+                        else:
+                            roi_txt = f'roi/{roi_method}/{seq[:-4]}/frame_{idx:04d}_roi.txt'
 
-                        if not os.path.exists(roi_txt):
-                            print(f'Roi file {roi_txt} does not exist!\n')
-                            continue
+                            if not os.path.exists(roi_txt):
+                                print(f'Roi file {roi_txt} does not exist!\n')
+                                continue
 
-                        # 1. đọc ROI
-                        rois = read_rois_from_txt(roi_txt)
+                            # 1. đọc ROI
+                            rois = read_rois_from_txt(roi_txt)
 
                         # 2. vẽ ROI lên ảnh
                         rgb_drawn = draw_rois(rgb.copy(), rois)
@@ -0,0 +1,134 @@
+/* Offset-map generation benchmark: apply_roi_qp vs the per-block loop.
+ *
+ *   gcc -O2 -I/usr/local/include -o bench_roi_qp bench_roi_qp.c roi.c
+ *   ./bench_roi_qp [width height qg]
+ *
+ * Only x265.h (for x265_picture) is needed, not libx265.
+ */
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include "roi.h"
+
+/* ---------------- reference: every block against every ROI ---------------- */
+
+static int overlap(
+    int ax1, int ay1, int ax2, int ay2,
+    int bx1, int by1, int bx2, int by2)
+{
+    return !(ax2 <= bx1 || ax1 >= bx2 ||
+             ay2 <= by1 || ay1 >= by2);
+}
+
+static void apply_roi_qp_ref(
+    x265_picture *pic,
+    ROI *rois,
+    int num_rois,
+    int block_size,
+    float qpOffset)
+{
+    int block_cols = (pic->width  + block_size - 1) / block_size;
+    int block_rows = (pic->height + block_size - 1) / block_size;
+
+    for (int r = 0; r < block_rows; r++) {
+        for (int c = 0; c < block_cols; c++) {
+            int x1 = c * block_size;
+            int y1 = r * block_size;
+            float qp = qpOffset;
+            for (int i = 0; i < num_rois; i++) {
+                if (overlap(x1, y1, x1 + block_size, y1 + block_size,
+                            rois[i].x1, rois[i].y1, rois[i].x2, rois[i].y2)) {
+                    qp = -qpOffset;
+                    break;
+                }
+            }
+            pic->quantOffsets[r * block_cols + c] = qp;
+        }
+    }
+}
+
+/* ---------------- helpers ---------------- */
+
+static double now_ms(void)
+{
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec * 1e3 + ts.tv_nsec / 1e6;
+}
+
+static unsigned int rng_state = 12345;
+
+static int rand_int(int n)
+{
+    rng_state = rng_state * 1103515245u + 12345u;
+    return (int)((rng_state >> 8) % (unsigned int)n);
+}
+
+/* boxes up to 1/8 of the frame, like detector / mask component output */
+static void random_rois(ROI *rois, int n, int width, int height)
+{
+    for (int i = 0; i < n; i++) {
+        int w = 1 + rand_int(width / 8);
+        int h = 1 + rand_int(height / 8);
+        rois[i].x1 = rand_int(width);
+        rois[i].y1 = rand_int(height);
+        rois[i].x2 = rois[i].x1 + w < width  ? rois[i].x1 + w : width;
+        rois[i].y2 = rois[i].y1 + h < height ? rois[i].y1 + h : height;
+        rois[i].weight = 1.0f;
+    }
+}
+
+int main(int argc, char **argv)
+{
+    int width  = argc > 2 ? atoi(argv[1]) : 1920;
+    int height = argc > 2 ? atoi(argv[2]) : 1080;
+    int qg     = argc > 3 ? atoi(argv[3]) : 16;
+
+    int cols = (width + qg - 1) / qg;
+    int rows = (height + qg - 1) / qg;
+    float *map = malloc(cols * rows * sizeof(float));
+    float *ref = malloc(cols * rows * sizeof(float));
+
+    x265_picture pic;
+    memset(&pic, 0, sizeof(pic));
+    pic.width = width;
+    pic.height = height;
+
+    static const int counts[] = {1, 10, 100, 1000, 10000};
+    int max_rois = counts[sizeof(counts) / sizeof(counts[0]) - 1];
+    ROI *rois = malloc(max_rois * sizeof(ROI));
+
+    printf("%dx%d, QG %d (%d blocks)\n", width, height, qg, cols * rows);
+    printf("%7s | %12s | %12s | %8s | %s\n", "ROIs", "ref us/frame", "grid us/frame", "speedup", "same");
+    printf("------------------------------------------------------------\n");
+
+    for (size_t k = 0; k < sizeof(counts) / sizeof(counts[0]); k++) {
+        int n = counts[k];
+        random_rois(rois, n, width, height);
+        int iters = n >= 1000 ? 20 : 200;
+
+        pic.quantOffsets = map;
+        double t0 = now_ms();
+        for (int it = 0; it < iters; it++)
+            apply_roi_qp(&pic, rois, n, qg);
+        double grid_us = (now_ms() - t0) * 1000.0 / iters;
+
+        /* same magnitude as apply_roi_qp picked, so the maps compare 1:1 */
+        float off = map[0] < 0 ? -map[0] : map[0];
+        pic.quantOffsets = ref;
+        t0 = now_ms();
+        for (int it = 0; it < iters; it++)
+            apply_roi_qp_ref(&pic, rois, n, qg, off);
+        double ref_us = (now_ms() - t0) * 1000.0 / iters;
+
+        int same = !memcmp(map, ref, cols * rows * sizeof(float));
+        printf("%7d | %12.1f | %12.1f | %8.1f | %s\n",
+               n, ref_us, grid_us, ref_us / grid_us, same ? "yes" : "NO");
+    }
+
+    free(rois);
+    free(map);
+    free(ref);
+    return 0;
+}
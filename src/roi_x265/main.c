@@ -4,9 +4,12 @@
 #include <string.h>
 #include "roi.h"
 #include "roi_reader.h"
+#include "roi_prefetch.h"
+#include "rate_alloc.h"
+#include "telemetry.h"
+#include "timing.h"
 #include "yuv_reader.h"
 
-#define MAX_ROI 50
 /* ---------------- CLI helpers ---------------- */
 
 static const char *get_arg(int argc, char **argv, const char *key)
@@ -41,20 +44,35 @@ static void print_usage(const char *prog)
         "     --width W --height H --fps FPS --qp QP --roi-dir DIR \\\n"
         "     --enable-roi 1  --preset slow --print-log 0\n\n"
         "Options:\n"
-        "  --input       input YUV420p file\n"
-        "  --output      output HEVC bitstream\n"
+        "  --input       input YUV420p file, named pipe or - for stdin\n"
+        "  --input-mode  auto, mmap (files), thread (reader thread, pipes) or read (default: auto)\n"
+        "  --read-ahead  frames buffered by the reader thread (default: 4)\n"
+        "  --output      output HEVC bitstream or - for stdout (NALs flushed per frame)\n"
         "  --width       frame width\n"
         "  --height      frame height\n"
         "  --fps         frame rate (default: 30)\n"
         "  --rc          rate control (default: CRF - 2)\n"
         "  --qp          base QP (default: 28)\n"
-        "  --roi-dir     ROI directory (frame_XXXX.txt)\n"
+        "  --roi-dir     ROI directory (frame_XXXX.txt) or <seq>.roi container\n"
+        "  --qg-map      <seq>.qgm QP offset maps, used instead of --roi-dir\n"
         "  --enable-roi  apply ROI (1=on, 0=off, default: 1)\n"
         "  --preset      set the preset mode, (ultrafast, superfast, veryfast, faster, fast, medium, slow, slower)\n"
         "  --print-log   print log (1=on, 0=off, default: 0) \n"
         "  --rd-level    RD level (1->6)(default: 3)\n\n"
         "  --rdoq-level  RDOQ level (0->2)(default: 1)\n"
-        "  --psy-rd     psy RD level (0->5)(default: 1)\n",
+        "  --psy-rd     psy RD level (0->5)(default: 1)\n"
+        "  --graded      graded offsets from coverage, feathering and ROI weights (default: 0)\n"
+        "  --feather     feathering distance in QGs for --graded (default: 2)\n"
+        "  --qg-hold     frames a QG keeps its ROI offset after it stops being ROI (default: 0 = off)\n"
+        "  --target-kbps bitrate budget; solves ROI/background QPs per frame, graded maps keep\n"
+        "                their grading between the two (default: 0 = off)\n"
+        "  --max-delta   largest background - ROI QP gap for --target-kbps (default: 6)\n"
+        "  --rate-log    per-frame CSV of chosen QPs and achieved bits for --target-kbps\n"
+        "  --roi-stream  ROI packets on a pipe / FIFO, matched to frames by index\n"
+        "  --framed      input is ROI packets each followed by its frame (default: 0)\n"
+        "  --tune        x265 tune, e.g. zerolatency for live input (default: psnr)\n"
+        "  --roi-prefetch frames of ROI maps built ahead on a thread, 0 = on the encode loop (default: 4)\n"
+        "  --stats       per-frame CSV (or .jsonl) of type, QP, bits, ROI coverage, offsets and timings\n",
         prog);
 }
 
@@ -63,12 +81,20 @@ int main(int argc, char **argv)
     const char *input = get_arg(argc, argv, "--input");
     const char *output = get_arg(argc, argv, "--output");
     const char *roi_dir = get_arg(argc, argv, "--roi-dir");
+    const char *qg_map_path = get_arg(argc, argv, "--qg-map");
+    const char *roi_stream_path = get_arg(argc, argv, "--roi-stream");
+    int framed = get_arg_bool(argc, argv, "--framed", 0);
     const char *preset = get_arg(argc, argv, "--preset");
     if (!preset)
     {
         preset = "veryfast";
     }
-    if (!input || !output || !roi_dir || !preset)
+    const char *tune = get_arg(argc, argv, "--tune");
+    if (!tune)
+    {
+        tune = "psnr";
+    }
+    if (!input || !output || (!roi_dir && !qg_map_path && !roi_stream_path && !framed) || !preset)
     {
         print_usage(argv[0]);
         return -1;
@@ -84,16 +110,39 @@ int main(int argc, char **argv)
     int rd_level = get_arg_int(argc, argv, "--rd_level", 1);
     int rdoq_level = get_arg_int(argc, argv, "--rdoq_level", 0);
     int psy_rd = get_arg_int(argc, argv, "--psy_rd", 2);
+    int graded = get_arg_bool(argc, argv, "--graded", 0);
+    int feather = get_arg_int(argc, argv, "--feather", 2);
+    int qg_hold_frames = get_arg_int(argc, argv, "--qg-hold", 0);
+    int target_kbps = get_arg_int(argc, argv, "--target-kbps", 0);
+    int max_delta = get_arg_int(argc, argv, "--max-delta", 6);
+    const char *rate_log = get_arg(argc, argv, "--rate-log");
+    const char *stats_path = get_arg(argc, argv, "--stats");
+    int input_mode = yuv_source_mode(get_arg(argc, argv, "--input-mode"));
+    int read_ahead = get_arg_int(argc, argv, "--read-ahead", YUV_SOURCE_DEPTH);
+    int roi_prefetch = get_arg_int(argc, argv, "--roi-prefetch", ROI_PREFETCH_DEPTH);
+    if (input_mode < 0)
+    {
+        print_usage(argv[0]);
+        return -1;
+    }
+    /* packets and frames share the stream, so only the caller may read it */
+    if (framed)
+        input_mode = YUV_SOURCE_READ;
+
+    /* the bitstream may own stdout, so logs go to stderr then */
+    int to_stdout = !strcmp(output, "-");
+    FILE *logf = to_stdout ? stderr : stdout;
+    int live = to_stdout || !strcmp(input, "-") || framed || roi_stream_path;
 
     if (print_log)
     {
-        printf("rd_level %d\n", rd_level);
-        printf("rc %d qp %d\n", rc, qp);
-        printf("enable roi: %d\n", enable_roi);
+        fprintf(logf, "rd_level %d\n", rd_level);
+        fprintf(logf, "rc %d qp %d\n", rc, qp);
+        fprintf(logf, "enable roi: %d\n", enable_roi);
     
     }
-    FILE *fyuv = fopen(input, "rb");
-    FILE *fout = fopen(output, "wb");
+    FILE *fyuv = strcmp(input, "-") ? fopen(input, "rb") : stdin;
+    FILE *fout = to_stdout ? stdout : fopen(output, "wb");
     if (!fyuv || !fout)
     {
         fprintf(stderr, "Cannot open input/output file\n");
@@ -103,7 +152,7 @@ int main(int argc, char **argv)
     /* ---------------- x265 params ---------------- */
 
     x265_param *param = x265_param_alloc();
-    x265_param_default_preset(param, preset, "psnr");
+    x265_param_default_preset(param, preset, tune);
 
     param->sourceWidth = width;
     param->sourceHeight = height;
@@ -200,13 +249,13 @@ int main(int argc, char **argv)
     // pic.analysisData = analysis;
     pic.width = width;
     pic.height = height;
-    pic.stride[0] = width;
-    pic.stride[1] = width / 2;
-    pic.stride[2] = width / 2;
 
-    pic.planes[0] = malloc(width * height);
-    pic.planes[1] = malloc(width * height / 4);
-    pic.planes[2] = malloc(width * height / 4);
+    /* planes / strides are set per frame by the input source */
+    YUVSource *source = yuv_source_open(fyuv, width, height, input_mode, read_ahead);
+    if (!source)
+        return -1;
+    if (print_log)
+        fprintf(logf, "input: %s\n", yuv_source_name(source->mode));
 
     /* TÍNH TOÁN KÍCH THƯỚC VÀ CẤP PHÁT 1 LẦN */
     int qgSize = param->rc.qgSize;
@@ -214,48 +263,147 @@ int main(int argc, char **argv)
     int qg_rows = (height + qgSize - 1) / qgSize;
     int buffer_size = qg_cols * qg_rows * sizeof(float);
     float *roi_buffer = (float *)malloc(buffer_size); // CẤP PHÁT TẠI ĐÂY
+
+    /* a .roi container replaces the per-frame text files */
+    ROIFile *roi_file = NULL;
+    size_t roi_dir_len = roi_dir ? strlen(roi_dir) : 0;
+    if (enable_roi && !qg_map_path && roi_dir_len > 4 && !strcmp(roi_dir + roi_dir_len - 4, ".roi"))
+    {
+        roi_file = roi_file_open(roi_dir);
+        if (!roi_file)
+            return -1;
+    }
+
+    /* precomputed offset maps are copied into quantOffsets as they are */
+    QGMapFile *qg_map = NULL;
+    if (enable_roi && qg_map_path)
+    {
+        qg_map = qgmap_open(qg_map_path);
+        if (!qg_map)
+            return -1;
+        if (qg_map->qg_size != qgSize || qg_map->cols != qg_cols || qg_map->rows != qg_rows)
+        {
+            fprintf(stderr, "QG map %dx%d (qg %d) does not match %dx%d (qg %d)\n",
+                    qg_map->cols, qg_map->rows, qg_map->qg_size, qg_cols, qg_rows, qgSize);
+            return -1;
+        }
+    }
+    /* bitrate budget: frame QP is forced, ROI / background offsets solved per frame */
+    RateAlloc *rate = NULL;
+    if (target_kbps > 0)
+    {
+        rate = rate_alloc_open(width, height, fps, target_kbps, qp, max_delta, rate_log);
+        if (!rate)
+            return -1;
+    }
+
+    /* live ROIs: a separate pipe, or packets interleaved with the frames */
+    ROIStream *roi_stream = NULL;
+    if (enable_roi && roi_stream_path && !framed)
+    {
+        roi_stream = roi_stream_open(roi_stream_path);
+        if (!roi_stream)
+            return -1;
+    }
+
+    /* file-based ROIs / maps are loaded and rasterised ahead of the encoder */
+    ROIPrefetch *prefetch = NULL;
+    if (enable_roi && (qg_map || (!roi_stream && !framed)))
+    {
+        ROIMapSource src = {
+            roi_dir, roi_file, qg_map,
+            width, height, qgSize, graded, feather,
+        };
+        prefetch = roi_prefetch_open(&src, roi_prefetch);
+        if (!prefetch)
+            return -1;
+    }
+
+    /* keeps QGs from flipping between ROI and background offsets */
+    QGHold *qg_hold = NULL;
+    if (enable_roi && qg_hold_frames > 0)
+    {
+        qg_hold = qg_hold_open(qg_cols * qg_rows, qg_hold_frames);
+        if (!qg_hold)
+            return -1;
+    }
+
+    Telemetry *stats = telemetry_open(stats_path);
+    if (!stats)
+        return -1;
+
+    /* per-frame ROIs, grown as needed by the readers */
+    ROI *rois = NULL;
+    int roi_cap = 0;
+
     /* ---------------- encode loop ---------------- */
     int frame = 0;
-    while (read_yuv_frame(fyuv, &pic, width, height))
+    while (1)
     {
+        int packet_rois = 0;
+        int frame_rois = 0;
+        if (framed)
+        {
+            ROIPacket pkt;
+            if (!roi_packet_header(fyuv, &pkt))
+                break;
+            packet_rois = roi_packet_rois(fyuv, &pkt, &rois, &roi_cap);
+            if (packet_rois < 0 || !(pkt.flags & ROI_STREAM_YUV))
+            {
+                fprintf(stderr, "Frame %d: truncated packet\n", frame);
+                break;
+            }
+        }
+        if (!yuv_source_next(source, &pic))
+            break;
+        double t_in = now_ms();
+        double map_ms = 0.0;
         // printf("params rc.aqMode=%d rc.aqStrength=%f rc.qgSize=%d\n", param->rc.aqMode, param->rc.aqStrength, param->rc.qgSize);
 
         pic.pts = (int64_t)frame;
-        pic.quantOffsets = roi_buffer;
-        memset(pic.quantOffsets, 0, buffer_size);
-        if (enable_roi)
+        if (prefetch)
         {
-            ROI rois[MAX_ROI];
-            char roi_file[1024];
-
-            snprintf(roi_file, sizeof(roi_file),
-                     "%s/frame_%04d_roi.txt", roi_dir, frame);
-
-            int num_rois = load_roi_txt(roi_file, rois);
-            // printf("num roi: %d\n", num_rois);
+            pic.quantOffsets = roi_prefetch_next(prefetch, &frame_rois, &map_ms);
+            if (print_log && qg_map)
+                fprintf(logf, "Frame %d: Sending QG map to encoder...\n", frame);
+            else if (print_log)
+                fprintf(logf, "Frame %d: Sending %d roi with quantOffsets to encoder...\n", frame, frame_rois);
+        }
+        else
+        {
+            pic.quantOffsets = roi_buffer;
+            memset(pic.quantOffsets, 0, buffer_size);
+        }
+        if (enable_roi && !prefetch)
+        {
+            /* live ROIs arrive with / alongside the frame */
+            double t_map = now_ms();
+            int num_rois = framed ? packet_rois
+                                  : roi_stream_frame(roi_stream, frame, &rois, &roi_cap);
+            frame_rois = num_rois;
             if (num_rois > 0)
             {
-                apply_roi_qp(
-                    &pic,
-                    rois,
-                    num_rois,
-                    param->rc.qgSize);
-            }
-            // else
-            // {
-            //     pic.quantOffsets = NULL;
-            // }
-            // Debug Log
-            if (pic.quantOffsets && print_log)
-            {
-                printf("Frame %d: Sending %d roi with quantOffsets to encoder...\n", frame, num_rois);
-                // (Giữ nguyên đoạn code print map của bạn ở đây nếu muốn)
+                if (graded)
+                    apply_roi_qp_graded(
+                        &pic,
+                        rois,
+                        num_rois,
+                        param->rc.qgSize,
+                        feather);
+                else
+                    apply_roi_qp(
+                        &pic,
+                        rois,
+                        num_rois,
+                        param->rc.qgSize);
             }
+            map_ms = now_ms() - t_map;
+            if (print_log)
+                fprintf(logf, "Frame %d: Sending %d roi with quantOffsets to encoder...\n", frame, num_rois);
         }
-        // else
-        // {
-        //     pic.quantOffsets = NULL;
-        // }
+
+        if (qg_hold)
+            qg_hold_apply(qg_hold, pic.quantOffsets);
 
         if (enable_roi && pic.quantOffsets && print_log)
         {
@@ -263,7 +411,7 @@ int main(int argc, char **argv)
             int qg_cols = (width + qgSize - 1) / qgSize;
             int qg_rows = (height + qgSize - 1) / qgSize;
 
-            printf("Frame %d: QP offset map (%dx%d Blocks of 16x16)\n", frame, qg_rows, qg_cols);
+            fprintf(logf, "Frame %d: QP offset map (%dx%d Blocks of 16x16)\n", frame, qg_rows, qg_cols);
 
             // for (int r = 0; r < qg_rows; r++) {
             //     for (int c = 0; c < qg_cols; c++) {
@@ -273,26 +421,49 @@ int main(int argc, char **argv)
             //     }
             //     printf("\n");
             // }
-            printf("\n");
+            fprintf(logf, "\n");
+        }
+
+        /* before the rate allocator rebases the offsets on the frame QP */
+        double roi_ratio = enable_roi ? roi_coverage(pic.quantOffsets, qg_cols * qg_rows) : 0.0;
+
+        if (rate)
+        {
+            /* x265 takes the forced QP as qp + 1, 0 meaning auto */
+            pic.forceqp = rate_alloc_frame(rate, pic.pts, pic.quantOffsets, qg_cols * qg_rows) + 1;
         }
 
+        double t_enc = now_ms();
+        telemetry_in(stats, pic.pts, t_in, map_ms, roi_ratio,
+                     enable_roi ? pic.quantOffsets : NULL, qg_cols * qg_rows, frame_rois);
+
         // x265_alloc_analysis_data(param, &analysis);
         // printf("aqmode %d pic quantOffsets", param->rc.aqMode);
 
         x265_nal *nals;
         uint32_t num_nals;
 
-        x265_encoder_encode(
+        int got = x265_encoder_encode(
             encoder,
             &nals,
             &num_nals,
             &pic,
             &pic_out);
+        double encode_ms = now_ms() - t_enc;
 
+        uint64_t frame_bytes = 0;
         for (uint32_t i = 0; i < num_nals; i++)
         {
             fwrite(nals[i].payload, 1, nals[i].sizeBytes, fout);
+            frame_bytes += nals[i].sizeBytes;
         }
+        if (rate && got > 0)
+            rate_alloc_update(rate, pic_out.pts, pic_out.sliceType, frame_bytes);
+        if (got > 0)
+            telemetry_out(stats, pic_out.pts, pic_out.sliceType, pic_out.frameData.qp,
+                          frame_bytes, encode_ms);
+        if (live)
+            fflush(fout);
         // if (num_nals > 0) {
         //     for (uint32_t i = 0; i < num_nals; i++)
         //         fwrite(nals[i].payload, 1, nals[i].sizeBytes, fout);
@@ -309,20 +480,50 @@ int main(int argc, char **argv)
 
     /* ---------------- flush ---------------- */
 
-    while (x265_encoder_encode(encoder, &nals, &num_nals, NULL, &pic_out))
+    while (1)
     {
+        double t_enc = now_ms();
+        if (x265_encoder_encode(encoder, &nals, &num_nals, NULL, &pic_out) <= 0)
+            break;
+        double encode_ms = now_ms() - t_enc;
+
+        uint64_t frame_bytes = 0;
         for (uint32_t i = 0; i < num_nals; i++)
         {
             fwrite(nals[i].payload, 1, nals[i].sizeBytes, fout);
+            frame_bytes += nals[i].sizeBytes;
         }
+        if (rate)
+            rate_alloc_update(rate, pic_out.pts, pic_out.sliceType, frame_bytes);
+        telemetry_out(stats, pic_out.pts, pic_out.sliceType, pic_out.frameData.qp,
+                      frame_bytes, encode_ms);
+        if (live)
+            fflush(fout);
     }
 
     /* ---------------- cleanup ---------------- */
 
-    // free(pic.planes[0]);
-    // free(pic.planes[1]);
-    // free(pic.planes[2]);
+    if (print_log)
+        fprintf(logf, "input: %.1f ms waiting for frames\n", source->wait_ms);
+    yuv_source_close(source);
+    if (prefetch)
+    {
+        if (print_log)
+            fprintf(logf, "roi maps: %d of %d frames waited, %.1f ms total\n",
+                    prefetch->stalls, prefetch->frames, prefetch->stall_ms);
+        if (prefetch->missing)
+            fprintf(stderr, "%d of %d frames had no ROI file in %s\n",
+                    prefetch->missing, prefetch->frames, roi_dir);
+    }
+    roi_prefetch_close(prefetch);
+    qg_hold_close(qg_hold);
     free(roi_buffer);
+    roi_file_close(roi_file);
+    free(rois);
+    qgmap_close(qg_map);
+    rate_alloc_close(rate);
+    roi_stream_close(roi_stream);
+    telemetry_close(stats, live, fps);
     x265_encoder_close(encoder);
     x265_param_free(param);
     // x265_picture_free(&pic);
@@ -0,0 +1,241 @@
+#include "rate_alloc.h"
+#include <x265.h>
+#include <math.h>
+#include <stdlib.h>
+
+#define RATE_FIT_DECAY  0.9              /* weight of older frames in the fit */
+#define RATE_K_PRIOR    0.1155           /* ln(2) / 6: bits halve every +6 QP */
+#define RATE_K_MIN      0.05
+#define RATE_K_MAX      0.25
+#define RATE_MIN_QP_VAR 0.5              /* QP spread needed before k is refitted */
+#define RATE_SOLVE_ITERS 30              /* bisection steps of solve_delta */
+
+static double clampd(double v, double lo, double hi)
+{
+    return v < lo ? lo : (v > hi ? hi : v);
+}
+
+/* QP at which `pixels` pixels cost `bits` under the model */
+static double solve_qp(const RateAlloc *ra, double bits, double pixels)
+{
+    if (pixels <= 0.0)
+        return ra->qp_min;
+    if (bits <= 0.0)
+        return ra->qp_max;
+    return (ra->a - log(bits / pixels)) / ra->k;
+}
+
+/* Offsets -> grades in place: 1 at the lowest (ROI) offset, 0 at the
+ * highest, linear in between. A map without negative offsets has no ROI
+ * (all 0), a flat negative map is all ROI (all 1). Returns the mean grade. */
+static double offsets_to_grades(float *offsets, int num_blocks)
+{
+    if (num_blocks <= 0)
+        return 0.0;
+    float lo = offsets[0], hi = offsets[0];
+    for (int i = 1; i < num_blocks; i++)
+    {
+        if (offsets[i] < lo) lo = offsets[i];
+        if (offsets[i] > hi) hi = offsets[i];
+    }
+
+    double sum = 0.0;
+    for (int i = 0; i < num_blocks; i++)
+    {
+        float g;
+        if (lo >= 0.0f)
+            g = 0.0f;
+        else if (hi <= lo)
+            g = 1.0f;
+        else
+            g = (hi - offsets[i]) / (hi - lo);
+        offsets[i] = g;
+        sum += g;
+    }
+    return sum / num_blocks;
+}
+
+/* mean over QGs of bpp(q_i) / bpp(q_ref), with q_i = q_bg - g_i * delta and
+ * q_ref the ROI QP (from_roi) or the background QP */
+static double grade_mass(const RateAlloc *ra, const float *grades, int num_blocks,
+                         double delta, int from_roi)
+{
+    if (num_blocks <= 0)
+        return 1.0;
+    double sum = 0.0;
+    for (int i = 0; i < num_blocks; i++)
+        sum += exp(-ra->k * delta * (from_roi ? 1.0 - grades[i] : -grades[i]));
+    return sum / num_blocks;
+}
+
+/* ROI - background gap in [0, max_delta] at which the frame costs `bits`,
+ * with the ROI (from_roi) or the background QP held at q_ref */
+static double solve_delta(const RateAlloc *ra, const float *grades, int num_blocks,
+                          double q_ref, double bits, int from_roi)
+{
+    double lo = 0.0, hi = ra->max_delta;
+    double unit = ra->pixels * exp(ra->a - ra->k * q_ref);
+    for (int it = 0; it < RATE_SOLVE_ITERS; it++)
+    {
+        double mid = 0.5 * (lo + hi);
+        double cost = unit * grade_mass(ra, grades, num_blocks, mid, from_roi);
+        /* a wider gap lowers the cost from the ROI side, raises it from the background side */
+        if ((cost > bits) == from_roi)
+            lo = mid;
+        else
+            hi = mid;
+    }
+    return 0.5 * (lo + hi);
+}
+
+RateAlloc *rate_alloc_open(
+    int width,
+    int height,
+    double fps,
+    double target_kbps,
+    double base_qp,
+    double max_delta,
+    const char *log_path)
+{
+    RateAlloc *ra = calloc(1, sizeof(RateAlloc));
+    if (!ra)
+        return NULL;
+
+    ra->pixels = (double)width * height;
+    ra->frame_bits = target_kbps * 1000.0 / fps;
+    ra->window = fps > 1.0 ? fps : 1.0;
+    ra->max_delta = max_delta;
+    ra->qp_min = 0.0;
+    ra->qp_max = 51.0;
+    ra->base_qp = base_qp;
+    ra->k = RATE_K_PRIOR;
+
+    if (log_path)
+    {
+        ra->log = fopen(log_path, "w");
+        if (!ra->log)
+        {
+            fprintf(stderr, "Cannot open rate log: %s\n", log_path);
+            free(ra);
+            return NULL;
+        }
+        fprintf(ra->log, "frame,type,roi_frac,qp_roi,qp_bg,target_bits,predicted_bits,bits,model_a,model_k\n");
+    }
+    return ra;
+}
+
+int rate_alloc_frame(
+    RateAlloc *ra,
+    int64_t pts,
+    float *offsets,
+    int num_blocks)
+{
+    /* the map now holds per-QG grades, rewritten as offsets below */
+    double f = offsets_to_grades(offsets, num_blocks);
+
+    /* budget: this frame's share plus the buffer error spread over the window */
+    double error = ra->target_total - ra->spent - ra->in_flight;
+    double target = ra->frame_bits + error / ra->window;
+    if (target < 0.1 * ra->frame_bits)
+        target = 0.1 * ra->frame_bits;
+    ra->target_total += ra->frame_bits;
+
+    double mass = grade_mass(ra, offsets, num_blocks, ra->max_delta, 1);
+    if (!ra->seeded)
+    {
+        /* no feedback yet: pick a so the first frames land on --qp */
+        ra->a = log(target / (ra->pixels * mass)) + ra->k * ra->base_qp;
+        ra->seeded = 1;
+    }
+
+    /* ROI first: background at the widest allowed gap, ROI gets the rest */
+    double q_roi = solve_qp(ra, target, ra->pixels * mass);
+    q_roi = clampd(q_roi, ra->qp_min, ra->qp_max);
+    double q_bg = clampd(q_roi + ra->max_delta, ra->qp_min, ra->qp_max);
+
+    if (q_roi <= ra->qp_min && f < 1.0)
+    {
+        /* ROI already at the best QP: spend the surplus on the background */
+        q_bg = q_roi + solve_delta(ra, offsets, num_blocks, q_roi, target, 1);
+    }
+    else if (q_roi + ra->max_delta > ra->qp_max && f > 0.0)
+    {
+        /* background capped at qp_max: re-solve the ROI against it */
+        q_roi = q_bg - solve_delta(ra, offsets, num_blocks, q_bg, target, 0);
+    }
+
+    double delta = q_bg - q_roi;
+    double q_eff = q_roi - log(grade_mass(ra, offsets, num_blocks, delta, 1)) / ra->k;
+    int qp = (int)floor(q_bg + 0.5);
+    for (int i = 0; i < num_blocks; i++)
+        offsets[i] = (float)(q_bg - offsets[i] * delta - qp);
+
+    RateFrame *rf = &ra->history[pts % RATE_ALLOC_HISTORY];
+    rf->f = f;
+    rf->q_roi = q_roi;
+    rf->q_bg = q_bg;
+    rf->q_eff = q_eff;
+    rf->target = target;
+    rf->predicted = ra->pixels * exp(ra->a - ra->k * q_eff);
+    rf->valid = 1;
+    ra->in_flight += rf->predicted;
+    return qp;
+}
+
+void rate_alloc_update(
+    RateAlloc *ra,
+    int64_t pts,
+    int slice_type,
+    uint64_t bytes)
+{
+    RateFrame *rf = &ra->history[pts % RATE_ALLOC_HISTORY];
+    if (!rf->valid || bytes == 0)
+        return;
+    rf->valid = 0;
+
+    double bits = 8.0 * (double)bytes;
+    ra->in_flight -= rf->predicted;
+    ra->spent += bits;
+    ra->frames_out++;
+
+    /* all QGs folded into one effective QP, then an exponentially
+     * weighted least-squares fit of log(bpp) = a - k * qp */
+    double x = rf->q_eff;
+    double y = log(bits / ra->pixels);
+
+    ra->sw  = RATE_FIT_DECAY * ra->sw  + 1.0;
+    ra->sx  = RATE_FIT_DECAY * ra->sx  + x;
+    ra->sy  = RATE_FIT_DECAY * ra->sy  + y;
+    ra->sxx = RATE_FIT_DECAY * ra->sxx + x * x;
+    ra->sxy = RATE_FIT_DECAY * ra->sxy + x * y;
+
+    double mx = ra->sx / ra->sw;
+    double my = ra->sy / ra->sw;
+    double var = ra->sxx / ra->sw - mx * mx;
+    if (var > RATE_MIN_QP_VAR)
+        ra->k = clampd(-(ra->sxy / ra->sw - mx * my) / var, RATE_K_MIN, RATE_K_MAX);
+    ra->a = my + ra->k * mx;
+
+    if (ra->log)
+    {
+        char type = slice_type == X265_TYPE_IDR || slice_type == X265_TYPE_I ? 'I' :
+                    slice_type == X265_TYPE_P ? 'P' : 'B';
+        fprintf(ra->log, "%lld,%c,%.4f,%.2f,%.2f,%.0f,%.0f,%.0f,%.4f,%.4f\n",
+                (long long)pts, type, rf->f, rf->q_roi, rf->q_bg,
+                rf->target, rf->predicted, bits, ra->a, ra->k);
+    }
+}
+
+void rate_alloc_close(RateAlloc *ra)
+{
+    if (!ra)
+        return;
+    double secs = ra->frames_out / ra->window;
+    fprintf(stderr, "rate: %d frames, %.1f kbps (target %.1f)\n",
+            ra->frames_out,
+            secs > 0.0 ? ra->spent / secs / 1000.0 : 0.0,
+            ra->frame_bits * ra->window / 1000.0);
+    if (ra->log)
+        fclose(ra->log);
+    free(ra);
+}
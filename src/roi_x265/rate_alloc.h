@@ -0,0 +1,86 @@
+#ifndef RATE_ALLOC_H
+#define RATE_ALLOC_H
+
+#include <stdint.h>
+#include <stdio.h>
+
+/* ---------------- bitrate-budgeted ROI QP allocation ----------------
+ * R-Q model, bits per pixel at QP q:   bpp(q) = exp(a - k * q)
+ * Every QG gets a grade g in [0, 1] from the offset map (1 = ROI, 0 =
+ * background; binary maps give only 0 and 1, graded / .qgm maps keep
+ * their grading) and is coded at q_bg - g * (q_bg - q_roi). A frame is
+ * predicted to cost  N * mean(bpp(q_i))  bits, N = width * height.
+ * a and k are refitted from the NAL sizes of every frame the encoder
+ * returns; the per-frame budget is the target rate plus a share of the
+ * running surplus / deficit, so misses are paid back over ~1 second.
+ */
+#define RATE_ALLOC_HISTORY 512   /* > encoder latency (lookahead + B-frames) */
+
+typedef struct {
+    double f;         /* ROI fraction of the QG grid (mean grade) */
+    double q_roi;
+    double q_bg;
+    double q_eff;     /* single QP the model prices the frame at */
+    double target;    /* bits budgeted for the frame */
+    double predicted; /* bits the model expected */
+    int valid;
+} RateFrame;
+
+typedef struct {
+    double pixels;
+    double frame_bits;  /* target kbps / fps */
+    double window;      /* frames over which the buffer error is spread */
+    double max_delta;   /* largest q_bg - q_roi */
+    double qp_min;
+    double qp_max;
+    double base_qp;     /* QP of the first frames, before any feedback */
+
+    double a;           /* model intercept, log bits per pixel at QP 0 */
+    double k;           /* model slope, ~ln(2) / 6 */
+    int seeded;
+
+    /* exponentially weighted sums of the fit */
+    double sw, sx, sy, sxx, sxy;
+
+    double target_total;  /* bits the stream should have used so far */
+    double spent;         /* actual bits of returned frames */
+    double in_flight;     /* predicted bits of frames not returned yet */
+    int frames_out;
+
+    RateFrame history[RATE_ALLOC_HISTORY];
+    FILE *log;
+} RateAlloc;
+
+RateAlloc *rate_alloc_open(
+    int width,
+    int height,
+    double fps,
+    double target_kbps,
+    double base_qp,
+    double max_delta,
+    const char *log_path
+);
+
+/* Turns an offset map from apply_roi_qp / graded / .qgm (negative = ROI)
+ * into budgeted per-QG offsets relative to the returned frame QP, which
+ * the caller forces with pic.forceqp. A graded map is rescaled: each QG
+ * lands between the solved ROI and background QPs in proportion to where
+ * its offset lies between the map's lowest and highest offset. */
+int rate_alloc_frame(
+    RateAlloc *ra,
+    int64_t pts,
+    float *offsets,
+    int num_blocks
+);
+
+/* Feeds back the size of an encoded frame (pic_out.pts / sliceType). */
+void rate_alloc_update(
+    RateAlloc *ra,
+    int64_t pts,
+    int slice_type,
+    uint64_t bytes
+);
+
+void rate_alloc_close(RateAlloc *ra);
+
+#endif
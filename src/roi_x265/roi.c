@@ -2,12 +2,22 @@
 #include <stdlib.h>
 #include <string.h>
 
-static int overlap(
-    int ax1, int ay1, int ax2, int ay2,
-    int bx1, int by1, int bx2, int by2)
+/* floor(a / b) for b > 0, also for negative a */
+static int floor_div(int a, int b)
 {
-    return !(ax2 <= bx1 || ax1 >= bx2 ||
-             ay2 <= by1 || ay1 >= by2);
+    return a >= 0 ? a / b : -((-a + b - 1) / b);
+}
+
+/* Inclusive range of blocks [*b0, *b1] overlapping [r1, r2) on one axis,
+ * the same test as the per-block overlap check:
+ * c*B < r2 && (c+1)*B > r1  <=>  floor(r1/B) <= c <= ceil(r2/B) - 1 */
+static int block_range(int r1, int r2, int block_size, int n, int *b0, int *b1)
+{
+    *b0 = floor_div(r1, block_size);
+    *b1 = -floor_div(-r2, block_size) - 1;
+    if (*b0 < 0) *b0 = 0;
+    if (*b1 > n - 1) *b1 = n - 1;
+    return *b0 <= *b1;
 }
 
 static float allocateQPOffset(
@@ -48,32 +58,184 @@ void apply_roi_qp(
     int block_cols = (width  + block_size - 1) / block_size;
     int block_rows = (height + block_size - 1) / block_size;
 
-    // pic->quantOffsets = (float*)malloc(block_cols * block_rows * sizeof(float));
     if (pic->quantOffsets == NULL) return;
-    // memset(pic->quantOffsets, 0, block_cols * block_rows * sizeof(float));
     float qpOffset = allocateQPOffset(rois, num_rois, width, height);
+
+    /* Each ROI marks the corners of its block range in a 2-D difference
+     * array (the offset map itself, as exact float counts); one prefix
+     * sum then gives, per block, how many ROIs cover it. Cost is
+     * blocks + ROIs, independent of ROI sizes and overlaps. */
+    float *q = pic->quantOffsets;
+    memset(q, 0, block_rows * block_cols * sizeof(float));
+
+    for (int i = 0; i < num_rois; i++) {
+        int c0, c1, r0, r1;
+        if (!block_range(rois[i].x1, rois[i].x2, block_size, block_cols, &c0, &c1) ||
+            !block_range(rois[i].y1, rois[i].y2, block_size, block_rows, &r0, &r1))
+            continue;
+
+        q[r0 * block_cols + c0] += 1.0f;
+        if (c1 + 1 < block_cols)
+            q[r0 * block_cols + c1 + 1] -= 1.0f;
+        if (r1 + 1 < block_rows) {
+            q[(r1 + 1) * block_cols + c0] -= 1.0f;
+            if (c1 + 1 < block_cols)
+                q[(r1 + 1) * block_cols + c1 + 1] += 1.0f;
+        }
+    }
+
     for (int r = 0; r < block_rows; r++) {
+        float *row = q + r * block_cols;
+        const float *above = r ? row - block_cols : NULL;
+        float run = 0.0f;
         for (int c = 0; c < block_cols; c++) {
+            run += row[c];
+            row[c] = above ? run + above[c] : run;
+        }
+    }
+
+    for (int i = 0; i < block_rows * block_cols; i++)
+        q[i] = q[i] > 0.5f ? -qpOffset : qpOffset; // ROI : background
+}
 
-            int x1 = c * block_size;
-            int y1 = r * block_size;
-            int x2 = x1 + block_size;
-            int y2 = y1 + block_size;
-
-            float qp = qpOffset; // background
-            for (int i = 0; i < num_rois; i++) {
-                if (overlap(
-                        x1, y1, x2, y2,
-                        rois[i].x1,
-                        rois[i].y1,
-                        rois[i].x2,
-                        rois[i].y2)) {
-                    qp = -qpOffset; // ROI
-                    break;
-                }
+
+/* ---------------- graded offsets ---------------- */
+
+static float clamp01(float v)
+{
+    return v < 0.0f ? 0.0f : (v > 1.0f ? 1.0f : v);
+}
+
+/* Continuous offsets instead of a binary ROI/background split:
+ *  1. importance s in [0, 1] per block = max over ROIs of
+ *     weight * (fraction of the block the ROI covers);
+ *  2. feathering: s decays linearly over `feather` blocks away from
+ *     ROI edges (two-pass 8-neighbour chamfer on the block grid);
+ *  3. offset = A * (mean(s) - s), A = 2 * allocateQPOffset(), i.e. the
+ *     same ROI/background spread as the binary map, but the frame mean
+ *     is 0 and every offset stays within [-A, A].
+ * Frames without ROIs get an all-zero map. */
+void apply_roi_qp_graded(
+    x265_picture *pic,
+    ROI *rois,
+    int num_rois,
+    int block_size,
+    int feather)
+{
+    int width  = pic->width;
+    int height = pic->height;
+
+    int block_cols = (width  + block_size - 1) / block_size;
+    int block_rows = (height + block_size - 1) / block_size;
+    int n = block_cols * block_rows;
+
+    if (pic->quantOffsets == NULL) return;
+    float *s = pic->quantOffsets;   /* importance first, offsets at the end */
+    memset(s, 0, n * sizeof(float));
+
+    for (int i = 0; i < num_rois; i++) {
+        int c0, c1, r0, r1;
+        if (!block_range(rois[i].x1, rois[i].x2, block_size, block_cols, &c0, &c1) ||
+            !block_range(rois[i].y1, rois[i].y2, block_size, block_rows, &r0, &r1))
+            continue;
+        float w = clamp01(rois[i].weight);
+
+        for (int r = r0; r <= r1; r++) {
+            int by1 = r * block_size;
+            int by2 = by1 + block_size < height ? by1 + block_size : height;
+            int oy = (rois[i].y2 < by2 ? rois[i].y2 : by2) - (rois[i].y1 > by1 ? rois[i].y1 : by1);
+            if (oy <= 0) continue;
+
+            for (int c = c0; c <= c1; c++) {
+                int bx1 = c * block_size;
+                int bx2 = bx1 + block_size < width ? bx1 + block_size : width;
+                int ox = (rois[i].x2 < bx2 ? rois[i].x2 : bx2) - (rois[i].x1 > bx1 ? rois[i].x1 : bx1);
+                if (ox <= 0) continue;
+
+                float v = w * (float)(ox * oy) / (float)((bx2 - bx1) * (by2 - by1));
+                if (v > s[r * block_cols + c])
+                    s[r * block_cols + c] = v;
             }
+        }
+    }
 
-            pic->quantOffsets[r * block_cols + c] = qp;
+    if (feather > 0) {
+        float step = 1.0f / (float)(feather + 1);
+        for (int r = 0; r < block_rows; r++) {
+            for (int c = 0; c < block_cols; c++) {
+                float v = s[r * block_cols + c];
+                for (int dc = -1; dc <= 1 && r > 0; dc++)
+                    if (c + dc >= 0 && c + dc < block_cols && s[(r - 1) * block_cols + c + dc] - step > v)
+                        v = s[(r - 1) * block_cols + c + dc] - step;
+                if (c > 0 && s[r * block_cols + c - 1] - step > v)
+                    v = s[r * block_cols + c - 1] - step;
+                s[r * block_cols + c] = v;
+            }
+        }
+        for (int r = block_rows - 1; r >= 0; r--) {
+            for (int c = block_cols - 1; c >= 0; c--) {
+                float v = s[r * block_cols + c];
+                for (int dc = -1; dc <= 1 && r < block_rows - 1; dc++)
+                    if (c + dc >= 0 && c + dc < block_cols && s[(r + 1) * block_cols + c + dc] - step > v)
+                        v = s[(r + 1) * block_cols + c + dc] - step;
+                if (c < block_cols - 1 && s[r * block_cols + c + 1] - step > v)
+                    v = s[r * block_cols + c + 1] - step;
+                s[r * block_cols + c] = v;
+            }
         }
     }
+
+    double sum = 0.0;
+    for (int i = 0; i < n; i++)
+        sum += s[i];
+    float mean = (float)(sum / n);
+    if (mean <= 0.0f)
+        return;   /* no ROI: all zero */
+
+    float A = 2.0f * allocateQPOffset(rois, num_rois, width, height);
+    for (int i = 0; i < n; i++)
+        s[i] = A * (mean - s[i]);
+}
+
+/* ---------------- QG hold ---------------- */
+
+QGHold *qg_hold_open(int num_blocks, int hold)
+{
+    QGHold *h = calloc(1, sizeof(QGHold));
+    if (!h)
+        return NULL;
+    h->num_blocks = num_blocks;
+    h->hold = hold;
+    h->held = calloc(num_blocks, sizeof(float));
+    h->left = calloc(num_blocks, sizeof(int));
+    if (!h->held || !h->left) {
+        qg_hold_close(h);
+        return NULL;
+    }
+    return h;
+}
+
+void qg_hold_apply(QGHold *h, float *offsets)
+{
+    if (!h || !offsets)
+        return;
+    for (int i = 0; i < h->num_blocks; i++) {
+        if (offsets[i] < 0.0f) {
+            h->held[i] = offsets[i];
+            h->left[i] = h->hold + 1;
+        } else if (h->left[i] > 0) {
+            offsets[i] = h->held[i];
+        }
+        if (h->left[i] > 0)
+            h->left[i]--;
+    }
+}
+
+void qg_hold_close(QGHold *h)
+{
+    if (!h)
+        return;
+    free(h->held);
+    free(h->left);
+    free(h);
 }
@@ -8,6 +8,7 @@ typedef struct {
     int y1;
     int x2;
     int y2;
+    float weight;   /* detector confidence / priority in [0, 1], 1 if unknown */
 } ROI;
 
 void apply_roi_qp(
@@ -17,4 +18,26 @@ void apply_roi_qp(
     int ctu_size
 );
 
+void apply_roi_qp_graded(
+    x265_picture *pic,
+    ROI *rois,
+    int num_rois,
+    int block_size,
+    int feather
+);
+
+/* Per-QG hysteresis on quantOffsets maps, run in frame order: a QG that
+ * turns ROI (negative offset) switches at once, one that stops being ROI
+ * keeps its last ROI offset for `hold` more frames. */
+typedef struct {
+    int num_blocks;
+    int hold;
+    float *held;    /* last ROI offset of each QG */
+    int *left;      /* frames the held offset still applies */
+} QGHold;
+
+QGHold *qg_hold_open(int num_blocks, int hold);
+void qg_hold_apply(QGHold *h, float *offsets);
+void qg_hold_close(QGHold *h);
+
 #endif
@@ -0,0 +1,240 @@
+#include <x265.h>
+#include <stdlib.h>
+#include <string.h>
+#include "roi.h"
+#include "roi_encoder.h"
+
+struct RoiEncoder {
+    x265_param *param;
+    x265_encoder *encoder;
+    x265_picture pic;
+    x265_picture pic_out;
+    int qg_cols;
+    int qg_rows;
+    float *offsets;   /* quantOffsets must stay writable for x265 */
+    uint8_t *buf;
+    size_t buf_cap;
+};
+
+/* concatenates the NAL payloads into enc->buf */
+static int collect_nals(RoiEncoder *enc, x265_nal *nals, uint32_t num_nals,
+                        const uint8_t **data, size_t *size)
+{
+    size_t total = 0;
+    for (uint32_t i = 0; i < num_nals; i++)
+        total += nals[i].sizeBytes;
+
+    if (total > enc->buf_cap)
+    {
+        uint8_t *p = realloc(enc->buf, total);
+        if (!p)
+            return -1;
+        enc->buf = p;
+        enc->buf_cap = total;
+    }
+
+    size_t pos = 0;
+    for (uint32_t i = 0; i < num_nals; i++)
+    {
+        memcpy(enc->buf + pos, nals[i].payload, nals[i].sizeBytes);
+        pos += nals[i].sizeBytes;
+    }
+    *data = enc->buf;
+    *size = total;
+    return 0;
+}
+
+static void frame_info(const RoiEncoder *enc, int frames, RoiFrameInfo *info)
+{
+    if (!info)
+        return;
+    info->frames = frames;
+    info->pts = frames ? enc->pic_out.pts : -1;
+    info->slice_type = frames ? enc->pic_out.sliceType : 0;
+}
+
+RoiEncoder *roi_encoder_open(
+    int width,
+    int height,
+    int fps,
+    int qp,
+    int rc,
+    const char *preset,
+    int rd_level,
+    int rdoq_level,
+    double psy_rd)
+{
+    RoiEncoder *enc = calloc(1, sizeof(RoiEncoder));
+    if (!enc)
+        return NULL;
+
+    /* same settings as main.c */
+    x265_param *param = x265_param_alloc();
+    x265_param_default_preset(param, preset ? preset : "veryfast", "psnr");
+    param->sourceWidth = width;
+    param->sourceHeight = height;
+    param->fpsNum = fps;
+    param->fpsDenom = 1;
+    param->rc.rateControlMode = rc;
+    param->rc.qp = qp;
+    param->rc.rfConstant = (double)qp;
+    param->rc.aqMode = 1;
+    param->rc.aqStrength = 0.0f;
+    param->rc.qgSize = 16;
+    param->rc.cuTree = 1;
+    param->rdLevel = rd_level;
+    param->rdoqLevel = rdoq_level;
+    param->psyRd = psy_rd;
+    param->bAnnexB = 1;
+    enc->param = param;
+
+    enc->encoder = x265_encoder_open(param);
+    if (!enc->encoder)
+    {
+        roi_encoder_close(enc);
+        return NULL;
+    }
+
+    x265_picture_init(param, &enc->pic);
+    x265_picture_init(param, &enc->pic_out);
+    enc->pic.width = width;
+    enc->pic.height = height;
+
+    int qg = param->rc.qgSize;
+    enc->qg_cols = (width + qg - 1) / qg;
+    enc->qg_rows = (height + qg - 1) / qg;
+    enc->offsets = malloc(enc->qg_cols * enc->qg_rows * sizeof(float));
+    if (!enc->offsets)
+    {
+        roi_encoder_close(enc);
+        return NULL;
+    }
+    return enc;
+}
+
+void roi_encoder_qg_grid(const RoiEncoder *enc, int *qg_size, int *cols, int *rows)
+{
+    *qg_size = enc->param->rc.qgSize;
+    *cols = enc->qg_cols;
+    *rows = enc->qg_rows;
+}
+
+int roi_encoder_headers(RoiEncoder *enc, const uint8_t **data, size_t *size)
+{
+    x265_nal *nals;
+    uint32_t num_nals;
+    if (x265_encoder_headers(enc->encoder, &nals, &num_nals) < 0)
+        return -1;
+    return collect_nals(enc, nals, num_nals, data, size);
+}
+
+int roi_encoder_encode(
+    RoiEncoder *enc,
+    const uint8_t *y,
+    const uint8_t *u,
+    const uint8_t *v,
+    int stride_y,
+    int stride_uv,
+    const float *offsets,
+    int64_t pts,
+    const uint8_t **data,
+    size_t *size,
+    RoiFrameInfo *info)
+{
+    x265_picture *pic = &enc->pic;
+    /* x265 copies the planes into its own frame buffers on input */
+    pic->planes[0] = (void *)y;
+    pic->planes[1] = (void *)u;
+    pic->planes[2] = (void *)v;
+    pic->stride[0] = stride_y;
+    pic->stride[1] = stride_uv;
+    pic->stride[2] = stride_uv;
+    pic->pts = pts;
+
+    pic->quantOffsets = NULL;
+    if (offsets)
+    {
+        memcpy(enc->offsets, offsets, enc->qg_cols * enc->qg_rows * sizeof(float));
+        pic->quantOffsets = enc->offsets;
+    }
+
+    x265_nal *nals;
+    uint32_t num_nals;
+    int got = x265_encoder_encode(enc->encoder, &nals, &num_nals, pic, &enc->pic_out);
+    if (got < 0)
+        return -1;
+    frame_info(enc, got, info);
+    if (collect_nals(enc, nals, num_nals, data, size) < 0)
+        return -1;
+    return got;
+}
+
+int roi_encoder_flush(
+    RoiEncoder *enc,
+    const uint8_t **data,
+    size_t *size,
+    RoiFrameInfo *info)
+{
+    x265_nal *nals;
+    uint32_t num_nals;
+    int got = x265_encoder_encode(enc->encoder, &nals, &num_nals, NULL, &enc->pic_out);
+    if (got < 0)
+        return -1;
+    frame_info(enc, got, info);
+    if (collect_nals(enc, nals, num_nals, data, size) < 0)
+        return -1;
+    return got;
+}
+
+void roi_encoder_close(RoiEncoder *enc)
+{
+    if (!enc)
+        return;
+    if (enc->encoder)
+        x265_encoder_close(enc->encoder);
+    if (enc->param)
+        x265_param_free(enc->param);
+    free(enc->offsets);
+    free(enc->buf);
+    free(enc);
+}
+
+void roi_offset_map(
+    int width,
+    int height,
+    int qg_size,
+    const int32_t *boxes,
+    const float *weights,
+    int num_rois,
+    int graded,
+    int feather,
+    float *offsets)
+{
+    int n = ((width + qg_size - 1) / qg_size) * ((height + qg_size - 1) / qg_size);
+    memset(offsets, 0, n * sizeof(float));
+    if (num_rois <= 0)
+        return;   /* as main.c: frames without ROIs keep a zero map */
+
+    ROI *rois = malloc(num_rois * sizeof(ROI));
+    if (!rois)
+        return;
+    for (int i = 0; i < num_rois; i++)
+    {
+        rois[i].x1 = boxes[4 * i];
+        rois[i].y1 = boxes[4 * i + 1];
+        rois[i].x2 = boxes[4 * i + 2];
+        rois[i].y2 = boxes[4 * i + 3];
+        rois[i].weight = weights ? weights[i] : 1.0f;
+    }
+
+    x265_picture pic;
+    memset(&pic, 0, sizeof(pic));
+    pic.width = width;
+    pic.height = height;
+    pic.quantOffsets = offsets;
+    if (graded)
+        apply_roi_qp_graded(&pic, rois, num_rois, qg_size, feather);
+    else
+        apply_roi_qp(&pic, rois, num_rois, qg_size);
+    free(rois);
+}
@@ -0,0 +1,78 @@
+#ifndef ROI_ENCODER_H
+#define ROI_ENCODER_H
+
+#include <stddef.h>
+#include <stdint.h>
+
+/* ---------------- in-process encoder (libroi_x265.so) ----------------
+ * Flat C API over libx265 + roi.c for src/utils/roi_encoder.py (ctypes).
+ * Planes and offset maps come from the caller's buffers; NAL payloads of
+ * every call are concatenated into an internal buffer that stays valid
+ * until the next call on the same encoder.
+ */
+typedef struct RoiEncoder RoiEncoder;
+
+typedef struct {
+    int64_t pts;      /* of the frame whose NALs were returned */
+    int slice_type;   /* X265_TYPE_* */
+    int frames;       /* 1 if a frame was output, else 0 */
+} RoiFrameInfo;
+
+RoiEncoder *roi_encoder_open(
+    int width,
+    int height,
+    int fps,
+    int qp,
+    int rc,
+    const char *preset,
+    int rd_level,
+    int rdoq_level,
+    double psy_rd
+);
+
+void roi_encoder_qg_grid(const RoiEncoder *enc, int *qg_size, int *cols, int *rows);
+
+/* VPS/SPS/PPS; 0 on success */
+int roi_encoder_headers(RoiEncoder *enc, const uint8_t **data, size_t *size);
+
+/* One YUV420p frame; offsets is a rows x cols float map or NULL.
+ * Returns frames output (0/1) or -1. */
+int roi_encoder_encode(
+    RoiEncoder *enc,
+    const uint8_t *y,
+    const uint8_t *u,
+    const uint8_t *v,
+    int stride_y,
+    int stride_uv,
+    const float *offsets,
+    int64_t pts,
+    const uint8_t **data,
+    size_t *size,
+    RoiFrameInfo *info
+);
+
+/* Drains delayed frames, one per call; returns 0 once empty. */
+int roi_encoder_flush(
+    RoiEncoder *enc,
+    const uint8_t **data,
+    size_t *size,
+    RoiFrameInfo *info
+);
+
+void roi_encoder_close(RoiEncoder *enc);
+
+/* apply_roi_qp / apply_roi_qp_graded on a rows x cols map without an
+ * encoder; boxes is int32[num_rois][4], weights float32[num_rois] or NULL. */
+void roi_offset_map(
+    int width,
+    int height,
+    int qg_size,
+    const int32_t *boxes,
+    const float *weights,
+    int num_rois,
+    int graded,
+    int feather,
+    float *offsets
+);
+
+#endif
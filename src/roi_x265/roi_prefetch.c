@@ -0,0 +1,196 @@
+#include "roi_prefetch.h"
+#include "timing.h"
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+static void rasterise(ROIPrefetch *pf, int frame, ROIMapSlot *slot)
+{
+    const ROIMapSource *src = &pf->src;
+    size_t bytes = (size_t)pf->num_blocks * sizeof(float);
+
+    slot->num_rois = 0;
+    slot->missing = 0;
+
+    if (src->qg_map)
+    {
+        if (!qgmap_frame(src->qg_map, frame, slot->offsets))
+            memset(slot->offsets, 0, bytes);
+        return;
+    }
+
+    memset(slot->offsets, 0, bytes);
+
+    int n;
+    if (src->roi_file)
+    {
+        n = roi_file_frame(src->roi_file, frame, &pf->rois, &pf->roi_cap);
+    }
+    else
+    {
+        char roi_txt[1024];
+        snprintf(roi_txt, sizeof(roi_txt),
+                 "%s/frame_%04d_roi.txt", src->roi_dir, frame);
+        n = load_roi_txt(roi_txt, &pf->rois, &pf->roi_cap);
+        if (n < 0)
+        {
+            slot->missing = 1;
+            n = 0;
+        }
+    }
+    slot->num_rois = n;
+    if (n <= 0)
+        return;
+
+    x265_picture pic;
+    memset(&pic, 0, sizeof(pic));
+    pic.width = src->width;
+    pic.height = src->height;
+    pic.quantOffsets = slot->offsets;
+    if (src->graded)
+        apply_roi_qp_graded(&pic, pf->rois, n, src->qg_size, src->feather);
+    else
+        apply_roi_qp(&pic, pf->rois, n, src->qg_size);
+}
+
+/* one frame's map into slot, on whichever thread does the loading */
+static void build_map(ROIPrefetch *pf, int frame, ROIMapSlot *slot)
+{
+    double t0 = now_ms();
+    rasterise(pf, frame, slot);
+    slot->build_ms = now_ms() - t0;
+}
+
+static void *loader_main(void *arg)
+{
+    ROIPrefetch *pf = arg;
+
+    pthread_mutex_lock(&pf->lock);
+    while (1)
+    {
+        while (!pf->stop && pf->count + (pf->held >= 0) >= pf->depth)
+            pthread_cond_wait(&pf->cond, &pf->lock);
+        if (pf->stop)
+            break;
+
+        int slot = (pf->head + pf->count) % pf->depth;
+        int frame = pf->next_frame++;
+        pthread_mutex_unlock(&pf->lock);
+        build_map(pf, frame, &pf->slots[slot]);
+        pthread_mutex_lock(&pf->lock);
+
+        pf->count++;
+        pthread_cond_broadcast(&pf->cond);
+    }
+    pthread_mutex_unlock(&pf->lock);
+    return NULL;
+}
+
+ROIPrefetch *roi_prefetch_open(const ROIMapSource *src, int depth)
+{
+    ROIPrefetch *pf = calloc(1, sizeof(ROIPrefetch));
+    if (!pf)
+        return NULL;
+
+    int cols = (src->width + src->qg_size - 1) / src->qg_size;
+    int rows = (src->height + src->qg_size - 1) / src->qg_size;
+    pf->src = *src;
+    pf->num_blocks = cols * rows;
+    pf->held = -1;
+    pf->threaded = depth > 0;
+    /* one slot for the encoder plus depth frames ahead */
+    pf->depth = pf->threaded ? depth + 1 : 1;
+
+    pf->slots = calloc(pf->depth, sizeof(ROIMapSlot));
+    if (!pf->slots)
+    {
+        roi_prefetch_close(pf);
+        return NULL;
+    }
+    for (int i = 0; i < pf->depth; i++)
+    {
+        pf->slots[i].offsets = malloc((size_t)pf->num_blocks * sizeof(float));
+        if (!pf->slots[i].offsets)
+        {
+            fprintf(stderr, "Cannot allocate %d ROI map buffers\n", pf->depth);
+            roi_prefetch_close(pf);
+            return NULL;
+        }
+    }
+
+    if (pf->threaded)
+    {
+        pthread_mutex_init(&pf->lock, NULL);
+        pthread_cond_init(&pf->cond, NULL);
+        if (pthread_create(&pf->thread, NULL, loader_main, pf))
+        {
+            /* no thread: build the maps on the encode loop as before */
+            pthread_mutex_destroy(&pf->lock);
+            pthread_cond_destroy(&pf->cond);
+            pf->threaded = 0;
+        }
+    }
+    return pf;
+}
+
+float *roi_prefetch_next(ROIPrefetch *pf, int *num_rois, double *build_ms)
+{
+    double t0 = now_ms();
+    ROIMapSlot *slot;
+
+    if (!pf->threaded)
+    {
+        slot = &pf->slots[0];
+        build_map(pf, pf->next_frame++, slot);
+        pf->stalls++;
+    }
+    else
+    {
+        pthread_mutex_lock(&pf->lock);
+        pf->held = -1;
+        pthread_cond_broadcast(&pf->cond);
+        if (!pf->count)
+        {
+            pf->stalls++;
+            while (!pf->count)
+                pthread_cond_wait(&pf->cond, &pf->lock);
+        }
+        pf->held = pf->head;
+        pf->head = (pf->head + 1) % pf->depth;
+        pf->count--;
+        slot = &pf->slots[pf->held];
+        pthread_mutex_unlock(&pf->lock);
+    }
+
+    pf->stall_ms += now_ms() - t0;
+    pf->frames++;
+    pf->missing += slot->missing;
+    *num_rois = slot->num_rois;
+    *build_ms = slot->build_ms;
+    return slot->offsets;
+}
+
+void roi_prefetch_close(ROIPrefetch *pf)
+{
+    if (!pf)
+        return;
+
+    if (pf->threaded)
+    {
+        pthread_mutex_lock(&pf->lock);
+        pf->stop = 1;
+        pthread_cond_broadcast(&pf->cond);
+        pthread_mutex_unlock(&pf->lock);
+        pthread_join(pf->thread, NULL);
+        pthread_mutex_destroy(&pf->lock);
+        pthread_cond_destroy(&pf->cond);
+    }
+    if (pf->slots)
+    {
+        for (int i = 0; i < pf->depth; i++)
+            free(pf->slots[i].offsets);
+        free(pf->slots);
+    }
+    free(pf->rois);
+    free(pf);
+}
@@ -0,0 +1,72 @@
+#ifndef ROI_PREFETCH_H
+#define ROI_PREFETCH_H
+
+#include <pthread.h>
+#include "roi.h"
+#include "roi_reader.h"
+
+/* ---------------- per-frame offset maps (--roi-prefetch) ----------------
+ * Loads each frame's ROIs from the frame_XXXX_roi.txt directory, the .roi
+ * container or the .qgm maps and rasterises them into a quantOffsets map.
+ * With depth > 0 a background thread builds the maps of the next `depth`
+ * frames into a ring of buffers, so the encode loop never waits on file
+ * system metadata or parsing; depth 0 builds them on the caller's thread.
+ *
+ * x265_encoder_encode copies quantOffsets, so the buffer of a frame is
+ * reused once the next frame's map is requested.
+ */
+#define ROI_PREFETCH_DEPTH 4
+
+typedef struct {
+    const char *roi_dir;        /* text files, when roi_file / qg_map are NULL */
+    ROIFile *roi_file;
+    QGMapFile *qg_map;
+    int width;
+    int height;
+    int qg_size;
+    int graded;
+    int feather;
+} ROIMapSource;
+
+typedef struct {
+    float *offsets;
+    int num_rois;
+    int missing;                /* no ROI file for the frame */
+    double build_ms;            /* ROI load + rasterisation, on the loader */
+} ROIMapSlot;
+
+typedef struct {
+    ROIMapSource src;
+    int num_blocks;
+    ROI *rois;                  /* loader-side ROI array */
+    int roi_cap;
+
+    /* ring, filled = [head, head + count) */
+    ROIMapSlot *slots;
+    int depth;
+    int head;
+    int count;
+    int held;                   /* slot in use by the encoder, -1 if none */
+    int next_frame;             /* next frame the loader builds */
+    int threaded;
+    int stop;
+    pthread_t thread;
+    pthread_mutex_t lock;
+    pthread_cond_t cond;
+
+    /* encode-loop side counters */
+    int frames;
+    int missing;                /* frames without a ROI file */
+    int stalls;                 /* frames whose map was not ready yet */
+    double stall_ms;            /* time spent waiting for maps */
+} ROIPrefetch;
+
+ROIPrefetch *roi_prefetch_open(const ROIMapSource *src, int depth);
+
+/* map of the next frame (0, 1, 2, ...), num_rois set to its ROI count and
+ * build_ms to the time its map took to build, excluding any wait for it */
+float *roi_prefetch_next(ROIPrefetch *pf, int *num_rois, double *build_ms);
+
+void roi_prefetch_close(ROIPrefetch *pf);
+
+#endif
@@ -1,25 +1,335 @@
 #include "roi_reader.h"
+#include <limits.h>
 #include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+/* Grows *rois to hold at least n entries; *cap tracks the allocation. */
+int roi_reserve(ROI **rois, int *cap, int n)
+{
+    if (n <= *cap)
+        return 1;
+
+    /* doubling in size_t, clamped back to what an int capacity can hold */
+    size_t new_cap = *cap > 0 ? (size_t)*cap : 64;
+    while (new_cap < (size_t)n)
+        new_cap *= 2;
+    if (new_cap > INT_MAX)
+        new_cap = INT_MAX;
+    if (new_cap > SIZE_MAX / sizeof(ROI))
+        return 0;
+
+    ROI *p = realloc(*rois, new_cap * sizeof(ROI));
+    if (!p)
+        return 0;
+    *rois = p;
+    *cap = (int)new_cap;
+    return 1;
+}
 
 int load_roi_txt(
     const char *filename,
-    ROI *rois
+    ROI **rois,
+    int *cap
     )
 {
+    /* frames without ROIs may have no file; callers count these */
     FILE *f = fopen(filename, "r");
-    if (!f) {
-        printf("No ROI file found: %s\n", filename);
-        return 0;
-    } 
+    if (!f)
+        return -1;
 
+    /* x1, y1, x2, y2[, weight] per line */
     int n = 0;
-    while (fscanf(f, " %d%*[, ]%d%*[, ]%d%*[, ]%d",
-                  &rois[n].x1,
-                  &rois[n].y1,
-                  &rois[n].x2,
-                  &rois[n].y2) == 4) {
-        n++;
-    };
+    char line[256];
+    while (fgets(line, sizeof(line), f)) {
+        ROI r;
+        r.weight = 1.0f;
+        if (sscanf(line, " %d%*[, ]%d%*[, ]%d%*[, ]%d%*[, ]%f",
+                   &r.x1,
+                   &r.y1,
+                   &r.x2,
+                   &r.y2,
+                   &r.weight) < 4)
+            continue;
+        if (!roi_reserve(rois, cap, n + 1))
+            break;
+        (*rois)[n++] = r;
+    }
+    fclose(f);
+    return n;
+}
+
+/* ---------------- binary ROI container ---------------- */
+
+#define ROI_FILE_HEADER 32
+
+static uint32_t read_u32(const unsigned char *p)
+{
+    return (uint32_t)p[0] | (uint32_t)p[1] << 8 |
+           (uint32_t)p[2] << 16 | (uint32_t)p[3] << 24;
+}
+
+ROIFile *roi_file_open(const char *filename)
+{
+    FILE *f = fopen(filename, "rb");
+    if (!f) {
+        fprintf(stderr, "No ROI file found: %s\n", filename);
+        return NULL;
+    }
+
+    fseek(f, 0, SEEK_END);
+    long size = ftell(f);
+    fseek(f, 0, SEEK_SET);
+
+    /* whole container in one read, frames are then served from memory */
+    unsigned char *data = malloc(size > 0 ? size : 1);
+    if (!data || size < ROI_FILE_HEADER ||
+        fread(data, 1, size, f) != (size_t)size ||
+        memcmp(data, "ROIB", 4) != 0 ||
+        (data[4] | data[5] << 8) != 1) {
+        fprintf(stderr, "Invalid ROI container: %s\n", filename);
+        free(data);
+        fclose(f);
+        return NULL;
+    }
     fclose(f);
+
+    ROIFile *rf = calloc(1, sizeof(ROIFile));
+    if (!rf) {
+        fprintf(stderr, "Cannot load ROI container: %s\n", filename);
+        free(data);
+        return NULL;
+    }
+    rf->flags      = data[6] | data[7] << 8;
+    rf->width      = (int)read_u32(data + 8);
+    rf->height     = (int)read_u32(data + 12);
+    rf->num_frames = (int)read_u32(data + 16);
+    rf->num_boxes  = (int)read_u32(data + 20);
+    rf->data       = data;
+
+    if (rf->num_frames < 0 || rf->num_boxes < 0) {
+        fprintf(stderr, "Invalid ROI container: %s\n", filename);
+        roi_file_close(rf);
+        return NULL;
+    }
+
+    size_t coord = (rf->flags & ROI_FILE_INT32) ? 4 : 2;
+    size_t index_bytes = 4 * ((size_t)rf->num_frames + 1);
+    size_t box_bytes = coord * 4 * (size_t)rf->num_boxes;
+    size_t score_bytes = (rf->flags & ROI_FILE_SCORES) ? 4 * (size_t)rf->num_boxes : 0;
+    if ((size_t)size < ROI_FILE_HEADER + index_bytes + box_bytes + score_bytes) {
+        fprintf(stderr, "Truncated ROI container: %s\n", filename);
+        roi_file_close(rf);
+        return NULL;
+    }
+
+    /* the writer is little-endian and fields are naturally aligned */
+    rf->index = (const uint32_t *)(data + ROI_FILE_HEADER);
+    rf->boxes = data + ROI_FILE_HEADER + index_bytes;
+    rf->scores = score_bytes ? (const float *)(data + ROI_FILE_HEADER + index_bytes + box_bytes) : NULL;
+
+    /* roi_file_frame trusts the index: it must start at 0, never go back
+     * and stay within the boxes that are actually stored */
+    for (int i = 0; i <= rf->num_frames; i++) {
+        uint32_t prev = i ? rf->index[i - 1] : 0;
+        if (rf->index[i] < prev || rf->index[i] > (uint32_t)rf->num_boxes ||
+            (i == 0 && rf->index[0] != 0)) {
+            fprintf(stderr, "Corrupt ROI container index at frame %d: %s\n", i, filename);
+            roi_file_close(rf);
+            return NULL;
+        }
+    }
+    return rf;
+}
+
+int roi_file_frame(
+    const ROIFile *rf,
+    int frame,
+    ROI **rois,
+    int *cap
+    )
+{
+    if (!rf || frame < 0 || frame >= rf->num_frames)
+        return 0;
+
+    int first = (int)rf->index[frame];
+    int n = (int)rf->index[frame + 1] - first;
+    if (!roi_reserve(rois, cap, n))
+        return 0;
+
+    ROI *out = *rois;
+    for (int i = 0; i < n; i++) {
+        int b = 4 * (first + i);
+        out[i].weight = rf->scores ? rf->scores[first + i] : 1.0f;
+        if (rf->flags & ROI_FILE_INT32) {
+            const int32_t *p = (const int32_t *)rf->boxes + b;
+            out[i].x1 = p[0]; out[i].y1 = p[1];
+            out[i].x2 = p[2]; out[i].y2 = p[3];
+        } else {
+            const int16_t *p = (const int16_t *)rf->boxes + b;
+            out[i].x1 = p[0]; out[i].y1 = p[1];
+            out[i].x2 = p[2]; out[i].y2 = p[3];
+        }
+    }
     return n;
-}
\ No newline at end of file
+}
+
+void roi_file_close(ROIFile *rf)
+{
+    if (!rf)
+        return;
+    free(rf->data);
+    free(rf);
+}
+
+
+/* ---------------- QG offset maps ---------------- */
+
+#define QGMAP_HEADER 32
+
+QGMapFile *qgmap_open(const char *filename)
+{
+    FILE *f = fopen(filename, "rb");
+    if (!f) {
+        fprintf(stderr, "No QG map file found: %s\n", filename);
+        return NULL;
+    }
+
+    unsigned char h[QGMAP_HEADER];
+    if (fread(h, 1, QGMAP_HEADER, f) != QGMAP_HEADER ||
+        memcmp(h, "QGMP", 4) != 0 || (h[4] | h[5] << 8) != 1) {
+        fprintf(stderr, "Invalid QG map file: %s\n", filename);
+        fclose(f);
+        return NULL;
+    }
+
+    QGMapFile *qf = calloc(1, sizeof(QGMapFile));
+    qf->fp         = f;
+    qf->qg_size    = h[6] | h[7] << 8;
+    qf->cols       = (int)read_u32(h + 8);
+    qf->rows       = (int)read_u32(h + 12);
+    qf->num_frames = (int)read_u32(h + 16);
+    return qf;
+}
+
+/* Reads frame's map straight into offsets (cols * rows floats).
+ * Returns 0 past the last frame or on a short read. */
+int qgmap_frame(
+    const QGMapFile *qf,
+    int frame,
+    float *offsets
+    )
+{
+    if (!qf || frame < 0 || frame >= qf->num_frames)
+        return 0;
+
+    size_t n = (size_t)qf->cols * qf->rows;
+    long pos = QGMAP_HEADER + (long)frame * (long)(n * sizeof(float));
+    if (fseek(qf->fp, pos, SEEK_SET) != 0)
+        return 0;
+    return fread(offsets, sizeof(float), n, qf->fp) == n;
+}
+
+void qgmap_close(QGMapFile *qf)
+{
+    if (!qf)
+        return;
+    fclose(qf->fp);
+    free(qf);
+}
+
+/* ---------------- ROI stream ---------------- */
+
+int roi_packet_header(FILE *fp, ROIPacket *pkt)
+{
+    unsigned char h[ROI_STREAM_HEADER];
+    if (fread(h, 1, ROI_STREAM_HEADER, fp) != ROI_STREAM_HEADER)
+        return 0;
+    if (memcmp(h, "RXFR", 4) != 0) {
+        fprintf(stderr, "Bad ROI stream packet\n");
+        return 0;
+    }
+    pkt->frame    = read_u32(h + 4);
+    pkt->num_rois = read_u32(h + 8);
+    pkt->flags    = read_u32(h + 12);
+    return 1;
+}
+
+int roi_packet_rois(FILE *fp, const ROIPacket *pkt, ROI **rois, int *cap)
+{
+    /* num_rois comes off the wire: refuse counts no producer would send,
+     * and grow the array with the records actually read rather than up
+     * front, so a short payload never costs more than its own size */
+    if (pkt->num_rois > ROI_STREAM_MAX_ROIS) {
+        fprintf(stderr, "Bad ROI stream packet: %u rois\n", (unsigned)pkt->num_rois);
+        return -1;
+    }
+    int n = (int)pkt->num_rois;
+
+    for (int i = 0; i < n; i++) {
+        unsigned char r[ROI_STREAM_RECORD];
+        if (fread(r, 1, sizeof(r), fp) != sizeof(r))
+            return -1;
+        if (!roi_reserve(rois, cap, i + 1))
+            return -1;
+        ROI *out = *rois + i;
+        out->x1 = (int32_t)read_u32(r);
+        out->y1 = (int32_t)read_u32(r + 4);
+        out->x2 = (int32_t)read_u32(r + 8);
+        out->y2 = (int32_t)read_u32(r + 12);
+        memcpy(&out->weight, r + 16, sizeof(float));
+    }
+    return n;
+}
+
+ROIStream *roi_stream_open(const char *path)
+{
+    /* a FIFO blocks here until the producer opens its end */
+    FILE *f = fopen(path, "rb");
+    if (!f) {
+        fprintf(stderr, "Cannot open ROI stream: %s\n", path);
+        return NULL;
+    }
+    ROIStream *rs = calloc(1, sizeof(ROIStream));
+    rs->fp = f;
+    return rs;
+}
+
+int roi_stream_frame(
+    ROIStream *rs,
+    int frame,
+    ROI **rois,
+    int *cap
+    )
+{
+    while (!rs->eof) {
+        if (!rs->has_pending) {
+            if (!roi_packet_header(rs->fp, &rs->pending)) {
+                rs->eof = 1;
+                break;
+            }
+            rs->has_pending = 1;
+        }
+        if ((int)rs->pending.frame > frame)
+            return 0;
+
+        rs->has_pending = 0;
+        int n = roi_packet_rois(rs->fp, &rs->pending, rois, cap);
+        if (n < 0) {
+            rs->eof = 1;
+            break;
+        }
+        if ((int)rs->pending.frame == frame)
+            return n;
+        /* stale packet for an earlier frame: drop it */
+    }
+    return 0;
+}
+
+void roi_stream_close(ROIStream *rs)
+{
+    if (!rs)
+        return;
+    fclose(rs->fp);
+    free(rs);
+}
@@ -1,11 +1,123 @@
 #ifndef ROI_READER_H
 #define ROI_READER_H
 
+#include <stdint.h>
+#include <stdio.h>
 #include "roi.h"
 
+/* ROI arrays are heap-allocated and grown on demand: pass the same
+ * (ROI *, capacity) pair every frame and free() it at the end. */
+int roi_reserve(ROI **rois, int *cap, int n);
+
+/* -1 if the file does not exist */
 int load_roi_txt(
     const char *filename,
-    ROI *rois
+    ROI **rois,
+    int *cap
+);
+
+/* ---------------- binary ROI container (.roi) ----------------
+ * One file per sequence, written by src/utils/roi_container.py:
+ *   header  "ROIB" u16 version, u16 flags, u32 width, height,
+ *           num_frames, num_boxes, u32 reserved[2]   (32 bytes, LE)
+ *   index   u32[num_frames + 1]  box offsets per frame
+ *   boxes   int16 (int32 if ROI_FILE_INT32) [num_boxes][4]
+ *   scores  float32[num_boxes] if ROI_FILE_SCORES (ROI weights for --graded)
+ *   classes follow when flagged (not used by the encoder)
+ */
+#define ROI_FILE_INT32   1
+#define ROI_FILE_SCORES  2
+#define ROI_FILE_CLASSES 4
+
+typedef struct {
+    int width;
+    int height;
+    int num_frames;
+    int num_boxes;
+    int flags;
+    const uint32_t *index;
+    const void *boxes;
+    const float *scores;    /* NULL unless ROI_FILE_SCORES */
+    unsigned char *data;
+} ROIFile;
+
+ROIFile *roi_file_open(const char *filename);
+
+int roi_file_frame(
+    const ROIFile *rf,
+    int frame,
+    ROI **rois,
+    int *cap
+);
+
+void roi_file_close(ROIFile *rf);
+
+/* ---------------- QG offset maps (.qgm) ----------------
+ * Per-frame pic.quantOffsets written by extract_roi.py --qg_map:
+ *   header  "QGMP" u16 version, u16 qg_size, u32 cols, rows, num_frames,
+ *           u32 reserved[3]   (32 bytes, LE)
+ *   maps    float32[num_frames][rows][cols]
+ */
+typedef struct {
+    FILE *fp;
+    int qg_size;
+    int cols;
+    int rows;
+    int num_frames;
+} QGMapFile;
+
+QGMapFile *qgmap_open(const char *filename);
+
+int qgmap_frame(
+    const QGMapFile *qf,
+    int frame,
+    float *offsets
 );
 
+void qgmap_close(QGMapFile *qf);
+
+/* ---------------- ROI stream (pipe / socket / interleaved) ----------------
+ * Packets written by scripts/replay_yuv.py (roi_container.pack_stream_packet):
+ *   header  "RXFR" u32 frame, u32 num_rois, u32 flags   (16 bytes, LE)
+ *   rois    { int32 x1, y1, x2, y2; float32 weight } [num_rois]
+ *   frame   one YUV420p frame if flags & ROI_STREAM_YUV (interleaved input)
+ */
+#define ROI_STREAM_HEADER   16
+#define ROI_STREAM_RECORD   20
+#define ROI_STREAM_YUV      1
+#define ROI_STREAM_MAX_ROIS 65536   /* larger counts are rejected as corrupt */
+
+typedef struct {
+    uint32_t frame;
+    uint32_t num_rois;
+    uint32_t flags;
+} ROIPacket;
+
+/* 1 on a complete header, 0 at end of stream or on a bad magic */
+int roi_packet_header(FILE *fp, ROIPacket *pkt);
+
+/* reads the packet's records into *rois; returns num_rois or -1 */
+int roi_packet_rois(FILE *fp, const ROIPacket *pkt, ROI **rois, int *cap);
+
+/* ROI packets on their own pipe, matched to frames by index */
+typedef struct {
+    FILE *fp;
+    ROIPacket pending;
+    int has_pending;
+    int eof;
+} ROIStream;
+
+ROIStream *roi_stream_open(const char *path);
+
+/* ROIs of `frame`: older packets are skipped, a packet for a later frame
+ * is kept for later and the frame gets no ROIs. */
+int roi_stream_frame(
+    ROIStream *rs,
+    int frame,
+    ROI **rois,
+    int *cap
+);
+
+void roi_stream_close(ROIStream *rs);
+
 #endif
@@ -0,0 +1,127 @@
+#include "telemetry.h"
+#include <x265.h>
+#include <stdlib.h>
+#include <string.h>
+#include "timing.h"
+
+static char slice_char(int slice_type)
+{
+    switch (slice_type)
+    {
+    case X265_TYPE_IDR:
+    case X265_TYPE_I:    return 'I';
+    case X265_TYPE_P:    return 'P';
+    case X265_TYPE_BREF: return 'B';
+    case X265_TYPE_B:    return 'b';
+    default:             return '?';
+    }
+}
+
+Telemetry *telemetry_open(const char *path)
+{
+    Telemetry *tm = calloc(1, sizeof(Telemetry));
+    if (!tm || !path)
+        return tm;
+
+    tm->fp = fopen(path, "w");
+    if (!tm->fp)
+    {
+        fprintf(stderr, "Cannot open stats file: %s\n", path);
+        free(tm);
+        return NULL;
+    }
+    size_t len = strlen(path);
+    tm->jsonl = len > 6 && !strcmp(path + len - 6, ".jsonl");
+    if (!tm->jsonl)
+        fprintf(tm->fp, "frame,type,qp,bits,roi_ratio,num_rois,roi_offset,bg_offset,map_ms,encode_ms,latency_ms\n");
+    return tm;
+}
+
+double roi_coverage(const float *offsets, int num_blocks)
+{
+    if (!offsets || num_blocks <= 0)
+        return 0.0;
+    int roi = 0;
+    for (int i = 0; i < num_blocks; i++)
+        roi += offsets[i] < 0.0f;
+    return (double)roi / num_blocks;
+}
+
+void telemetry_in(
+    Telemetry *tm,
+    int64_t pts,
+    double t_in,
+    double map_ms,
+    double roi_ratio,
+    const float *offsets,
+    int num_blocks,
+    int num_rois)
+{
+    FrameRecord *r = &tm->rec[pts % TELEMETRY_HISTORY];
+    memset(r, 0, sizeof(*r));
+    r->t_in = t_in;
+    r->map_ms = map_ms;
+    r->num_rois = num_rois;
+    r->roi_ratio = roi_ratio;
+    if (!offsets || num_blocks <= 0)
+        return;
+
+    float lo = offsets[0], hi = offsets[0];
+    for (int i = 1; i < num_blocks; i++)
+    {
+        if (offsets[i] < lo) lo = offsets[i];
+        if (offsets[i] > hi) hi = offsets[i];
+    }
+    r->roi_offset = lo;
+    r->bg_offset = hi;
+}
+
+void telemetry_out(
+    Telemetry *tm,
+    int64_t pts,
+    int slice_type,
+    double qp,
+    uint64_t bytes,
+    double encode_ms)
+{
+    const FrameRecord *r = &tm->rec[pts % TELEMETRY_HISTORY];
+    double latency = now_ms() - r->t_in;
+    double bits = 8.0 * (double)bytes;
+
+    tm->frames++;
+    tm->bits += bits;
+    tm->encode_sum += encode_ms;
+    tm->latency_sum += latency;
+    if (latency > tm->latency_max)
+        tm->latency_max = latency;
+
+    if (!tm->fp)
+        return;
+    if (tm->jsonl)
+        fprintf(tm->fp,
+                "{\"frame\": %lld, \"type\": \"%c\", \"qp\": %.2f, \"bits\": %.0f, "
+                "\"roi_ratio\": %.4f, \"num_rois\": %d, \"roi_offset\": %.2f, \"bg_offset\": %.2f, "
+                "\"map_ms\": %.3f, \"encode_ms\": %.3f, \"latency_ms\": %.3f}\n",
+                (long long)pts, slice_char(slice_type), qp, bits,
+                r->roi_ratio, r->num_rois, r->roi_offset, r->bg_offset,
+                r->map_ms, encode_ms, latency);
+    else
+        fprintf(tm->fp, "%lld,%c,%.2f,%.0f,%.4f,%d,%.2f,%.2f,%.3f,%.3f,%.3f\n",
+                (long long)pts, slice_char(slice_type), qp, bits,
+                r->roi_ratio, r->num_rois, r->roi_offset, r->bg_offset,
+                r->map_ms, encode_ms, latency);
+}
+
+void telemetry_close(Telemetry *tm, int summary, double fps)
+{
+    if (!tm)
+        return;
+    if ((summary || tm->fp) && tm->frames)
+        fprintf(stderr, "stats: %d frames, %.1f kbps, encode %.2f ms/frame, latency mean %.1f ms, max %.1f ms\n",
+                tm->frames, tm->bits / tm->frames * fps / 1000.0,
+                tm->encode_sum / tm->frames,
+                tm->latency_sum / tm->frames, tm->latency_max);
+    if (tm->fp)
+        fclose(tm->fp);
+    free(tm);
+}
@@ -0,0 +1,70 @@
+#ifndef TELEMETRY_H
+#define TELEMETRY_H
+
+#include <stdint.h>
+#include <stdio.h>
+
+/* ---------------- per-frame telemetry (--stats) ----------------
+ * One row per frame the encoder returns, CSV or JSONL (by extension):
+ *   frame, type, qp, bits, roi_ratio, num_rois, roi_offset, bg_offset,
+ *   map_ms, encode_ms, latency_ms
+ * Input-side values (ROI coverage, offsets, map time, arrival time) are
+ * kept per pts until the frame comes out of the lookahead. ROI coverage
+ * is taken before --target-kbps rebases the map on the frame QP; the
+ * offsets are the ones handed to the encoder.
+ */
+#define TELEMETRY_HISTORY 512   /* > encoder latency (lookahead + B-frames) */
+
+typedef struct {
+    double t_in;       /* ms, when the frame was read */
+    double map_ms;     /* ROI load + offset map generation */
+    double roi_ratio;  /* QGs with a negative offset in the built map */
+    float roi_offset;  /* lowest offset in the map */
+    float bg_offset;   /* highest offset in the map */
+    int num_rois;
+} FrameRecord;
+
+typedef struct {
+    FrameRecord rec[TELEMETRY_HISTORY];
+    FILE *fp;
+    int jsonl;
+
+    /* summary */
+    int frames;
+    double bits;
+    double latency_sum;
+    double latency_max;
+    double encode_sum;
+} Telemetry;
+
+/* path may be NULL: only the summary is kept */
+Telemetry *telemetry_open(const char *path);
+
+/* share of QGs with a negative (ROI) offset; call on the map as built,
+ * before it is rebased on a forced frame QP */
+double roi_coverage(const float *offsets, int num_blocks);
+
+void telemetry_in(
+    Telemetry *tm,
+    int64_t pts,
+    double t_in,
+    double map_ms,
+    double roi_ratio,
+    const float *offsets,
+    int num_blocks,
+    int num_rois
+);
+
+void telemetry_out(
+    Telemetry *tm,
+    int64_t pts,
+    int slice_type,
+    double qp,
+    uint64_t bytes,
+    double encode_ms
+);
+
+/* prints the summary to stderr when asked, then frees */
+void telemetry_close(Telemetry *tm, int summary, double fps);
+
+#endif
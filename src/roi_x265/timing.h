@@ -0,0 +1,14 @@
+#ifndef TIMING_H
+#define TIMING_H
+
+#include <time.h>
+
+/* monotonic wall time in milliseconds, for the per-frame timings */
+static inline double now_ms(void)
+{
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec * 1e3 + ts.tv_nsec / 1e6;
+}
+
+#endif
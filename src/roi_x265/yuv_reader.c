@@ -1,17 +1,268 @@
 #include "yuv_reader.h"
+#include "timing.h"
+#include <stdlib.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
 
-int read_yuv_frame(
-    FILE *fp,
-    x265_picture *pic,
-    int width,
-    int height)
+int yuv_source_mode(const char *name)
 {
-    int y = width * height;
-    int uv = y / 4;
+    if (!name || !strcmp(name, "auto"))
+        return YUV_SOURCE_AUTO;
+    if (!strcmp(name, "mmap"))
+        return YUV_SOURCE_MMAP;
+    if (!strcmp(name, "thread"))
+        return YUV_SOURCE_THREAD;
+    if (!strcmp(name, "read"))
+        return YUV_SOURCE_READ;
+    return -1;
+}
+
+const char *yuv_source_name(int mode)
+{
+    switch (mode)
+    {
+    case YUV_SOURCE_MMAP:   return "mmap";
+    case YUV_SOURCE_THREAD: return "thread";
+    case YUV_SOURCE_READ:   return "read";
+    default:                return "auto";
+    }
+}
+
+static void set_planes(const YUVSource *src, x265_picture *pic, unsigned char *frame)
+{
+    int luma = src->width * src->height;
+
+    pic->planes[0] = frame;
+    pic->planes[1] = frame + luma;
+    pic->planes[2] = frame + luma + luma / 4;
+    pic->stride[0] = src->width;
+    pic->stride[1] = src->width / 2;
+    pic->stride[2] = src->width / 2;
+}
+
+/* ---------------- mmap ---------------- */
+
+static int open_mmap(YUVSource *src)
+{
+    struct stat st;
+    int fd = fileno(src->fp);
+
+    if (fstat(fd, &st) || !S_ISREG(st.st_mode) || ftello(src->fp) != 0)
+        return 0;
+
+    src->num_frames = (int)(st.st_size / src->frame_size);
+    if (src->num_frames == 0)
+        return 1;    /* empty input, nothing to map */
+
+    src->map_size = (size_t)src->num_frames * src->frame_size;
+    void *map = mmap(NULL, src->map_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    if (map == MAP_FAILED)
+        return 0;
+    madvise(map, src->map_size, MADV_SEQUENTIAL);
+    src->map = map;
+    return 1;
+}
+
+static int next_mmap(YUVSource *src, x265_picture *pic)
+{
+    if (src->next >= src->num_frames)
+        return 0;
+
+    unsigned char *frame = src->map + (size_t)src->next * src->frame_size;
+    /* page the following frame in while this one is encoded */
+    if (src->next + 1 < src->num_frames)
+    {
+        uintptr_t ahead = (uintptr_t)(frame + src->frame_size);
+        uintptr_t page = ahead & ~(uintptr_t)(sysconf(_SC_PAGESIZE) - 1);
+        madvise((void *)page, src->frame_size + (ahead - page), MADV_WILLNEED);
+    }
+    set_planes(src, pic, frame);
+    src->next++;
+    return 1;
+}
 
-    if (fread(pic->planes[0], 1, y, fp) != y) return 0;
-    if (fread(pic->planes[1], 1, uv, fp) != uv) return 0;
-    if (fread(pic->planes[2], 1, uv, fp) != uv) return 0;
+/* ---------------- ring of aligned buffers ---------------- */
 
+static int alloc_slots(YUVSource *src, int depth)
+{
+    src->slots = calloc(depth, sizeof(*src->slots));
+    if (!src->slots)
+        return 0;
+    src->depth = depth;
+    for (int i = 0; i < depth; i++)
+    {
+        void *buf;
+        if (posix_memalign(&buf, YUV_SOURCE_ALIGN, src->frame_size))
+            return 0;
+        src->slots[i] = buf;
+    }
     return 1;
 }
+
+static void *reader_main(void *arg)
+{
+    YUVSource *src = arg;
+
+    pthread_mutex_lock(&src->lock);
+    while (1)
+    {
+        /* a slot that is neither filled nor held by the encoder */
+        while (!src->stop && src->count + (src->held >= 0) >= src->depth)
+            pthread_cond_wait(&src->cond, &src->lock);
+        if (src->stop)
+            break;
+
+        int slot = (src->head + src->count) % src->depth;
+        pthread_mutex_unlock(&src->lock);
+        int ok = fread(src->slots[slot], 1, src->frame_size, src->fp) == src->frame_size;
+        pthread_mutex_lock(&src->lock);
+
+        if (!ok)
+        {
+            src->eof = 1;
+            pthread_cond_broadcast(&src->cond);
+            break;
+        }
+        src->count++;
+        pthread_cond_broadcast(&src->cond);
+    }
+    pthread_mutex_unlock(&src->lock);
+    return NULL;
+}
+
+static int next_thread(YUVSource *src, x265_picture *pic)
+{
+    double t0 = now_ms();
+
+    pthread_mutex_lock(&src->lock);
+    src->held = -1;
+    pthread_cond_broadcast(&src->cond);
+    while (!src->count && !src->eof)
+        pthread_cond_wait(&src->cond, &src->lock);
+
+    int slot = -1;
+    if (src->count)
+    {
+        slot = src->head;
+        src->head = (src->head + 1) % src->depth;
+        src->count--;
+        src->held = slot;
+    }
+    pthread_mutex_unlock(&src->lock);
+    src->wait_ms += now_ms() - t0;
+
+    if (slot < 0)
+        return 0;
+    set_planes(src, pic, src->slots[slot]);
+    return 1;
+}
+
+static int next_read(YUVSource *src, x265_picture *pic)
+{
+    double t0 = now_ms();
+    int ok = fread(src->slots[0], 1, src->frame_size, src->fp) == src->frame_size;
+    src->wait_ms += now_ms() - t0;
+
+    if (!ok)
+        return 0;
+    set_planes(src, pic, src->slots[0]);
+    return 1;
+}
+
+/* ---------------- public ---------------- */
+
+YUVSource *yuv_source_open(FILE *fp, int width, int height, int mode, int depth)
+{
+    YUVSource *src = calloc(1, sizeof(YUVSource));
+    if (!src)
+        return NULL;
+
+    src->fp = fp;
+    src->width = width;
+    src->height = height;
+    src->frame_size = (size_t)width * height * 3 / 2;
+    src->held = -1;
+
+    if (mode == YUV_SOURCE_AUTO || mode == YUV_SOURCE_MMAP)
+    {
+        if (open_mmap(src))
+            mode = YUV_SOURCE_MMAP;
+        else if (mode == YUV_SOURCE_MMAP)
+        {
+            fprintf(stderr, "Cannot mmap the input (not a regular file?)\n");
+            free(src);
+            return NULL;
+        }
+        else
+            mode = YUV_SOURCE_THREAD;
+    }
+    if (mode == YUV_SOURCE_MMAP)
+    {
+        src->mode = mode;
+        return src;
+    }
+
+    /* plain reads until the reader thread exists, so a failed open only
+     * tears down what was set up */
+    src->mode = YUV_SOURCE_READ;
+    if (!alloc_slots(src, mode == YUV_SOURCE_THREAD ? (depth > 1 ? depth : 2) : 1))
+    {
+        fprintf(stderr, "Cannot allocate %d input frame buffers\n", depth);
+        yuv_source_close(src);
+        return NULL;
+    }
+
+    if (mode == YUV_SOURCE_THREAD)
+    {
+        pthread_mutex_init(&src->lock, NULL);
+        pthread_cond_init(&src->cond, NULL);
+        if (pthread_create(&src->thread, NULL, reader_main, src) == 0)
+            src->mode = YUV_SOURCE_THREAD;
+        else
+        {
+            /* no thread, read on the caller's thread instead */
+            pthread_mutex_destroy(&src->lock);
+            pthread_cond_destroy(&src->cond);
+        }
+    }
+    return src;
+}
+
+int yuv_source_next(YUVSource *src, x265_picture *pic)
+{
+    switch (src->mode)
+    {
+    case YUV_SOURCE_MMAP:   return next_mmap(src, pic);
+    case YUV_SOURCE_THREAD: return next_thread(src, pic);
+    default:                return next_read(src, pic);
+    }
+}
+
+void yuv_source_close(YUVSource *src)
+{
+    if (!src)
+        return;
+
+    if (src->mode == YUV_SOURCE_THREAD)
+    {
+        /* the reader stops at the next free slot or at end of input */
+        pthread_mutex_lock(&src->lock);
+        src->stop = 1;
+        pthread_cond_broadcast(&src->cond);
+        pthread_mutex_unlock(&src->lock);
+        pthread_join(src->thread, NULL);
+        pthread_mutex_destroy(&src->lock);
+        pthread_cond_destroy(&src->cond);
+    }
+    if (src->map)
+        munmap(src->map, src->map_size);
+    if (src->slots)
+    {
+        for (int i = 0; i < src->depth; i++)
+            free(src->slots[i]);
+        free(src->slots);
+    }
+    free(src);
+}
@@ -2,13 +2,67 @@
 #define YUV_READER_H
 
 #include <x265.h>
+#include <pthread.h>
+#include <stdint.h>
 #include <stdio.h>
 
-int read_yuv_frame(
-    FILE *fp,
-    x265_picture *pic,
-    int width,
-    int height
-);
+/* ---------------- YUV420p input (--input-mode) ----------------
+ *   mmap    regular files: the file is mapped and pic->planes point at
+ *           the frame inside the mapping, nothing is copied
+ *   thread  pipes / stdin: a reader thread fills a ring of aligned frame
+ *           buffers ahead of the encoder
+ *   read    one aligned buffer, filled on the caller's thread (needed
+ *           when the caller also reads from the stream, e.g. --framed)
+ *   auto    mmap when the input is a regular file, thread otherwise
+ *
+ * x265_encoder_encode copies the input picture before it returns, so a
+ * frame's buffer is handed back on the next yuv_source_next call.
+ */
+#define YUV_SOURCE_AUTO   0
+#define YUV_SOURCE_MMAP   1
+#define YUV_SOURCE_THREAD 2
+#define YUV_SOURCE_READ   3
+
+#define YUV_SOURCE_ALIGN  64
+#define YUV_SOURCE_DEPTH  4     /* default ring size for the reader thread */
+
+typedef struct {
+    int mode;
+    int width;
+    int height;
+    size_t frame_size;
+    FILE *fp;
+
+    /* mmap */
+    unsigned char *map;
+    size_t map_size;
+    int num_frames;
+    int next;
+
+    /* read / thread: ring of frame buffers, filled = [head, head + count) */
+    unsigned char **slots;
+    int depth;
+    int head;
+    int count;
+    int held;           /* slot the encoder is using, -1 if none */
+    int eof;
+    int stop;
+    pthread_t thread;
+    pthread_mutex_t lock;
+    pthread_cond_t cond;
+
+    double wait_ms;     /* time yuv_source_next waited on the reader */
+} YUVSource;
+
+int yuv_source_mode(const char *name);
+const char *yuv_source_name(int mode);
+
+/* fp stays owned by the caller; depth only matters for the thread mode */
+YUVSource *yuv_source_open(FILE *fp, int width, int height, int mode, int depth);
+
+/* points pic->planes / stride at the next frame; 0 at end of input */
+int yuv_source_next(YUVSource *src, x265_picture *pic);
+
+void yuv_source_close(YUVSource *src);
 
 #endif
@@ -1,7 +1,14 @@
 import subprocess
 import os
+import time
+import copy
 import argparse
 
+from yuv_reader import YUVReader
+from roi_container import QGMAP_EXT, ROIContainer, read_qg_maps, read_roi_txt
+from roi_encoder import RenditionSet, roi_offsets
+from roi_temporal import QGHysteresis
+
 
 # ==============================
 # Argument parsing
@@ -29,8 +36,31 @@ def parse_args():
     ap.add_argument("--rd_level", type=int, default=1)
     ap.add_argument("--rdoq_level", type=int, default=0)
     ap.add_argument("--psy_rd", type=float, default=2.0)
-
-    return ap.parse_args()
+    ap.add_argument("--target_kbps", type=int, default=0,
+                    help="bitrate budget; roi_x265 solves ROI/background QPs per frame (0 = off)")
+    ap.add_argument("--max_delta", type=int, default=6,
+                    help="largest background - ROI QP gap under --target_kbps")
+    ap.add_argument("--stats", type=int, default=0,
+                    help="per-frame roi_x265 telemetry to <output>_stats.csv")
+    ap.add_argument("--graded", type=int, default=0,
+                    help="graded ROI offsets with feathering and per-ROI weights (roi_x265 --graded)")
+    ap.add_argument("--feather", type=int, default=2,
+                    help="feathering distance in QGs for --graded")
+    ap.add_argument("--qg_hold", type=int, default=0,
+                    help="frames a QG keeps its ROI offset after it stops being ROI (0 = off)")
+    ap.add_argument("--qps", type=str, default="",
+                    help="comma-separated QP ladder, overrides --qp")
+    ap.add_argument("--presets", type=str, default="",
+                    help="comma-separated presets, overrides --preset")
+    ap.add_argument("--in_process", type=int, default=0,
+                    help="encode through libroi_x265.so in this process instead of roi_x265")
+
+    args = ap.parse_args()
+    if args.in_process and args.target_kbps:
+        ap.error("--target_kbps needs the roi_x265 binary (--in_process 0)")
+    if args.in_process and args.stats:
+        ap.error("--stats needs the roi_x265 binary (--in_process 0)")
+    return args
 
 
 # ==============================
@@ -52,11 +82,11 @@ def parse_sequence_info(filename):
 # ==============================
 # Command builders
 # ==============================
-def build_encode_cmd(args, output_hevc, roi_dir,
+def build_encode_cmd(args, input_path, output_hevc, roi_dir,
                      width, height, fps):
-    return [
+    cmd = [
         args.encode_path,
-        "--input", args.input_root,
+        "--input", input_path,
         "--output", output_hevc,
         "--width", str(width),
         "--height", str(height),
@@ -71,6 +101,23 @@ def build_encode_cmd(args, output_hevc, roi_dir,
         "--rdoq_level", str(args.rdoq_level),
         "--psy_rd", str(args.psy_rd)
     ]
+    # QP offset maps from extract_roi.py --qg_map take precedence over boxes
+    qg_map = roi_dir[:-len(".roi")] if roi_dir.endswith(".roi") else roi_dir
+    if os.path.exists(qg_map + ".qgm"):
+        cmd += ["--qg-map", qg_map + ".qgm"]
+    if args.graded:
+        cmd += ["--graded", "1", "--feather", str(args.feather)]
+    if args.qg_hold > 0:
+        cmd += ["--qg-hold", str(args.qg_hold)]
+    if args.stats:
+        cmd += ["--stats", os.path.splitext(output_hevc)[0] + "_stats.csv"]
+    if args.target_kbps > 0:
+        cmd += [
+            "--target-kbps", str(args.target_kbps),
+            "--max-delta", str(args.max_delta),
+            "--rate-log", os.path.splitext(output_hevc)[0] + "_rate.csv",
+        ]
+    return cmd
 
 
 def build_decode_cmd(args, bitstream, output_yuv):
@@ -81,6 +128,89 @@ def build_decode_cmd(args, bitstream, output_yuv):
     ]
 
 
+# ==============================
+# In-process encode (libroi_x265.so)
+# ==============================
+def frame_offsets(args, roi_dir, width, height, qg):
+    """
+    offsets(idx) -> quantOffsets map of frame idx, from the same sources
+    roi_x265 reads: <seq>.qgm, a .roi container or frame_XXXX_roi.txt.
+    Boxes are rasterised as roi_x265 --graded / --feather would, with the
+    container scores or the fifth text column as ROI weights.
+    With --qg_hold, frames must be asked for in order (as roi_x265 --qg-hold).
+    """
+    if not args.enable_roi:
+        return lambda idx: None
+
+    base = roi_dir[:-len(".roi")] if roi_dir.endswith(".roi") else roi_dir
+    if os.path.exists(base + QGMAP_EXT):
+        _, maps = read_qg_maps(base + QGMAP_EXT)
+        offsets = lambda idx: maps[idx] if idx < len(maps) else None
+    else:
+        if roi_dir.endswith(".roi"):
+            container = ROIContainer(roi_dir)
+            read = lambda idx: (container[idx], container.scores(idx))
+        else:
+            def read(idx):
+                path = os.path.join(roi_dir, f"frame_{idx:04d}_roi.txt")
+                return read_roi_txt(path, weights=True) if os.path.exists(path) else ([], None)
+
+        def offsets(idx):
+            boxes, weights = read(idx)
+            return roi_offsets(boxes, width, height, qg, weights=weights,
+                               graded=args.graded, feather=args.feather)
+
+    if args.qg_hold <= 0:
+        return offsets
+    hold = QGHysteresis(args.qg_hold)
+
+    def held(idx):
+        m = offsets(idx)
+        return hold(m) if m is not None else None
+    return held
+
+
+def encode_in_process(args, input_path, roi_dir, width, height, fps, renditions):
+    """
+    Encode one sequence into every rendition (preset, qp, output_hevc,
+    logfile) at once: each frame is read and its offset map built once,
+    then handed to all encoders (RenditionSet).
+    """
+    print(f"Encoding in process: {input_path} -> {len(renditions)} rendition(s)")
+    outs = []
+    try:
+        with YUVReader(input_path, width, height) as yuv, \
+             RenditionSet(width, height, [dict(preset=p, qp=q) for p, q, _, _ in renditions],
+                          fps=fps, rc=args.rc, rd_level=args.rd_level,
+                          rdoq_level=args.rdoq_level, psy_rd=args.psy_rd) as enc:
+            outs = [open(hevc, "wb") for _, _, hevc, _ in renditions]
+            offsets = frame_offsets(args, roi_dir, width, height, enc.qg_size)
+
+            def write(chunks):
+                for out, data in zip(outs, chunks):
+                    out.write(data)
+
+            start = time.time()
+            write(enc.headers())
+            for idx in range(len(yuv)):
+                write(enc.encode(*yuv.planes(idx), offsets(idx), pts=idx))
+            write(enc.flush())
+            elapsed = time.time() - start
+    finally:
+        for out in outs:
+            out.close()
+
+    # same summary line as the x265 log of the roi_x265 path, so
+    # PostProcessing picks up the encode time; with several renditions
+    # it is the time of the shared loop that fed all of them
+    n = len(yuv)
+    for _, _, hevc, logfile in renditions:
+        kbps = os.path.getsize(hevc) * 8 * fps / max(n, 1) / 1000
+        with open(logfile, "w") as f:
+            f.write(f"encoded {n} frames in {elapsed:.2f}s "
+                    f"({n / max(elapsed, 1e-9):.2f} fps), {kbps:.2f} kb/s\n")
+
+
 # ==============================
 # Run command
 # ==============================
@@ -104,6 +234,9 @@ def main():
     args = parse_args()
 
     fps = args.fps
+    presets = args.presets.split(",") if args.presets else [args.preset]
+    qps = [int(q) for q in args.qps.split(",")] if args.qps else [args.qp]
+    ladder = [(preset, qp) for preset in presets for qp in qps]
 
     for seq in os.listdir(args.input_root):
         input_path = os.path.join(args.input_root, seq)
@@ -115,50 +248,72 @@ def main():
             args.roi_method,
             name
         )
-
-        method_name = (
-            f"{args.roi_method}_preset_{args.preset}_rdo_{args.rd_level}"
-        )
-
-        output_dir = os.path.join(
-            args.out,
-            method_name,
-            f"qp{args.qp}"
-        )
-        os.makedirs(output_dir, exist_ok=True)
-
-        log_dir = os.path.join(
-            args.logs,
-            method_name,
-            f"qp{args.qp}"
-        )
-        os.makedirs(log_dir, exist_ok=True)
-
-        output_hevc = os.path.join(output_dir, f"{name}.bin")
-        output_yuv = os.path.join(output_dir, f"{name}.yuv")
-        logfile = os.path.join(log_dir, f"{name}.txt")
+        # roi_x265 reads a <seq>.roi container in place of the text files
+        if os.path.exists(roi_dir + ".roi"):
+            roi_dir += ".roi"
+
+        # one (preset, qp, bitstream, log) per rendition of the ladder
+        renditions = []
+        for preset, qp in ladder:
+            method_name = (
+                f"{args.roi_method}_preset_{preset}_rdo_{args.rd_level}"
+            )
+            if args.graded:
+                method_name += f"_graded_f{args.feather}"
+            if args.qg_hold > 0:
+                method_name += f"_hold{args.qg_hold}"
+
+            output_dir = os.path.join(
+                args.out,
+                method_name,
+                f"qp{qp}"
+            )
+            os.makedirs(output_dir, exist_ok=True)
+
+            log_dir = os.path.join(
+                args.logs,
+                method_name,
+                f"qp{qp}"
+            )
+            os.makedirs(log_dir, exist_ok=True)
+
+            renditions.append((
+                preset, qp,
+                os.path.join(output_dir, f"{name}.bin"),
+                os.path.join(log_dir, f"{name}.txt"),
+            ))
 
         print(f"\n=== Processing {name} ===")
 
         # Encode
-        encode_cmd = build_encode_cmd(
-            args,
-            input_path,
-            output_hevc,
-            roi_dir,
-            width,
-            height,
-            fps 
-        )
-        run_command(encode_cmd, logfile, mode="w")
+        if args.in_process:
+            encode_in_process(
+                args, input_path, roi_dir,
+                width, height, fps, renditions
+            )
+        else:
+            for preset, qp, output_hevc, logfile in renditions:
+                r_args = copy.copy(args)
+                r_args.preset, r_args.qp = preset, qp
+                encode_cmd = build_encode_cmd(
+                    r_args,
+                    input_path,
+                    output_hevc,
+                    roi_dir,
+                    width,
+                    height,
+                    fps 
+                )
+                run_command(encode_cmd, logfile, mode="w")
 
         # Decode
-        decode_cmd = build_decode_cmd(
-            args,
-            output_hevc,
-            output_yuv
-        )
-        run_command(decode_cmd, logfile, mode="a")
+        for _, _, output_hevc, logfile in renditions:
+            decode_cmd = build_decode_cmd(
+                args,
+                output_hevc,
+                os.path.splitext(output_hevc)[0] + ".yuv"
+            )
+            run_command(decode_cmd, logfile, mode="a")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,97 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+
+# ==============================
+# Job enumeration
+# ==============================
+def enumerate_jobs(output_root, target_qps, ext=".yuv"):
+    """
+    Collect every OUTPUT_ROOT/<method>/qp<N>/*<ext> up front.
+
+    Returns (methods, jobs) where jobs is a list of
+    (method, qp, filename, path) tuples in method -> QP -> filename order,
+    i.e. the order the report tables are written in.
+    """
+    methods = sorted(
+        d for d in os.listdir(output_root)
+        if os.path.isdir(os.path.join(output_root, d))
+    )
+
+    jobs = []
+    for method in methods:
+        for qp in target_qps:
+            qp_dir = os.path.join(output_root, method, f"qp{qp}")
+            if not os.path.exists(qp_dir):
+                continue
+
+            for fname in sorted(x for x in os.listdir(qp_dir) if x.endswith(ext)):
+                jobs.append((method, qp, fname, os.path.join(qp_dir, fname)))
+
+    return methods, jobs
+
+
+# ==============================
+# Process-pool runner
+# ==============================
+def _init_worker(threads, initializer=None, initargs=()):
+    # keep each worker's numeric libraries from grabbing every core
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+    if "cv2" in sys.modules:
+        sys.modules["cv2"].setNumThreads(threads)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def run_jobs(fn, jobs, workers=None, threads_per_worker=1,
+             initializer=None, initargs=()):
+    """
+    Apply fn to every job on a pool of `workers` processes and yield
+    (job, result) pairs in job order as soon as each one is ready.
+
+    fn must be a module-level function. workers=None uses every core;
+    workers <= 1 runs serially in the calling process. initializer(*initargs)
+    runs once per worker process after the thread limits are set (e.g. to
+    load a model), or once in the calling process for serial runs.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(jobs))
+
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for job in jobs:
+            yield job, fn(job)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(threads_per_worker, initializer, initargs),
+    ) as pool:
+        yield from zip(jobs, pool.map(fn, jobs))
+
+
+def run_jobs_cached(fn, jobs, cache, metric, params, paths_fn,
+                    workers=None, threads_per_worker=1):
+    """
+    Same as run_jobs, but results are looked up in a MetricCache first and
+    only misses are dispatched to the pool. paths_fn(job) lists the files
+    the result depends on (decoded output first). fn must return a
+    JSON-serialisable value; None results are not cached.
+    """
+    cached = [cache.get(paths_fn(job), metric, params) for job in jobs]
+    misses = [job for job, val in zip(jobs, cached) if val is None]
+    print(f"[{metric}] {len(jobs) - len(misses)} cached, {len(misses)} to compute")
+
+    computed = run_jobs(fn, misses, workers, threads_per_worker)
+    for job, val in zip(jobs, cached):
+        if val is None:
+            _, val = next(computed)
+            if val is not None:
+                cache.put(paths_fn(job), metric, params, val)
+        yield job, val
+    computed.close()
@@ -6,22 +6,25 @@ from tqdm import tqdm
 from ultralytics import YOLO
 import subprocess
 import time
+import copy
+from yuv_reader import YUVReader
+from roi_motion import motion_roi, motion_block_mask, block_mask_to_bboxes
+from roi_merge import merge_overlapping_rois
+from roi_saliency import SpectralResidual, saliency_mask
+from roi_pipeline import run_pipeline
+from eval_runner import run_jobs
+from roi_container import ROI_EXT, QGMAP_EXT, write_roi_container, write_qg_maps
+from roi_qgmap import (mask_qg_fraction, block_mask_qg_fraction, qg_offsets, qg_grid,
+                       graded_qg_offsets)
+from roi_fusion import QGFusion
+from roi_track import BoxTracker, detect_and_track
+from roi_temporal import BoxSmoother, QGHysteresis
 # ==============================
 # YUV Reader
 # ==============================
-def read_yuv_frame(fp, w, h, idx):
-    frame_size = w * h * 3 // 2
-    fp.seek(idx * frame_size)
-    y = np.fromfile(fp, np.uint8, w * h)
-    return y.reshape((h, w))
-
-def read_yuv420_frame(fp, w, h, idx):
-    frame_size = w * h * 3 // 2
-    fp.seek(idx * frame_size)
-
-    y = np.fromfile(fp, np.uint8, w * h).reshape((h, w))
-    u = np.fromfile(fp, np.uint8, w * h // 4).reshape((h//2, w//2))
-    v = np.fromfile(fp, np.uint8, w * h // 4).reshape((h//2, w//2))
+def read_yuv420_frame(reader, idx):
+    y, u, v = reader.planes(idx)
+    w, h = reader.width, reader.height
 
     u_up = cv2.resize(u, (w, h), interpolation=cv2.INTER_LINEAR)
     v_up = cv2.resize(v, (w, h), interpolation=cv2.INTER_LINEAR)
@@ -31,57 +34,43 @@ def read_yuv420_frame(fp, w, h, idx):
 
     return rgb, y
 
-# ==============================
-# Motion-based ROI
-# ==============================
-def motion_roi(prev, curr, block, th):
-    diff = cv2.absdiff(curr, prev)
-    h, w = diff.shape
-
-    mh = h // block
-    mw = w // block
-    motion_map = np.zeros((mh, mw), np.float32)
-
-    for by in range(mh):
-        for bx in range(mw):
-            blk = diff[
-                by*block:(by+1)*block,
-                bx*block:(bx+1)*block
-            ]
-            motion_map[by, bx] = np.mean(blk)
-
-    mask = (motion_map > th).astype(np.uint8)
-    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE,
-                             np.ones((3,3), np.uint8))
-    mask = cv2.resize(mask, (w, h), interpolation=cv2.INTER_NEAREST)
-    return mask
+def read_yuv420_batch(reader, start, stop):
+    """
+    RGB frames [start, stop) as one (K, H, W, 3) array, same conversion as
+    read_yuv420_frame: chroma is upsampled per frame into a stacked YUV
+    buffer and the K frames go through a single cvtColor call.
+    """
+    return yuv420_to_rgb_batch(*reader.planes_range(start, stop))
+
+def yuv420_to_rgb_batch(Y, U, V):
+    """(K, H, W) luma + (K, H/2, W/2) chroma stacks -> (K, H, W, 3) RGB."""
+    k, h, w = Y.shape
+
+    yuv = np.empty((k, h, w, 3), np.uint8)
+    yuv[..., 0] = Y
+    for i in range(k):
+        yuv[i, ..., 1] = cv2.resize(U[i], (w, h), interpolation=cv2.INTER_LINEAR)
+        yuv[i, ..., 2] = cv2.resize(V[i], (w, h), interpolation=cv2.INTER_LINEAR)
+
+    rgb = cv2.cvtColor(yuv.reshape(k * h, w, 3), cv2.COLOR_YUV2RGB)
+    return rgb.reshape(k, h, w, 3)
 
 # ==============================
-# Saliency (Spectral Residual)
+# Detector output → ROI boxes
 # ==============================
-def spectral_residual(gray):
-    gray = gray.astype(np.float32)
-    fft = np.fft.fft2(gray)
-    log_amp = np.log(np.abs(fft) + 1e-8)
-    phase = np.angle(fft)
-
-    avg = cv2.blur(log_amp, (3,3))
-    residual = log_amp - avg
-
-    sal = np.abs(
-        np.fft.ifft2(np.exp(residual + 1j * phase))
-    ) ** 2
-
-    sal = cv2.GaussianBlur(sal, (9,9), 0)
-    sal = cv2.normalize(sal, None, 0, 1, cv2.NORM_MINMAX)
-    return sal
-
-def saliency_roi(frame, th):
-    sal = spectral_residual(frame)
-    mask = (sal > th).astype(np.uint8)
-    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN,
-                             np.ones((5,5), np.uint8))
-    return mask
+def yolo_boxes(result):
+    if result.boxes is None:
+        return []
+    return [
+        (int(x1), int(y1), int(x2), int(y2))
+        for x1, y1, x2, y2 in result.boxes.xyxy.cpu().numpy()
+    ]
+
+def yolo_scores(result):
+    """Confidences, in the order of yolo_boxes(result)."""
+    if result.boxes is None:
+        return []
+    return [float(c) for c in result.boxes.conf.cpu().numpy()]
 
 # ==============================
 # Mask → ROI boxes
@@ -95,67 +84,122 @@ def mask_to_bboxes(mask, min_area):
             rois.append((x, y, x+w, y+h))
     return rois
 
-def overlap(a, b):
-    return not (
-        a[2] <= b[0] or  # A bên trái B
-        a[0] >= b[2] or  # A bên phải B
-        a[3] <= b[1] or  # A phía trên B
-        a[1] >= b[3]     # A phía dưới B
-    )
+def mask_rois(method, prev, curr_y, sr, args):
+    """ROI boxes of the motion / saliency / fused modes for one luma frame."""
+    if method == 'motion':
+        # boxes straight from the block grid, no full-res mask
+        if prev is None:
+            return []
+        motion = motion_block_mask(prev, curr_y, args.block, args.t_motion)
+        return block_mask_to_bboxes(
+            motion, args.block, args.min_area, args.width, args.height)
+
+    roi_mask = np.zeros_like(curr_y, np.uint8)
+    if method == "fused" and prev is not None:
+        roi_mask |= motion_roi(prev, curr_y, args.block, args.t_motion)
+    roi_mask |= saliency_mask(sr(curr_y), args.t_saliency)
+    return mask_to_bboxes(roi_mask, args.min_area)
+
+def mask_qg_map(method, prev, curr_y, sr, args):
+    """
+    quantOffsets map of the motion / saliency / fused modes for one luma
+    frame, straight from the mask: no connected components, no boxes.
+    """
+    h, w = curr_y.shape
+    if method == 'motion':
+        if prev is None:
+            return np.zeros(qg_grid(w, h, args.qg_size), np.float32)
+        motion = motion_block_mask(prev, curr_y, args.block, args.t_motion)
+        frac = block_mask_qg_fraction(motion, args.block, args.qg_size, h, w)
+        return qg_offsets(frac, args.qg_thresh)
+
+    roi_mask = np.zeros_like(curr_y, np.uint8)
+    if method == "fused" and prev is not None:
+        roi_mask |= motion_roi(prev, curr_y, args.block, args.t_motion)
+    roi_mask |= saliency_mask(sr(curr_y), args.t_saliency)
+    return qg_offsets(mask_qg_fraction(roi_mask, args.qg_size), args.qg_thresh)
+
+def write_roi_txt(out_file, rois, scores=None):
+    # detector confidences go in the optional fifth (weight) column
+    with open(out_file, "w") as f:
+        if scores is None:
+            for x1,y1,x2,y2 in rois:
+                f.write(f"{x1}, {y1}, {x2}, {y2}\n")
+        else:
+            for (x1,y1,x2,y2), s in zip(rois, scores):
+                f.write(f"{x1}, {y1}, {x2}, {y2}, {s:.3f}\n")
 
-def merge_two_boxes(a, b):
-    return (
-        min(a[0], b[0]),
-        min(a[1], b[1]),
-        max(a[2], b[2]),
-        max(a[3], b[3])
+# ==============================
+# Pipelined extraction
+# ==============================
+def extract_pipelined(reader, args, emit, model, yolo_kwargs, sr,
+                      start, stop, prev=None):
+    """
+    Frames [start, stop) of one sequence through a read -> preprocess ->
+    detect -> write thread pipeline (roi_pipeline.run_pipeline). Items are
+    windows of frames: args.batch frames for the detectors, single frames
+    otherwise. emit(idx, rois[, scores]) is called from the write stage in
+    frame order, so output is identical to the serial loop; with --qg_map
+    the item is the frame's QG offset map instead of its boxes. Returns the
+    stage timers.
+    """
+    analyse = mask_qg_map if args.qg_map else mask_rois
+    step = args.batch if model is not None else 1
+    windows = [(s, min(s + step, stop)) for s in range(start, stop, step)]
+
+    def read():
+        # copy out of the memmap so the page-in happens on this thread
+        for s, e in tqdm(windows, disable=args.workers > 1):
+            if model is not None:
+                yield s, [p.copy() for p in reader.planes_range(s, e)]
+            else:
+                yield s, reader.y_range(s, e).copy()
+
+    def preprocess(item):
+        s, planes = item
+        if model is not None:
+            return s, yuv420_to_rgb_batch(*planes)
+        return item
+
+    def detect(item):
+        nonlocal prev
+        s, frames = item
+        if model is not None:
+            results = model(list(frames), **yolo_kwargs)
+            return s, [yolo_boxes(r) for r in results], [yolo_scores(r) for r in results]
+
+        boxes = []
+        for curr_y in frames:
+            boxes.append(analyse(args.roi_method, prev, curr_y, sr, args))
+            prev = curr_y
+        return s, boxes, None
+
+    def write(item):
+        s, boxes, scores = item
+        for i, rois in enumerate(boxes):
+            if args.qg_map:
+                emit(s + i, rois)
+            elif scores is None:
+                emit(s + i, merge_overlapping_rois(rois))
+            else:
+                emit(s + i, *merge_overlapping_rois(rois, scores[i]))
+
+    return run_pipeline(
+        ("read", read()),
+        [("preprocess", preprocess), ("detect", detect), ("write", write)],
+        depth=args.queue_depth,
     )
-def merge_overlapping_rois(rois):
-    rois = rois.copy()
-    merged = True
-
-    while merged:
-        merged = False
-        result = []
-
-        while rois:
-            current = rois.pop(0)
-            i = 0
-            while i < len(rois):
-                if overlap(current, rois[i]):
-                    current = merge_two_boxes(current, rois[i])
-                    rois.pop(i)
-                    merged = True
-                else:
-                    i += 1
-            result.append(current)
-
-        rois = result
 
-    return rois
 def round_up_32(x):
     return (x + 31) // 32 * 32
-# ==============================
-# Main
-# ==============================
-def main():
-    ap = argparse.ArgumentParser()
 
-    ap.add_argument("--roi_method", type=str, default="motion",
-                    choices=["motion", "saliency", "fused",
-                             "yolov5", "yolov8", "yolov9",
-                             "yolov10", "yolov11"])
-    ap.add_argument("--block", type=int, default=32)
-    ap.add_argument("--t_motion", type=float, default=35.0)
-    ap.add_argument("--t_saliency", type=float, default=0.15)
-    ap.add_argument("--min_area", type=int, default=256)
-    ap.add_argument("--out", default="roi")
-    ap.add_argument("--openvino", type=int, default=1)
-    ap.add_argument("--fullresol", type=int, default=0)
-    args = ap.parse_args()
+def yolo_imgsz(args, w, h):
+    if args.fullresol:
+        return [round_up_32(w), round_up_32(h)]
+    return 640
 
-    os.makedirs(os.path.join(args.out, args.roi_method), exist_ok=True)
-    input_path = 'input_yuv/class_B'
+def roi_weights(args):
+    """(output name, YOLO weights path or None) of the ROI method in args."""
     if args.openvino:
         YOLO_WEIGHTS = {
             "yolov5":  "yolov5nu_openvino_model",    # nano (smallest)
@@ -172,108 +216,362 @@ def main():
             "yolov10": "yolov10n.pt",   # nano
             "yolov11": "yolo11n.pt",   # nano (Ultralytics)
         }
-    
+
     roiname = args.roi_method
-    if args.roi_method in ['yolov5', 'yolov8', 'yolov9', 'yolov10', 'yolov11']:
-        model = YOLO(f'weights/{YOLO_WEIGHTS[args.roi_method]}', task='detect')
-        print(f'Loaded pretrained weights/{YOLO_WEIGHTS[args.roi_method]}')
-        
+    weights = None
+    detector = args.roi_method
+    if args.roi_method in ['saliency', 'fused'] and args.sal_width:
+        roiname += f'_sr{args.sal_width}'
+    if args.roi_method == 'fused_qg' and args.fuse_detector:
+        # fused_qg_yolov8[_openvino][_fullresol]
+        detector = args.fuse_detector
+        roiname += f'_{detector}'
+    if detector in ['yolov5', 'yolov8', 'yolov9', 'yolov10', 'yolov11']:
+        weights = f'weights/{YOLO_WEIGHTS[detector]}'
+
         if args.openvino:
             roiname += '_openvino'
         if args.fullresol:
             roiname += '_fullresol'
-    
-    out_roi = os.path.join(args.out, roiname)
-        
-    time_process = {}
-    time_log = open("logs/time_extract_roi.txt", 'a')
-    time_log.write(f"Extract roi with {roiname}\n")
-    time_log.flush()
-    print(f"Extract roi with {roiname}\n")
-    
-    
-    for seq in os.listdir(input_path):
-        file_path = os.path.join(input_path, seq)
+    if args.keep_alive or args.ema < 1.0:
+        roiname += f'_keep{args.keep_alive}_ema{args.ema:g}'
+    if args.qg_hold:
+        roiname += f'_hold{args.qg_hold}'
+    return roiname, weights
+
+# ==============================
+# Per-sequence job (serial or on a worker process)
+# ==============================
+_WORKER = {}
+
+def init_extract_worker(args, weights):
+    """Load the detector once per worker process (or once when serial)."""
+    _WORKER["args"] = args
+    _WORKER["model"] = None
+    if weights is not None:
+        _WORKER["model"] = YOLO(weights, task='detect')
+        print(f'Loaded pretrained {weights}')
+
+def split_jobs(args, seqs, out_roi):
+    """
+    One (file_path, file_name, out_dir, w, h, nfs, start, stop) job per
+    sequence. With --workers > 1 the stateless methods (saliency, YOLO)
+    are also cut into frame ranges so short sequence lists still fill the
+    pool; motion, fused and fused_qg depend on the previous frame and stay
+    whole, as does everything with temporal smoothing.
+    """
+    smoothed = args.keep_alive or args.ema < 1.0 or args.qg_hold
+    stateless = args.roi_method not in ['motion', 'fused', 'fused_qg'] and not smoothed
+    chunks = 1
+    if args.workers > 1 and stateless:
+        chunks = -(-args.workers // max(len(seqs), 1))
+
+    jobs = []
+    for seq in seqs:
         file_name = seq.split('.')[0]
         _, wxh, nfs = file_name.split('_')
         nfs = int(nfs)
         w, h = int(wxh.split('x')[0]), int(wxh.split('x')[1])
-        args.width = w
-        args.height = h
-        args.frames = nfs
-        print(f"Processing {file_path}...")
-        import subprocess
-        if args.fullresol:
-            w32 = round_up_32(w)
-            h32 = round_up_32(h)
-            imgsz = [w32, h32]
-        else:
-            imgsz = 640
-        
 
-        os.makedirs(os.path.join(out_roi, file_name), exist_ok=True)
-        seq_start = time.time()
+        out_dir = os.path.join(out_roi, file_name)
+        if args.roi_format != 'bin' and not args.qg_map:
+            os.makedirs(out_dir, exist_ok=True)
+
+        step = max(-(-nfs // chunks), args.batch)
+        for start in range(0, nfs, step):
+            jobs.append((os.path.join(args.input_path, seq), file_name, out_dir,
+                         w, h, nfs, start, min(start + step, nfs)))
+    return jobs
+
+def extract_sequence(job):
+    """
+    ROIs for frames [start, stop) of one sequence. Returns the wall time,
+    frame count, (with --pipeline) per-stage busy seconds and, for the
+    bin/both formats, the per-frame boxes the container is built from
+    (with --qg_map: the per-frame QG offset maps) and, for the detectors,
+    their per-box confidences.
+    """
+    file_path, file_name, out_dir, w, h, nfs, start, stop = job
+    args = copy.copy(_WORKER["args"])
+    model = _WORKER["model"]
+    args.width = w
+    args.height = h
+    args.frames = nfs
+    print(f"Processing {file_path} [{start}, {stop})...")
+
+    yolo_kwargs = dict(
+        imgsz=yolo_imgsz(args, w, h),
+        conf=0.25,
+        iou=0.5,
+        half=True,     # FP16
+        verbose=False
+    )
 
-        with open(file_path, "rb") as fp:
-            prev = None
-            for idx in tqdm(range(args.frames)):
+    sr = SpectralResidual(w, h, args.sal_width)
+    frame_rois = []
+    frame_scores = []
+    # emit runs in frame order on every path, so the temporal filters
+    # see the frames in sequence
+    smoother = BoxSmoother(args.keep_alive, args.ema) if args.keep_alive or args.ema < 1.0 else None
+    hold = QGHysteresis(args.qg_hold) if args.qg_hold else None
+
+    def emit(idx, rois, scores=None):
+        # scores: detector confidence per box, written as the ROI weights
+        if args.qg_map:
+            if hold is not None:
+                rois = hold(rois)
+            frame_rois.append(rois)
+            return
+        if smoother is not None:
+            if scores is None:
+                rois = smoother(rois)
+            else:
+                rois, scores = smoother(rois, scores)
+        if args.roi_format != 'bin':
+            write_roi_txt(os.path.join(out_dir, f"frame_{idx:04d}_roi.txt"), rois, scores)
+        if args.roi_format != 'txt':
+            frame_rois.append(rois)
+            if scores is not None:
+                frame_scores.append(scores)
+
+    seq_start = time.time()
+
+    stages = None
+    detections = 0
+
+    with YUVReader(file_path, args.width, args.height, args.frames) as reader:
+        stop = min(stop, len(reader))
+        # a chunk that does not start the sequence re-reads the frame before
+        # it, so motion state is the same as in one continuous pass
+        prev = reader.y(start - 1) if start > 0 else None
+
+        if args.pipeline:
+            stages = extract_pipelined(reader, args, emit, model,
+                                       yolo_kwargs, sr, start, stop, prev)
+        elif args.roi_method == 'fused_qg':
+            # motion, saliency and detector cues on the QG grid, one
+            # graded offset map per frame
+            fuse = QGFusion(w, h, args.qg_size, args.w_motion, args.w_saliency,
+                            args.w_detector, args.t_motion, args.sal_res)
+            if prev is not None:
+                fuse.motion(prev)
+            for idx in tqdm(range(start, stop), disable=args.workers > 1):
+                boxes, scores = [], None
+                if model is not None:
+                    rgb, curr_y = read_yuv420_frame(reader, idx)
+                    r = model(rgb, **yolo_kwargs)[0]
+                    boxes, scores = yolo_boxes(r), yolo_scores(r)
+                else:
+                    curr_y = reader.y(idx)
+                emit(idx, graded_qg_offsets(fuse(curr_y, boxes, scores)))
+        elif model is not None and args.detect_every > 1:
+            # detector every K frames (or when tracking diverges), boxes
+            # carried over the frames in between by BoxTracker
+            tracker = BoxTracker(w, h, args.track_scale, args.track_search,
+                                 args.track_err, args.block, args.t_motion,
+                                 args.track_new_motion)
+
+            def detect(idx):
+                rgb, _ = read_yuv420_frame(reader, idx)
+                rois, scores = [], []
+                for r in model(rgb, **yolo_kwargs):
+                    rois.extend(yolo_boxes(r))
+                    scores.extend(yolo_scores(r))
+                return merge_overlapping_rois(rois, scores)
+
+            luma = ((idx, reader.y(idx))
+                    for idx in tqdm(range(start, stop), disable=args.workers > 1))
+            for idx, rois, scores, detected in detect_and_track(luma, detect, tracker, args.detect_every):
+                detections += detected
+                emit(idx, *merge_overlapping_rois(rois, scores))
+        elif model is not None and args.batch > 1:
+            # one detector call per window of args.batch frames
+            for s in tqdm(range(start, stop, args.batch), disable=args.workers > 1):
+                e = min(s + args.batch, stop)
+                rgbs = read_yuv420_batch(reader, s, e)
+                results = model(list(rgbs), **yolo_kwargs)
+
+                for idx, r in zip(range(s, e), results):
+                    emit(idx, *merge_overlapping_rois(yolo_boxes(r), yolo_scores(r)))
+        else:
+            for idx in tqdm(range(start, stop), disable=args.workers > 1):
 
-                rgb, curr_y = read_yuv420_frame(fp, args.width, args.height, idx)
+                # colour conversion is only needed by the detectors
+                if model is not None:
+                    rgb, curr_y = read_yuv420_frame(reader, idx)
+                else:
+                    curr_y = reader.y(idx)
                 rois = []
-                if args.roi_method in ['motion', 'saliency', 'fused']:
-                    # curr = read_yuv_frame(fp, args.width, args.height, idx)
-
-                    roi_mask = np.zeros_like(curr_y, np.uint8)
-                    
-                    if args.roi_method in ["motion", "fused"] and prev is not None:
-                        roi_mask |= motion_roi(prev, curr_y, args.block, args.t_motion)
-                        rois = mask_to_bboxes(roi_mask, args.min_area)
-                    if args.roi_method in ["saliency", "fused"]:
-                        roi_mask |= saliency_roi(curr_y, args.t_saliency)
-                        rois = mask_to_bboxes(roi_mask, args.min_area)
-                    prev = curr_y.copy()
+                if model is None and args.qg_map:
+                    emit(idx, mask_qg_map(args.roi_method, prev, curr_y, sr, args))
+                    prev = curr_y
+                    continue
+                if model is None:
+                    rois = mask_rois(args.roi_method, prev, curr_y, sr, args)
+                    # memory-mapped view, stays valid for the next frame
+                    prev = curr_y
+                    emit(idx, merge_overlapping_rois(rois))
                 else:
-                    
-                    results = model(
-                        rgb,
-                        imgsz=imgsz, 
-                        conf=0.25,
-                        iou=0.5,
-                        half=True,     # FP16
-                        verbose=False
-                    )
+                    scores = []
+                    results = model(rgb, **yolo_kwargs)
                     for r in results:
-                        if r.boxes is None:
-                            continue
-
-                        boxes = r.boxes.xyxy.cpu().numpy()
-                        for x1, y1, x2, y2 in boxes:
-                            rois.append((
-                                int(x1), int(y1),
-                                int(x2), int(y2)
-                            ))
+                        rois.extend(yolo_boxes(r))
+                        scores.extend(yolo_scores(r))
+                    emit(idx, *merge_overlapping_rois(rois, scores))
+
+    return {
+        "total_time": time.time() - seq_start,
+        "num_frames": stop - start,
+        "detections": detections,
+        "stages": None if stages is None else {t.name: t.busy for t in stages},
+        "rois": frame_rois,
+        "scores": frame_scores or None,
+    }
 
+# ==============================
+# Main
+# ==============================
+def main():
+    ap = argparse.ArgumentParser()
 
-                rois = merge_overlapping_rois(rois)
-                
-                out_file = os.path.join(out_roi, file_name, f"frame_{idx:04d}_roi.txt")
-                with open(out_file, "w") as f:
-                    for x1,y1,x2,y2 in rois:
-                        f.write(f"{x1}, {y1}, {x2}, {y2}\n")
-                        
-        seq_time = time.time() - seq_start
-
-        time_process[file_name] = {
-            "total_time": seq_time,
-            "num_frames": args.frames,
-            "avg_time_per_frame": seq_time / args.frames
-        }
+    ap.add_argument("--roi_method", type=str, default="motion",
+                    choices=["motion", "saliency", "fused", "fused_qg",
+                             "yolov5", "yolov8", "yolov9",
+                             "yolov10", "yolov11"])
+    ap.add_argument("--block", type=int, default=32)
+    ap.add_argument("--t_motion", type=float, default=35.0)
+    ap.add_argument("--t_saliency", type=float, default=0.15)
+    ap.add_argument("--sal_width", type=int, default=0,
+                    help="saliency working width (0 = full resolution)")
+    ap.add_argument("--min_area", type=int, default=256)
+    ap.add_argument("--out", default="roi")
+    ap.add_argument("--openvino", type=int, default=1)
+    ap.add_argument("--fullresol", type=int, default=0)
+    ap.add_argument("--batch", type=int, default=1,
+                    help="frames per detector call (YOLO only)")
+    ap.add_argument("--pipeline", type=int, default=0,
+                    help="overlap read / colour conversion / detection / writing on threads")
+    ap.add_argument("--queue_depth", type=int, default=4,
+                    help="max items buffered between pipeline stages")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="worker processes, each with its own model (1 = in-process)")
+    ap.add_argument("--threads", type=int, default=0,
+                    help="torch/OpenCV threads per worker (0 = cores / workers)")
+    ap.add_argument("--roi_format", type=str, default="txt", choices=["txt", "bin", "both"],
+                    help="frame_XXXX_roi.txt files, one <seq>.roi container (roi_container.py), or both")
+    ap.add_argument("--qg_map", type=int, default=0,
+                    help="write a <seq>.qgm QP offset map per sequence instead of boxes (motion/saliency/fused)")
+    ap.add_argument("--qg_size", type=int, default=16,
+                    help="QG size of the offset map, must match the encoder's qgSize")
+    ap.add_argument("--qg_thresh", type=float, default=0.5,
+                    help="min ROI fraction of a QG for it to get the ROI offset")
+    ap.add_argument("--detect_every", type=int, default=1,
+                    help="run the detector every K frames and track boxes in between (YOLO only)")
+    ap.add_argument("--track_scale", type=int, default=4,
+                    help="luma downscale factor for box tracking")
+    ap.add_argument("--track_search", type=int, default=16,
+                    help="tracking search range in pixels per frame")
+    ap.add_argument("--track_err", type=float, default=0.25,
+                    help="normalised match error above which a box is lost and the detector re-runs")
+    ap.add_argument("--track_new_motion", type=float, default=0.005,
+                    help="re-detect when motion outside the boxes exceeds this fraction of the frame")
+    ap.add_argument("--keep_alive", type=int, default=0,
+                    help="frames a box outlives its last detection (0 = off)")
+    ap.add_argument("--ema", type=float, default=1.0,
+                    help="box EMA weight of the new position (1 = no smoothing)")
+    ap.add_argument("--qg_hold", type=int, default=0,
+                    help="frames a QG keeps its ROI offset in --qg_map output (0 = off)")
+    ap.add_argument("--fuse_detector", type=str, default="",
+                    choices=["", "yolov5", "yolov8", "yolov9", "yolov10", "yolov11"],
+                    help="detector cue of fused_qg (empty = motion and saliency only)")
+    ap.add_argument("--w_motion", type=float, default=1.0, help="fused_qg motion weight")
+    ap.add_argument("--w_saliency", type=float, default=0.5, help="fused_qg saliency weight")
+    ap.add_argument("--w_detector", type=float, default=1.0, help="fused_qg detector weight")
+    ap.add_argument("--sal_res", type=int, default=2,
+                    help="fused_qg saliency samples per QG side")
+    args = ap.parse_args()
+    if args.roi_method == 'fused_qg':
+        # the fused importance only exists as a graded QG map
+        args.qg_map = 1
+        if not args.fuse_detector:
+            args.w_detector = 0.0
+        if args.batch > 1 or args.pipeline:
+            ap.error("fused_qg runs frame by frame, use it with --batch 1 --pipeline 0")
+        if args.w_motion + args.w_saliency + args.w_detector <= 0:
+            ap.error("fused_qg needs a positive --w_motion, --w_saliency or --w_detector")
+    if args.qg_map and args.roi_method not in ['motion', 'saliency', 'fused', 'fused_qg']:
+        ap.error("--qg_map needs a mask-based method (motion, saliency, fused, fused_qg)")
+    if args.detect_every > 1 and args.roi_method in ['motion', 'saliency', 'fused', 'fused_qg']:
+        ap.error("--detect_every needs a detector method (yolov*)")
+    if args.detect_every > 1 and (args.batch > 1 or args.pipeline):
+        ap.error("--detect_every runs frame by frame, use it with --batch 1 --pipeline 0")
+    if args.qg_hold and not args.qg_map:
+        ap.error("--qg_hold filters QG maps, use it with --qg_map 1 (roi_x265 --qg-hold for boxes)")
+    if (args.keep_alive or args.ema < 1.0) and args.qg_map:
+        ap.error("--keep_alive / --ema smooth boxes, use --qg_hold with --qg_map")
+    if not 0.0 < args.ema <= 1.0:
+        ap.error("--ema must be in (0, 1]")
+
+    args.input_path = 'input_yuv/class_B'
+    roiname, weights = roi_weights(args)
+    out_roi = os.path.join(args.out, roiname)
+    os.makedirs(out_roi, exist_ok=True)
+        
+    time_process = {}
+    time_log = open("logs/time_extract_roi.txt", 'a')
+    time_log.write(f"Extract roi with {roiname}\n")
+    time_log.flush()
+    print(f"Extract roi with {roiname}\n")
+    
+    seqs = os.listdir(args.input_path)
+    jobs = split_jobs(args, seqs, out_roi)
+    if not jobs:
+        print(f"No sequences in {args.input_path}")
+        return
+    threads = args.threads or max(1, (os.cpu_count() or 1) // max(args.workers, 1))
+
+    wall_start = time.time()
+    results = run_jobs(
+        extract_sequence, jobs, workers=args.workers, threads_per_worker=threads,
+        initializer=init_extract_worker, initargs=(args, weights),
+    )
+    containers = {}
+    for job, res in tqdm(results, total=len(jobs), disable=args.workers <= 1):
+        file_name = job[1]
+        seq = time_process.setdefault(
+            file_name, {"total_time": 0.0, "num_frames": 0, "detections": 0, "stages": None})
+        if args.qg_map or args.roi_format != 'txt':
+            # chunks arrive in frame order (run_jobs keeps job order)
+            entry = containers.setdefault(file_name, (job, [], []))
+            entry[1].extend(res["rois"])
+            if res["scores"] is not None:
+                entry[2].extend(res["scores"])
+        # chunks of one sequence add up to its total time / frames
+        seq["total_time"] += res["total_time"]
+        seq["num_frames"] += res["num_frames"]
+        seq["detections"] += res["detections"]
+        if res["stages"] is not None:
+            seq["stages"] = seq["stages"] or dict.fromkeys(res["stages"], 0.0)
+            for name, busy in res["stages"].items():
+                seq["stages"][name] += busy
+    for file_name, (job, frames, scores) in containers.items():
+        if args.qg_map:
+            write_qg_maps(os.path.join(out_roi, file_name + QGMAP_EXT),
+                          frames, args.qg_size)
+        else:
+            # detector confidences are stored as the per-box scores
+            write_roi_container(os.path.join(out_roi, file_name + ROI_EXT),
+                                frames, job[3], job[4],
+                                scores=scores if weights is not None else None)
+    wall_time = time.time() - wall_start
+
+    for v in time_process.values():
+        v["avg_time_per_frame"] = v["total_time"] / v["num_frames"]
+        if v["stages"] is not None:
+            v["stages"] = {
+                name: busy / v["num_frames"] * 1000 for name, busy in v["stages"].items()
+            }
 
-        # print(
-        #     f"[{file_name}] "
-        #     f"Total: {seq_time:.3f}s | "
-        #     f"Avg/frame: {seq_time / args.frames * 1000:.2f} ms"
-        # )
     all_seq_avg = np.mean([
         v["avg_time_per_frame"] for v in time_process.values()
     ])
@@ -282,13 +580,30 @@ def main():
     for k, v in time_process.items():
         print(
             f"{k:30s} | "
-            f"{v['avg_time_per_frame']*1000:.2f} ms/frame"
+            f"{v['avg_time_per_frame']*1000:.2f} ms/frame | "
+            f"{1 / v['avg_time_per_frame']:.2f} fps"
         )
-
-    print(f"\nOverall average with {imgsz}: {all_seq_avg*1000:.2f} ms/frame")
+        if v["detections"]:
+            print(f"{'':30s}   detector on {v['detections']}/{v['num_frames']} frames")
+        if v["stages"] is not None:
+            # busy time per stage; the slowest one bounds the pipeline
+            stage_str = " | ".join(f"{n} {ms:.2f}" for n, ms in v["stages"].items())
+            print(f"{'':30s}   stages (ms/frame): {stage_str}")
+            time_log.write(f'{k}: stages (ms/frame) {stage_str}\n')
+
+    # with --batch > 1 this is the batched throughput (wall time / frames);
+    # with --workers > 1 it is per-worker time, the wall-clock fps is below
+    # the detector input size only means something when a detector ran
+    setting = f"batch {args.batch}"
+    if weights is not None:
+        setting = f"{yolo_imgsz(args, jobs[-1][3], jobs[-1][4])}, {setting}"
+    total_frames = sum(v["num_frames"] for v in time_process.values())
+    print(f"\nOverall average with {setting}: {all_seq_avg*1000:.2f} ms/frame")
+    print(f"Wall clock with {args.workers} worker(s): {wall_time:.2f}s, {total_frames / wall_time:.2f} fps")
     
-    time_log.write(f'Overall average with {imgsz}: {all_seq_avg*1000:.2f} ms/frame\n')
-    time_log.flush
+    time_log.write(f'Overall average with {setting}: {all_seq_avg*1000:.2f} ms/frame\n')
+    time_log.write(f'Wall clock with {args.workers} worker(s): {wall_time:.2f}s, {total_frames / wall_time:.2f} fps\n')
+    time_log.flush()
                 
 
 if __name__ == "__main__":
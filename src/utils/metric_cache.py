@@ -0,0 +1,152 @@
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+import argparse
+
+
+DEFAULT_CACHE_FILE = "./results/metric_cache.sqlite"
+
+
+# ==============================
+# File signatures
+# ==============================
+def file_signature(path):
+    """
+    (absolute path, size, mtime_ns) of a file, or None if it does not
+    exist. Any rewrite of the file changes the signature.
+
+    A directory (frame_XXXX_roi.txt ROIs) is signed by its entries: their
+    count, total size and newest mtime_ns. Rewriting a file in place
+    leaves the directory's own size and mtime alone, so those alone would
+    hand back stale results after the ROIs are re-extracted.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if not os.path.isdir(path):
+        return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+    count, size, mtime = 0, 0, st.st_mtime_ns
+    with os.scandir(path) as it:
+        for entry in it:
+            est = entry.stat()
+            count += 1
+            size += est.st_size
+            mtime = max(mtime, est.st_mtime_ns)
+    return os.path.abspath(path), count, size, mtime
+
+
+# ==============================
+# SQLite-backed metric cache
+# ==============================
+class MetricCache:
+    """
+    Persistent cache of metric results.
+
+    An entry is keyed by the signatures of every input file (decoded output,
+    reference, ROI dir, ...) plus the metric name and its parameters, so a
+    changed or re-encoded file simply misses and is recomputed. Values are
+    stored as JSON.
+
+        cache = MetricCache()
+        val = cache.get([dec, org], "psnr", {"streaming": True})
+        if val is None:
+            val = compute(...)
+            cache.put([dec, org], "psnr", {"streaming": True}, val)
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_FILE):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS metrics ("
+            " key TEXT PRIMARY KEY,"
+            " file TEXT NOT NULL,"
+            " metric TEXT NOT NULL,"
+            " params TEXT NOT NULL,"
+            " value TEXT NOT NULL)"
+        )
+        self.db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    @staticmethod
+    def _params(params):
+        return json.dumps(params or {}, sort_keys=True)
+
+    def _key(self, paths, metric, params):
+        sigs = [file_signature(p) for p in paths]
+        if any(s is None for s in sigs):
+            return None
+        raw = json.dumps([sigs, metric, self._params(params)])
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, paths, metric, params=None):
+        key = self._key(paths, metric, params)
+        if key is None:
+            return None
+        row = self.db.execute(
+            "SELECT value FROM metrics WHERE key = ?", (key,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, paths, metric, params, value):
+        key = self._key(paths, metric, params)
+        if key is None:
+            return
+        file = os.path.abspath(paths[0])
+        params = self._params(params)
+        # drop stale entries for the same output/metric/params
+        self.db.execute(
+            "DELETE FROM metrics WHERE file = ? AND metric = ? AND params = ?",
+            (file, metric, params),
+        )
+        self.db.execute(
+            "INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?, ?)",
+            (key, file, metric, params, json.dumps(value)),
+        )
+        self.db.commit()
+
+
+# ==============================
+# CLI for shell scripts (val_vmaf.sh)
+# ==============================
+#   metric_cache.py has --metric vmaf DIST REF   -> exit 0 on a valid entry
+#   metric_cache.py put --metric vmaf --value out.json DIST REF
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("action", choices=["has", "get", "put"])
+    ap.add_argument("paths", nargs="+")
+    ap.add_argument("--metric", required=True)
+    ap.add_argument("--params", default="{}", help="JSON object")
+    ap.add_argument("--value", default=None)
+    ap.add_argument("--cache", default=DEFAULT_CACHE_FILE)
+    args = ap.parse_args()
+
+    params = json.loads(args.params)
+    with MetricCache(args.cache) as cache:
+        if args.action == "put":
+            cache.put(args.paths, args.metric, params, args.value)
+            return 0
+
+        value = cache.get(args.paths, args.metric, params)
+        if value is None:
+            return 1
+        if args.action == "get":
+            print(value)
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
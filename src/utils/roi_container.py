@@ -0,0 +1,327 @@
+import os
+import re
+import sys
+import argparse
+import numpy as np
+
+
+# ==============================
+# Binary ROI container (.roi), one file per sequence
+# ==============================
+#   header   32 bytes, little-endian
+#            char[4] magic "ROIB" | u16 version | u16 flags
+#            u32 width | u32 height | u32 num_frames | u32 num_boxes
+#            u32 reserved[2]
+#   index    u32[num_frames + 1]   box offsets, frame i = [index[i], index[i+1])
+#   boxes    int16 or int32 [num_boxes][4]   x1, y1, x2, y2
+#   scores   float32[num_boxes]    if FLAG_SCORES
+#   classes  int16[num_boxes]      if FLAG_CLASSES
+#
+# Read by roi_reader.c (roi_file_open / roi_file_frame) as well as below.
+ROI_EXT = ".roi"
+MAGIC = b"ROIB"
+VERSION = 1
+
+FLAG_INT32 = 1
+FLAG_SCORES = 2
+FLAG_CLASSES = 4
+
+HEADER = np.dtype([
+    ("magic", "S4"), ("version", "<u2"), ("flags", "<u2"),
+    ("width", "<u4"), ("height", "<u4"),
+    ("num_frames", "<u4"), ("num_boxes", "<u4"),
+    ("reserved", "<u4", 2),
+])
+
+
+def write_roi_container(path, frames, width=0, height=0, scores=None, classes=None):
+    """
+    Write per-frame box lists [[(x1, y1, x2, y2), ...], ...] to one .roi
+    file. scores / classes, when given, have the same per-frame shape.
+    Boxes are stored as int16 unless a coordinate does not fit.
+    """
+    counts = [len(f) for f in frames]
+    index = np.zeros(len(frames) + 1, "<u4")
+    np.cumsum(counts, out=index[1:])
+
+    boxes = np.array([b for f in frames for b in f], np.int64).reshape(-1, 4)
+    flags = 0
+    if boxes.size and (boxes.min() < -32768 or boxes.max() > 32767):
+        flags |= FLAG_INT32
+    if scores is not None:
+        flags |= FLAG_SCORES
+    if classes is not None:
+        flags |= FLAG_CLASSES
+
+    header = np.zeros((), HEADER)
+    header["magic"] = MAGIC
+    header["version"] = VERSION
+    header["flags"] = flags
+    header["width"] = width
+    header["height"] = height
+    header["num_frames"] = len(frames)
+    header["num_boxes"] = len(boxes)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header.tobytes())
+        f.write(index.tobytes())
+        f.write(boxes.astype("<i4" if flags & FLAG_INT32 else "<i2").tobytes())
+        if scores is not None:
+            f.write(np.array([s for fs in scores for s in fs], "<f4").tobytes())
+        if classes is not None:
+            f.write(np.array([c for fc in classes for c in fc], "<i2").tobytes())
+    # readers never see a half-written container
+    os.replace(tmp, path)
+
+
+class ROIContainer:
+    """
+    Read-only view of a .roi file. The whole file is loaded with a single
+    read; boxes(i) is a slice of the packed box array.
+
+        rois = ROIContainer("roi/yolov5/BasketballDrive_1920x1080_100.roi")
+        for x1, y1, x2, y2 in rois.boxes(idx):
+            ...
+    """
+
+    def __init__(self, path):
+        self.path = path
+        raw = np.fromfile(path, np.uint8)
+
+        header = raw[:HEADER.itemsize].view(HEADER)[0]
+        if header["magic"] != MAGIC:
+            raise ValueError(f"{path}: not a ROI container")
+        if header["version"] != VERSION:
+            raise ValueError(f"{path}: unsupported ROI container version {header['version']}")
+
+        self.flags = int(header["flags"])
+        self.width = int(header["width"])
+        self.height = int(header["height"])
+        self.num_frames = int(header["num_frames"])
+        num_boxes = int(header["num_boxes"])
+
+        pos = HEADER.itemsize
+        self.index = raw[pos:pos + 4 * (self.num_frames + 1)].view("<u4")
+        pos += self.index.nbytes
+
+        box_dtype = np.dtype("<i4" if self.flags & FLAG_INT32 else "<i2")
+        self._boxes = raw[pos:pos + box_dtype.itemsize * 4 * num_boxes].view(box_dtype).reshape(-1, 4)
+        pos += self._boxes.nbytes
+
+        self._scores = self._classes = None
+        if self.flags & FLAG_SCORES:
+            self._scores = raw[pos:pos + 4 * num_boxes].view("<f4")
+            pos += self._scores.nbytes
+        if self.flags & FLAG_CLASSES:
+            self._classes = raw[pos:pos + 2 * num_boxes].view("<i2")
+
+    def __len__(self):
+        return self.num_frames
+
+    def _range(self, idx):
+        if not 0 <= idx < self.num_frames:
+            return slice(0, 0)
+        return slice(int(self.index[idx]), int(self.index[idx + 1]))
+
+    def boxes(self, idx):
+        """(K, 4) int array of frame idx; empty for frames past the end."""
+        return self._boxes[self._range(idx)]
+
+    def scores(self, idx):
+        return None if self._scores is None else self._scores[self._range(idx)]
+
+    def classes(self, idx):
+        return None if self._classes is None else self._classes[self._range(idx)]
+
+    def __getitem__(self, idx):
+        return [tuple(int(v) for v in b) for b in self.boxes(idx)]
+
+
+# ==============================
+# QG offset maps (.qgm), one file per sequence
+# ==============================
+#   header   32 bytes, little-endian
+#            char[4] magic "QGMP" | u16 version | u16 qg_size
+#            u32 cols | u32 rows | u32 num_frames | u32 reserved[3]
+#   maps     float32[num_frames][rows][cols]   pic.quantOffsets, verbatim
+#
+# Read by roi_reader.c (qgmap_open / qgmap_frame).
+QGMAP_EXT = ".qgm"
+QGMAP_MAGIC = b"QGMP"
+
+QGMAP_HEADER = np.dtype([
+    ("magic", "S4"), ("version", "<u2"), ("qg_size", "<u2"),
+    ("cols", "<u4"), ("rows", "<u4"), ("num_frames", "<u4"),
+    ("reserved", "<u4", 3),
+])
+
+
+def write_qg_maps(path, maps, qg_size):
+    """Write a sequence of (rows, cols) quantOffsets maps to one .qgm file."""
+    maps = np.asarray(maps, "<f4")
+    header = np.zeros((), QGMAP_HEADER)
+    header["magic"] = QGMAP_MAGIC
+    header["version"] = VERSION
+    header["qg_size"] = qg_size
+    header["num_frames"], header["rows"], header["cols"] = maps.shape
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header.tobytes())
+        f.write(maps.tobytes())
+    os.replace(tmp, path)
+
+
+def read_qg_maps(path):
+    """(qg_size, maps) of a .qgm file; maps is a (frames, rows, cols) memmap."""
+    header = np.fromfile(path, QGMAP_HEADER, count=1)[0]
+    if header["magic"] != QGMAP_MAGIC:
+        raise ValueError(f"{path}: not a QG map file")
+    shape = (int(header["num_frames"]), int(header["rows"]), int(header["cols"]))
+    maps = np.memmap(path, "<f4", "r", offset=QGMAP_HEADER.itemsize, shape=shape)
+    return int(header["qg_size"]), maps
+
+
+# ==============================
+# ROI stream packets (live input of roi_x265)
+# ==============================
+#   header   16 bytes, little-endian
+#            char[4] magic "RXFR" | u32 frame | u32 num_rois | u32 flags
+#   rois     { i32 x1, y1, x2, y2; f32 weight } [num_rois]
+#   frame    one YUV420p frame if flags & STREAM_FLAG_YUV
+#
+# Read by roi_reader.c (roi_packet_header / roi_stream_frame).
+STREAM_MAGIC = b"RXFR"
+STREAM_FLAG_YUV = 1
+
+STREAM_HEADER = np.dtype([
+    ("magic", "S4"), ("frame", "<u4"), ("num_rois", "<u4"), ("flags", "<u4"),
+])
+STREAM_ROI = np.dtype([("box", "<i4", 4), ("weight", "<f4")])
+
+
+def pack_stream_packet(frame, boxes, weights=None, yuv=None):
+    """One packet: header, the boxes (weight 1 unless given) and, for the
+    interleaved input, the frame's packed YUV bytes."""
+    boxes = np.asarray(boxes, np.int64).reshape(-1, 4)
+    header = np.zeros((), STREAM_HEADER)
+    header["magic"] = STREAM_MAGIC
+    header["frame"] = frame
+    header["num_rois"] = len(boxes)
+    header["flags"] = STREAM_FLAG_YUV if yuv is not None else 0
+
+    recs = np.zeros(len(boxes), STREAM_ROI)
+    recs["box"] = boxes
+    recs["weight"] = 1.0 if weights is None else weights
+
+    parts = [header.tobytes(), recs.tobytes()]
+    if yuv is not None:
+        parts.append(memoryview(np.ascontiguousarray(yuv)).cast("B"))
+    return b"".join(parts)
+
+
+# ==============================
+# Directory layout (frame_XXXX_roi.txt)
+# ==============================
+_FRAME_RE = re.compile(r"frame_(\d+)_roi\.txt$")
+
+
+def read_roi_txt(path, weights=False):
+    """
+    x1, y1, x2, y2 per line, with an optional fifth column (ROI weight).
+    With weights=True returns (boxes, weights), missing weights 1 and the
+    weights None when no line has the column.
+    """
+    rois, ws = [], []
+    with open(path, "r") as f:
+        for line in f:
+            fields = line.strip().split(",")
+            if fields[0]:
+                rois.append(tuple(map(int, fields[:4])))
+                ws.append(float(fields[4]) if len(fields) > 4 else None)
+    if not weights:
+        return rois
+    if all(w is None for w in ws):
+        return rois, None
+    return rois, [1.0 if w is None else w for w in ws]
+
+
+def read_roi_dir(roi_dir, num_frames=None, weights=False):
+    """
+    Per-frame box lists of a frame_XXXX_roi.txt directory. Missing frames
+    are empty; num_frames defaults to the highest frame index + 1. With
+    weights=True returns (frames, per-frame weights), the weights None
+    when no file has a weight column.
+    """
+    files = {}
+    for name in os.listdir(roi_dir):
+        m = _FRAME_RE.match(name)
+        if m:
+            files[int(m.group(1))] = os.path.join(roi_dir, name)
+
+    if num_frames is None:
+        num_frames = max(files) + 1 if files else 0
+    if not weights:
+        return [read_roi_txt(files[i]) if i in files else [] for i in range(num_frames)]
+
+    read = [read_roi_txt(files[i], True) if i in files else ([], None) for i in range(num_frames)]
+    if all(ws is None for _, ws in read):
+        return [rois for rois, _ in read], None
+    return [rois for rois, _ in read], [ws or [1.0] * len(rois) for rois, ws in read]
+
+
+def open_rois(roi_dir):
+    """
+    Per-frame ROI source for a sequence: the <roi_dir>.roi container when
+    present, otherwise None so callers fall back to the text files.
+    """
+    path = roi_dir.rstrip("/\\") + ROI_EXT
+    return ROIContainer(path) if os.path.exists(path) else None
+
+
+# ==============================
+# Converter CLI
+# ==============================
+#   roi_container.py roi/yolov5            -> roi/yolov5/<seq>.roi for every <seq>/
+#   roi_container.py roi/yolov5/<seq>      -> roi/yolov5/<seq>.roi
+def _seq_size(name):
+    m = re.search(r"_(\d+)x(\d+)_(\d+)$", name)
+    return (int(m.group(1)), int(m.group(2)), int(m.group(3))) if m else (0, 0, None)
+
+
+def convert_dir(roi_dir, remove=False):
+    name = os.path.basename(roi_dir.rstrip("/\\"))
+    w, h, n = _seq_size(name)
+    frames, weights = read_roi_dir(roi_dir, n, weights=True)
+    out = roi_dir.rstrip("/\\") + ROI_EXT
+    # a fifth (weight) column is kept as the container scores
+    write_roi_container(out, frames, w, h, scores=weights)
+
+    if remove:
+        for fname in os.listdir(roi_dir):
+            if _FRAME_RE.match(fname):
+                os.remove(os.path.join(roi_dir, fname))
+    return out, len(frames), sum(len(f) for f in frames)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert frame_XXXX_roi.txt directories to .roi containers")
+    ap.add_argument("paths", nargs="+", help="sequence ROI dirs or method dirs containing them")
+    ap.add_argument("--remove", action="store_true", help="delete the text files afterwards")
+    args = ap.parse_args()
+
+    for path in args.paths:
+        entries = [os.path.join(path, d) for d in sorted(os.listdir(path))]
+        seq_dirs = [d for d in entries if os.path.isdir(d)]
+        if not seq_dirs:
+            seq_dirs = [path]
+
+        for d in seq_dirs:
+            out, n, boxes = convert_dir(d, args.remove)
+            print(f"{out}: {n} frames, {boxes} boxes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+import os
+import ctypes
+import ctypes.util
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+# ==============================
+# libroi_x265.so (make libroi_x265.so)
+# ==============================
+# Same encoder set-up as roi_x265, but driven from Python: frames and
+# offset maps are passed as NumPy arrays and NAL bytes come back, so
+# sweeps and extraction can encode without a subprocess or temp files.
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+_LIB_PATHS = [
+    os.path.join(_ROOT, "libroi_x265.so"),
+    os.path.join(_ROOT, "build", "libroi_x265.so"),
+]
+
+_u8_p = ctypes.POINTER(ctypes.c_uint8)
+_f32_p = ctypes.POINTER(ctypes.c_float)
+
+
+class _FrameInfo(ctypes.Structure):
+    _fields_ = [
+        ("pts", ctypes.c_int64),
+        ("slice_type", ctypes.c_int),
+        ("frames", ctypes.c_int),
+    ]
+
+
+_lib = None
+
+
+def _load():
+    """Load libroi_x265.so once: $ROI_X265_LIB, the repo root, build/, then the linker path."""
+    global _lib
+    if _lib is not None:
+        return _lib
+
+    paths = [os.environ["ROI_X265_LIB"]] if os.environ.get("ROI_X265_LIB") else []
+    paths += [p for p in _LIB_PATHS if os.path.exists(p)]
+    found = ctypes.util.find_library("roi_x265")
+    if found:
+        paths.append(found)
+    if not paths:
+        raise OSError("libroi_x265.so not found; build it with `make libroi_x265.so` or set ROI_X265_LIB")
+
+    lib = ctypes.CDLL(paths[0])
+
+    lib.roi_encoder_open.restype = ctypes.c_void_p
+    lib.roi_encoder_open.argtypes = [
+        ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+        ctypes.c_char_p, ctypes.c_int, ctypes.c_int, ctypes.c_double,
+    ]
+    lib.roi_encoder_qg_grid.restype = None
+    lib.roi_encoder_qg_grid.argtypes = [ctypes.c_void_p] + [ctypes.POINTER(ctypes.c_int)] * 3
+    lib.roi_encoder_headers.restype = ctypes.c_int
+    lib.roi_encoder_headers.argtypes = [
+        ctypes.c_void_p, ctypes.POINTER(_u8_p), ctypes.POINTER(ctypes.c_size_t),
+    ]
+    lib.roi_encoder_encode.restype = ctypes.c_int
+    lib.roi_encoder_encode.argtypes = [
+        ctypes.c_void_p, _u8_p, _u8_p, _u8_p, ctypes.c_int, ctypes.c_int,
+        _f32_p, ctypes.c_int64,
+        ctypes.POINTER(_u8_p), ctypes.POINTER(ctypes.c_size_t), ctypes.POINTER(_FrameInfo),
+    ]
+    lib.roi_encoder_flush.restype = ctypes.c_int
+    lib.roi_encoder_flush.argtypes = [
+        ctypes.c_void_p,
+        ctypes.POINTER(_u8_p), ctypes.POINTER(ctypes.c_size_t), ctypes.POINTER(_FrameInfo),
+    ]
+    lib.roi_encoder_close.restype = None
+    lib.roi_encoder_close.argtypes = [ctypes.c_void_p]
+    lib.roi_offset_map.restype = None
+    lib.roi_offset_map.argtypes = [
+        ctypes.c_int, ctypes.c_int, ctypes.c_int,
+        ctypes.POINTER(ctypes.c_int32), _f32_p, ctypes.c_int,
+        ctypes.c_int, ctypes.c_int, _f32_p,
+    ]
+
+    _lib = lib
+    return lib
+
+
+def _plane(a):
+    """(pointer, stride) of a 2-D uint8 plane with contiguous rows."""
+    a = np.asarray(a)
+    if a.dtype != np.uint8 or a.ndim != 2 or a.strides[1] != 1:
+        a = np.ascontiguousarray(a, np.uint8)
+    return a, a.ctypes.data_as(_u8_p), a.strides[0]
+
+
+# ==============================
+# Offset maps from boxes (roi.c)
+# ==============================
+def roi_offsets(boxes, width, height, qg=16, weights=None, graded=False, feather=2):
+    """
+    quantOffsets map (float32, rows x cols) that roi_x265 would build for
+    these (x1, y1, x2, y2) boxes: apply_roi_qp, or apply_roi_qp_graded
+    with per-box weights when graded. No boxes gives an all-zero map.
+    """
+    lib = _load()
+    rows, cols = (height + qg - 1) // qg, (width + qg - 1) // qg
+    out = np.empty((rows, cols), np.float32)
+
+    b = np.ascontiguousarray(np.asarray(boxes, np.int32).reshape(-1, 4))
+    w = None
+    if weights is not None:
+        w = np.ascontiguousarray(weights, np.float32)
+        if len(w) != len(b):
+            raise ValueError(f"{len(w)} weights for {len(b)} boxes")
+
+    lib.roi_offset_map(
+        width, height, qg,
+        b.ctypes.data_as(ctypes.POINTER(ctypes.c_int32)),
+        w.ctypes.data_as(_f32_p) if w is not None else None,
+        len(b), int(graded), feather,
+        out.ctypes.data_as(_f32_p),
+    )
+    return out
+
+
+# ==============================
+# Encoder
+# ==============================
+class Encoder:
+    """
+    In-process roi_x265: same x265 parameters as the CLI, one instance per
+    stream.
+
+        with Encoder(1920, 1080, qp=32, preset="medium") as enc:
+            out.write(enc.headers())
+            for y, u, v in yuv:
+                out.write(enc.encode(y, u, v, offsets))   # offsets: (rows, cols) or None
+            out.write(enc.flush())
+
+    encode() returns the NAL bytes x265 emitted for that call, which belong
+    to an earlier frame while the lookahead fills; enc.last lists
+    (pts, slice_type, num_bytes) of the frames returned by the last call.
+    """
+
+    _enc = None
+
+    def __init__(self, width, height, fps=30, qp=27, rc=2, preset="veryfast",
+                 rd_level=1, rdoq_level=0, psy_rd=2.0):
+        self._lib = _load()
+        self.width = width
+        self.height = height
+        self._enc = self._lib.roi_encoder_open(
+            width, height, fps, qp, rc, preset.encode(), rd_level, rdoq_level, psy_rd
+        )
+        if not self._enc:
+            raise RuntimeError("x265_encoder_open failed")
+
+        qg, cols, rows = ctypes.c_int(), ctypes.c_int(), ctypes.c_int()
+        self._lib.roi_encoder_qg_grid(self._enc, qg, cols, rows)
+        self.qg_size = qg.value
+        self.qg_shape = (rows.value, cols.value)
+
+        self._pts = 0
+        self.last = []
+
+    # ---------- context ----------
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._enc:
+            self._lib.roi_encoder_close(self._enc)
+            self._enc = None
+
+    def __del__(self):
+        self.close()
+
+    # ---------- encoding ----------
+    def _check(self):
+        if not self._enc:
+            raise ValueError("encoder is closed")
+
+    def headers(self):
+        """VPS/SPS/PPS NAL bytes (Annex B)."""
+        self._check()
+        data, size = _u8_p(), ctypes.c_size_t()
+        if self._lib.roi_encoder_headers(self._enc, data, size) < 0:
+            raise RuntimeError("x265_encoder_headers failed")
+        return ctypes.string_at(data, size.value)
+
+    def encode(self, y, u, v, offsets=None, pts=None):
+        """Encode one YUV420p frame; offsets is a qg_shape float map or None."""
+        self._check()
+        y, py, sy = _plane(y)
+        u, pu, su = _plane(u)
+        v, pv, sv = _plane(v)
+        if y.shape != (self.height, self.width):
+            raise ValueError(f"Y plane {y.shape} != {(self.height, self.width)}")
+        if su != sv:
+            u = np.ascontiguousarray(u)
+            v = np.ascontiguousarray(v)
+            pu, pv = u.ctypes.data_as(_u8_p), v.ctypes.data_as(_u8_p)
+            su = u.strides[0]
+
+        po = None
+        if offsets is not None:
+            offsets = np.ascontiguousarray(offsets, np.float32)
+            if offsets.shape != self.qg_shape:
+                raise ValueError(f"offset map {offsets.shape} != {self.qg_shape}")
+            po = offsets.ctypes.data_as(_f32_p)
+
+        if pts is None:
+            pts = self._pts
+        self._pts = pts + 1
+
+        data, size, info = _u8_p(), ctypes.c_size_t(), _FrameInfo()
+        got = self._lib.roi_encoder_encode(self._enc, py, pu, pv, sy, su, po, pts, data, size, info)
+        if got < 0:
+            raise RuntimeError("x265_encoder_encode failed")
+        self.last = [(info.pts, info.slice_type, size.value)] if got else []
+        return ctypes.string_at(data, size.value)
+
+    def flush(self):
+        """NAL bytes of every frame still in the lookahead / B-frame queue."""
+        self._check()
+        chunks, self.last = [], []
+        data, size, info = _u8_p(), ctypes.c_size_t(), _FrameInfo()
+        while True:
+            got = self._lib.roi_encoder_flush(self._enc, data, size, info)
+            if got < 0:
+                raise RuntimeError("x265_encoder_encode failed")
+            if got == 0:
+                break
+            chunks.append(ctypes.string_at(data, size.value))
+            self.last.append((info.pts, info.slice_type, size.value))
+        return b"".join(chunks)
+
+
+# ==============================
+# Several renditions from one read
+# ==============================
+class RenditionSet:
+    """
+    One Encoder per rendition, all fed the same frames and offset maps, so
+    a QP / preset ladder costs one read and one ROI analysis per frame.
+    renditions is a list of Encoder keyword overrides, e.g.
+    [{"qp": 22}, {"qp": 32, "preset": "slow"}]; the rest comes from
+    **common. Methods return one bytes object per rendition, in order.
+
+    The encoders run on a thread each (ctypes drops the GIL while x265
+    works), so renditions encode side by side rather than back to back.
+    """
+
+    def __init__(self, width, height, renditions, parallel=True, **common):
+        self.renditions = [dict(common, **r) for r in renditions]
+        self.encoders = []
+        try:
+            for r in self.renditions:
+                self.encoders.append(Encoder(width, height, **r))
+        except Exception:
+            self.close()
+            raise
+        self.qg_size = self.encoders[0].qg_size
+        self.qg_shape = self.encoders[0].qg_shape
+        self._pool = None
+        if parallel and len(self.encoders) > 1:
+            self._pool = ThreadPoolExecutor(len(self.encoders))
+
+    def __len__(self):
+        return len(self.encoders)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if getattr(self, "_pool", None) is not None:
+            self._pool.shutdown()
+            self._pool = None
+        for enc in self.encoders:
+            enc.close()
+
+    def _map(self, fn):
+        if self._pool is None:
+            return [fn(enc) for enc in self.encoders]
+        return list(self._pool.map(fn, self.encoders))
+
+    def headers(self):
+        return [enc.headers() for enc in self.encoders]
+
+    def encode(self, y, u, v, offsets=None, pts=None):
+        return self._map(lambda enc: enc.encode(y, u, v, offsets, pts))
+
+    def flush(self):
+        return self._map(lambda enc: enc.flush())
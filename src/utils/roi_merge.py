@@ -0,0 +1,231 @@
+import numpy as np
+
+
+# ==============================
+# Reference merge (repeated pairwise passes)
+# ==============================
+def overlap(a, b):
+    return not (
+        a[2] <= b[0] or  # A bên trái B
+        a[0] >= b[2] or  # A bên phải B
+        a[3] <= b[1] or  # A phía trên B
+        a[1] >= b[3]     # A phía dưới B
+    )
+
+def merge_two_boxes(a, b):
+    return (
+        min(a[0], b[0]),
+        min(a[1], b[1]),
+        max(a[2], b[2]),
+        max(a[3], b[3])
+    )
+
+def merge_overlapping_rois_ref(rois):
+    rois = rois.copy()
+    merged = True
+
+    while merged:
+        merged = False
+        result = []
+
+        while rois:
+            current = rois.pop(0)
+            i = 0
+            while i < len(rois):
+                if overlap(current, rois[i]):
+                    current = merge_two_boxes(current, rois[i])
+                    rois.pop(i)
+                    merged = True
+                else:
+                    i += 1
+            result.append(current)
+
+        rois = result
+
+    return rois
+
+
+# ==============================
+# Sweep-line + connected-components merge
+# ==============================
+_PAIR_CHUNK = 1 << 20   # candidate pairs tested per vectorised step
+_SMALL = 48             # below this the reference passes are faster
+_RUN = 8               # sweep candidates per box in a capped round
+
+
+def _overlap_pairs(boxes, limit=None):
+    """
+    Index pairs (i, j) of boxes that overlap (same test as overlap()), and
+    whether the search was cut short.
+
+    Boxes are swept in x1 order: box i can only overlap the boxes after it
+    whose x1 lies before its x2, a contiguous run found with searchsorted.
+    The remaining x / y conditions are tested on those runs in bulk. With
+    `limit`, only the first `limit` boxes of each run are tested, so the
+    pairs may be incomplete when the second value is True.
+    """
+    n = len(boxes)
+    order = np.argsort(boxes[:, 0], kind="stable")
+    s = boxes[order]
+    ends = np.searchsorted(s[:, 0], s[:, 2], side="left")
+    counts = np.maximum(ends - np.arange(n) - 1, 0)
+    capped = limit is not None and counts.max() > limit
+    if capped:
+        counts = np.minimum(counts, limit)
+
+    out_i, out_j = [], []
+    done = np.concatenate(([0], np.cumsum(counts)))   # pairs before box i
+    start = 0
+    while start < n:
+        # cut the sweep so a chunk never expands to more than _PAIR_CHUNK pairs
+        stop = np.searchsorted(done, done[start] + _PAIR_CHUNK, side="right") - 1
+        stop = min(max(stop, start + 1), n)
+
+        c = counts[start:stop]
+        ii = np.repeat(np.arange(start, stop), c)
+        first = np.cumsum(c) - c
+        jj = ii + 1 + np.arange(len(ii)) - np.repeat(first, c)
+
+        a, b = s[ii], s[jj]
+        hit = (
+            (a[:, 2] > b[:, 0]) & (a[:, 0] < b[:, 2]) &
+            (a[:, 3] > b[:, 1]) & (a[:, 1] < b[:, 3])
+        )
+        out_i.append(order[ii[hit]])
+        out_j.append(order[jj[hit]])
+        start = stop
+
+    return np.concatenate(out_i), np.concatenate(out_j), capped
+
+
+def _components(n, pi, pj):
+    """
+    Connected-component label (smallest member index) of every box, given
+    the overlap pairs. Each round hooks the root of every edge end onto the
+    smaller of the two roots, over all edges at once, then pointer-jumps so
+    every box points at its root again; long chains collapse in a few rounds.
+    """
+    label = np.arange(n)
+    while True:
+        li, lj = label[pi], label[pj]
+        m = np.minimum(li, lj)
+        new = label.copy()
+        np.minimum.at(new, li, m)
+        np.minimum.at(new, lj, m)
+        while True:
+            jumped = new[new]
+            if np.array_equal(jumped, new):
+                break
+            new = jumped
+        if np.array_equal(new, label):
+            return label
+        label = new
+
+
+def _merge_passes(rois, scores):
+    """merge_overlapping_rois_ref carrying a score per box; a merged box
+    keeps the highest score of the boxes it absorbed."""
+    rois, scores = list(rois), list(scores)
+    merged = True
+
+    while merged:
+        merged = False
+        result, result_scores = [], []
+
+        while rois:
+            current, score = rois.pop(0), scores.pop(0)
+            i = 0
+            while i < len(rois):
+                if overlap(current, rois[i]):
+                    current = merge_two_boxes(current, rois.pop(i))
+                    score = max(score, scores.pop(i))
+                    merged = True
+                else:
+                    i += 1
+            result.append(current)
+            result_scores.append(score)
+
+        rois, scores = result, result_scores
+
+    return rois, scores
+
+
+def _merge_small(rois, scores):
+    """Reference passes on a few boxes, as (boxes, scores or None)."""
+    if scores is None:
+        return [tuple(int(v) for v in r) for r in merge_overlapping_rois_ref(rois)], None
+    rois, scores = _merge_passes(rois, scores)
+    return [tuple(int(v) for v in r) for r in rois], [float(v) for v in scores]
+
+
+def merge_overlapping_rois(rois, scores=None):
+    """
+    Merge overlapping (x1, y1, x2, y2) boxes into their bounding boxes until
+    no two boxes overlap. With `scores` (one per box, e.g. detector
+    confidences) returns (boxes, scores), where a merged box keeps the
+    highest score of its group.
+
+    Same output as merge_overlapping_rois_ref, including order (merged
+    groups appear in the order of their earliest input box), but each
+    round is a sweep-line overlap search plus a vectorised union of the
+    overlapping pairs instead of quadratic pops. A round repeats only when
+    grown boxes start to overlap new neighbours.
+
+    Dense sets, where most boxes overlap many others, would make the first
+    round enumerate a near-quadratic number of pairs. Rounds therefore test
+    only the first _RUN sweep candidates of each box, which already joins
+    most of such a set into a few groups; once at most _SMALL groups are
+    left they finish with the reference passes. The cap grows 4x whenever a
+    round finds nothing or no longer halves the set, so sparse sets still
+    reach an exhaustive round before the merge stops.
+    """
+    if len(rois) <= _SMALL:
+        # numpy set-up costs more than the passes on a handful of boxes
+        out, out_scores = _merge_small(list(rois), scores)
+        return out if scores is None else (out, out_scores)
+
+    boxes = np.asarray(rois, np.int64).reshape(-1, 4)
+    score = None if scores is None else np.asarray(scores, np.float64)
+    first = np.arange(len(boxes))   # earliest input index in each group
+    limit = _RUN
+
+    while len(boxes) > 1:
+        if len(boxes) <= _SMALL:
+            # a few groups left: groups are already in earliest-box order,
+            # which the reference passes keep
+            order = np.argsort(first, kind="stable")
+            rest = [tuple(int(v) for v in b) for b in boxes[order]]
+            out, out_scores = _merge_small(rest, None if score is None else score[order].tolist())
+            return out if scores is None else (out, out_scores)
+
+        pi, pj, capped = _overlap_pairs(boxes, limit)
+        if len(pi) == 0:
+            if not capped:
+                break
+            limit *= 4
+            continue
+
+        roots = _components(len(boxes), pi, pj)
+        _, label = np.unique(roots, return_inverse=True)
+        k = label.max() + 1
+        merged = np.empty((k, 4), np.int64)
+        merged[:, :2] = np.iinfo(np.int64).max
+        merged[:, 2:] = np.iinfo(np.int64).min
+        np.minimum.at(merged[:, 0], label, boxes[:, 0])
+        np.minimum.at(merged[:, 1], label, boxes[:, 1])
+        np.maximum.at(merged[:, 2], label, boxes[:, 2])
+        np.maximum.at(merged[:, 3], label, boxes[:, 3])
+        group_first = np.full(k, len(rois))
+        np.minimum.at(group_first, label, first)
+        if score is not None:
+            group_score = np.full(k, -np.inf)
+            np.maximum.at(group_score, label, score)
+            score = group_score
+
+        if capped and 2 * k > len(boxes):
+            limit *= 4
+        boxes, first = merged, group_first
+
+    order = np.argsort(first, kind="stable")
+    out = [tuple(int(v) for v in b) for b in boxes[order]]
+    return out if scores is None else (out, score[order].tolist())
@@ -0,0 +1,75 @@
+import numpy as np
+import cv2
+
+
+# ==============================
+# Block statistics
+# ==============================
+def block_mean(img, block):
+    """
+    Mean of every block x block tile of a 2-D uint8 image.
+
+    Tile sums are read off one integral image (four lookups per tile), so
+    there is no Python loop over tiles and no padding copy. Frames that are
+    not a multiple of `block` get partial edge tiles averaged over their
+    real pixel count; the grid is ceil(h/block) x ceil(w/block).
+    """
+    h, w = img.shape
+    ys = np.r_[np.arange(0, h, block), h]
+    xs = np.r_[np.arange(0, w, block), w]
+
+    integral = cv2.integral(img)          # (h+1, w+1) int32
+    s = integral[np.ix_(ys, xs)]
+    sums = s[1:, 1:] - s[:-1, 1:] - s[1:, :-1] + s[:-1, :-1]
+
+    return sums / np.outer(np.diff(ys), np.diff(xs)).astype(np.float32)
+
+
+# ==============================
+# Motion-based ROI
+# ==============================
+def motion_block_mask(prev, curr, block, th):
+    """
+    Binary motion mask on the block grid: 1 where the mean absolute frame
+    difference of a block exceeds `th`, closed with a 3x3 kernel.
+    """
+    diff = cv2.absdiff(curr, prev)
+    motion_map = block_mean(diff, block)
+
+    mask = (motion_map > th).astype(np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE,
+                            np.ones((3, 3), np.uint8))
+    return mask
+
+
+def upsample_block_mask(mask, block, h, w):
+    """Nearest-neighbour expansion of a block-grid mask back to h x w pixels."""
+    full = np.repeat(np.repeat(mask, block, axis=0), block, axis=1)
+    return full[:h, :w]
+
+
+def motion_roi(prev, curr, block, th):
+    """Full-resolution motion mask (for OR-ing with other pixel masks)."""
+    h, w = curr.shape
+    mask = motion_block_mask(prev, curr, block, th)
+    return upsample_block_mask(mask, block, h, w)
+
+
+# ==============================
+# Block mask -> ROI boxes
+# ==============================
+def block_mask_to_bboxes(mask, block, min_area, w, h):
+    """
+    Connected components of a block-grid mask as pixel boxes (x1, y1, x2, y2),
+    clipped to the frame. min_area is in pixels, as in mask_to_bboxes.
+    """
+    n, _, stats, _ = cv2.connectedComponentsWithStats(mask, 8)
+    rois = []
+    for i in range(1, n):
+        x, y, bw, bh, area = stats[i]
+        if area * block * block >= min_area:
+            rois.append((
+                int(x * block), int(y * block),
+                int(min((x + bw) * block, w)), int(min((y + bh) * block, h))
+            ))
+    return rois
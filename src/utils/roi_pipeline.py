@@ -0,0 +1,118 @@
+import time
+import queue
+import threading
+
+
+_DONE = object()
+
+
+# ==============================
+# Stage timing
+# ==============================
+class StageTimer:
+    """Busy time and item count of one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.busy = 0.0
+        self.items = 0
+
+    def ms_per(self, n):
+        return self.busy / max(n, 1) * 1000
+
+
+# ==============================
+# Threaded pipeline
+# ==============================
+def _put(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return _DONE
+
+
+def run_pipeline(source, stages, depth=4):
+    """
+    Run a producer/consumer chain with one thread per stage:
+
+        source -> stages[0] -> stages[1] -> ... -> stages[-1]
+
+    source is (name, iterable); the iterable is drained on its own thread,
+    so lazy reads (memmap page-in, disk I/O) happen there. Each stage is
+    (name, fn): fn(item) returns the item handed to the next stage, the
+    last stage's return value is dropped. Stages are connected by queues
+    of at most `depth` items, so a slow stage back-pressures the ones in
+    front of it instead of buffering the whole sequence. Items stay in
+    order since every stage is a single thread.
+
+    The first exception raised by any stage stops the chain and is
+    re-raised here. Returns a StageTimer per stage, source first.
+    """
+    names = [source[0]] + [name for name, _ in stages]
+    timers = [StageTimer(name) for name in names]
+    queues = [queue.Queue(maxsize=depth) for _ in stages]
+    stop = threading.Event()
+    errors = []
+
+    def produce():
+        timer, out = timers[0], queues[0]
+        try:
+            it = iter(source[1])
+            while True:
+                t0 = time.perf_counter()
+                item = next(it, _DONE)
+                timer.busy += time.perf_counter() - t0
+                if item is _DONE or not _put(out, item, stop):
+                    break
+                timer.items += 1
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        _put(out, _DONE, stop)
+
+    def consume(i, fn):
+        timer = timers[i + 1]
+        inp = queues[i]
+        out = queues[i + 1] if i + 1 < len(queues) else None
+        try:
+            while True:
+                item = _get(inp, stop)
+                if item is _DONE:
+                    break
+                t0 = time.perf_counter()
+                item = fn(item)
+                timer.busy += time.perf_counter() - t0
+                timer.items += 1
+                if out is not None and not _put(out, item, stop):
+                    break
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        if out is not None:
+            _put(out, _DONE, stop)
+
+    threads = [threading.Thread(target=produce, name=names[0], daemon=True)]
+    threads += [
+        threading.Thread(target=consume, args=(i, fn), name=name, daemon=True)
+        for i, (name, fn) in enumerate(stages)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if errors:
+        raise errors[0]
+    return timers
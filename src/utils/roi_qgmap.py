@@ -0,0 +1,80 @@
+import numpy as np
+
+from roi_motion import block_mean, upsample_block_mask
+
+
+# ==============================
+# QG grid
+# ==============================
+# x265 reads pic.quantOffsets as one float per qgSize x qgSize block,
+# row-major over ceil(h/qg) x ceil(w/qg) (roi_x265 sets qgSize = 16).
+QG_SIZE = 16
+
+
+def qg_grid(width, height, qg=QG_SIZE):
+    """(rows, cols) of the quantOffsets grid."""
+    return (height + qg - 1) // qg, (width + qg - 1) // qg
+
+
+# ==============================
+# Mask -> ROI fraction per QG
+# ==============================
+def mask_qg_fraction(mask, qg=QG_SIZE):
+    """Fraction of ROI pixels in every QG of a full-resolution 0/1 mask."""
+    return block_mean(mask, qg)
+
+
+def block_mask_qg_fraction(mask, block, qg, height, width):
+    """
+    ROI fraction per QG of a block-grid mask (motion_block_mask). When the
+    block size is a multiple of the QG size each block simply covers
+    (block/qg)^2 QGs, so the full-resolution mask is never built.
+    """
+    if block % qg == 0:
+        rows, cols = qg_grid(width, height, qg)
+        k = block // qg
+        frac = np.repeat(np.repeat(mask, k, axis=0), k, axis=1)
+        return frac[:rows, :cols].astype(np.float32)
+    return block_mean(upsample_block_mask(mask, block, height, width), qg)
+
+
+# ==============================
+# ROI fraction -> QP offsets
+# ==============================
+def roi_offset(roi_rate):
+    """Offset magnitude by ROI share of the frame, as allocateQPOffset in roi.c."""
+    if roi_rate < 0.3:
+        return 1.0
+    if roi_rate < 0.7:
+        return 2.0
+    return 3.0
+
+
+def qg_offsets(frac, th=0.5):
+    """
+    quantOffsets map (float32, rows x cols) from per-QG ROI fractions: a QG
+    is ROI when at least `th` of it is covered and gets -offset, the rest
+    +offset. Unlike box rasterisation in apply_roi_qp, a QG touched by a
+    box corner but not by the mask stays background. Frames without any
+    ROI QG get an all-zero map, as the encoder does for frames without
+    boxes.
+    """
+    roi = frac >= th
+    if not roi.any():
+        return np.zeros(frac.shape, np.float32)
+    off = roi_offset(float(frac.mean()))
+    return np.where(roi, -off, off).astype(np.float32)
+
+
+def graded_qg_offsets(importance):
+    """
+    Graded quantOffsets map from a per-QG importance in [0, 1], with the
+    rule of apply_roi_qp_graded in roi.c: A * (mean - importance), A twice
+    the binary offset for the ROI share (here the mean importance), so the
+    frame-average offset is 0. An all-zero importance gives a zero map.
+    """
+    importance = np.asarray(importance, np.float32)
+    mean = float(importance.mean())
+    if mean <= 0.0:
+        return np.zeros(importance.shape, np.float32)
+    return (2.0 * roi_offset(mean) * (mean - importance)).astype(np.float32)
@@ -0,0 +1,108 @@
+import numpy as np
+import cv2
+
+
+# ==============================
+# Reference Spectral Residual (full resolution, complex float64 FFT)
+# ==============================
+def spectral_residual(gray):
+    gray = gray.astype(np.float32)
+    fft = np.fft.fft2(gray)
+    log_amp = np.log(np.abs(fft) + 1e-8)
+    phase = np.angle(fft)
+
+    avg = cv2.blur(log_amp, (3,3))
+    residual = log_amp - avg
+
+    sal = np.abs(
+        np.fft.ifft2(np.exp(residual + 1j * phase))
+    ) ** 2
+
+    sal = cv2.GaussianBlur(sal, (9,9), 0)
+    sal = cv2.normalize(sal, None, 0, 1, cv2.NORM_MINMAX)
+    return sal
+
+
+# ==============================
+# Fast Spectral Residual
+# ==============================
+class SpectralResidual:
+    """
+    Spectral Residual saliency for a fixed frame size, built once per
+    sequence and reused for every frame.
+
+    - work_width > 0 computes saliency on a downsample of that width
+      (aspect ratio kept) and upsamples the map back; 0 = full resolution.
+    - The working frame is reflect-padded to cv2.getOptimalDFTSize sizes
+      and transformed with a float32 real FFT (rfft2/irfft2), which only
+      computes the non-redundant half of the spectrum.
+    - The output Gaussian kernel (sigma of the reference 9x9 blur, scaled
+      to the working resolution) is precomputed; numpy's pocketfft keeps
+      its own per-size plan cache, so repeated frames reuse the plans.
+    """
+
+    REF_SIGMA = 0.3 * ((9 - 1) * 0.5 - 1) + 0.8   # sigma of GaussianBlur((9,9), 0)
+
+    def __init__(self, width, height, work_width=0):
+        self.width = width
+        self.height = height
+
+        if work_width and work_width < width:
+            self.work_w = work_width
+            self.work_h = max(1, round(height * work_width / width))
+        else:
+            self.work_w, self.work_h = width, height
+
+        self.fft_w = cv2.getOptimalDFTSize(self.work_w)
+        self.fft_h = cv2.getOptimalDFTSize(self.work_h)
+
+        scale = self.work_w / width
+        sigma = self.REF_SIGMA * scale
+        if sigma >= 0.5:
+            ksize = max(3, int(round(9 * scale)) | 1)
+            self.kernel = cv2.getGaussianKernel(ksize, sigma, cv2.CV_32F)
+        else:
+            self.kernel = None
+
+    def __call__(self, gray):
+        """Saliency map in [0, 1], float32, at the full frame size."""
+        small = gray
+        if (self.work_w, self.work_h) != (self.width, self.height):
+            small = cv2.resize(gray, (self.work_w, self.work_h),
+                               interpolation=cv2.INTER_AREA)
+        small = small.astype(np.float32)
+
+        pad_h, pad_w = self.fft_h - self.work_h, self.fft_w - self.work_w
+        if pad_h or pad_w:
+            small = cv2.copyMakeBorder(small, 0, pad_h, 0, pad_w,
+                                       cv2.BORDER_REFLECT_101)
+
+        spec = np.fft.rfft2(small)
+        amp = np.abs(spec)
+        log_amp = np.log(amp + 1e-8).astype(np.float32)
+
+        residual = log_amp - cv2.blur(log_amp, (3, 3))
+        # exp(residual) * unit phasor == exp(residual + 1j * phase)
+        spec *= np.exp(residual) / (amp + 1e-8)
+
+        sal = np.fft.irfft2(spec, s=small.shape)[:self.work_h, :self.work_w]
+        sal = np.square(sal, dtype=np.float32)
+
+        if self.kernel is not None:
+            sal = cv2.sepFilter2D(sal, -1, self.kernel, self.kernel)
+        sal = cv2.normalize(sal, None, 0, 1, cv2.NORM_MINMAX)
+
+        if sal.shape != (self.height, self.width):
+            sal = cv2.resize(sal, (self.width, self.height),
+                             interpolation=cv2.INTER_LINEAR)
+        return sal
+
+
+# ==============================
+# Saliency -> mask
+# ==============================
+def saliency_mask(sal, th):
+    mask = (sal > th).astype(np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN,
+                             np.ones((5,5), np.uint8))
+    return mask
@@ -0,0 +1,208 @@
+import os
+import re
+import sys
+import argparse
+import numpy as np
+
+from roi_container import (ROI_EXT, QGMAP_EXT, ROIContainer, read_roi_dir,
+                           write_roi_container, read_qg_maps, write_qg_maps)
+from roi_qgmap import qg_grid
+
+
+# ==============================
+# Box keep-alive + EMA
+# ==============================
+def box_iou(a, b):
+    """(len(a), len(b)) IoU matrix of two (N, 4) x1, y1, x2, y2 arrays."""
+    a = np.asarray(a, np.float64).reshape(-1, 1, 4)
+    b = np.asarray(b, np.float64).reshape(1, -1, 4)
+    iw = (np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0])).clip(0)
+    ih = (np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1])).clip(0)
+    inter = iw * ih
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-9)
+
+
+class BoxSmoother:
+    """
+    Temporal filter for per-frame ROI boxes, run in frame order.
+
+    Boxes are matched to the previous frame's tracks by IoU (greedy, best
+    pair first, at least min_iou). A matched track follows its box with an
+    exponential moving average (alpha = weight of the new box, 1 = no
+    smoothing), an unmatched box starts a track, and a track that finds no
+    box is kept for `keep` more frames before it is dropped. A box that
+    drops out of the detector or motion mask for a frame or two then no
+    longer flips its QGs between the ROI and background offsets. With
+    per-box scores a track carries the score of its latest box, and the
+    call returns (boxes, scores).
+
+        smoother = BoxSmoother(keep=3, alpha=0.5)
+        for boxes in frames:
+            boxes = smoother(boxes)
+    """
+
+    def __init__(self, keep=3, alpha=0.5, min_iou=0.3):
+        self.keep = keep
+        self.alpha = alpha
+        self.min_iou = min_iou
+        self.reset()
+
+    def reset(self):
+        self._boxes = np.zeros((0, 4), np.float64)
+        self._missed = np.zeros(0, np.int64)
+        self._scores = np.zeros(0, np.float64)
+
+    def __call__(self, boxes, scores=None):
+        boxes = np.asarray(boxes, np.float64).reshape(-1, 4)
+        new_scores = np.ones(len(boxes)) if scores is None else np.asarray(scores, np.float64)
+        tracks, missed, track_scores = self._boxes, self._missed + 1, self._scores
+        matched = np.zeros(len(boxes), bool)
+
+        if len(tracks) and len(boxes):
+            iou = box_iou(tracks, boxes)
+            for flat in np.argsort(iou, axis=None)[::-1]:
+                t, b = divmod(int(flat), len(boxes))
+                if iou[t, b] < self.min_iou:
+                    break
+                if missed[t] == 0 or matched[b]:
+                    continue
+                tracks[t] += self.alpha * (boxes[b] - tracks[t])
+                track_scores[t] = new_scores[b]
+                missed[t] = 0
+                matched[b] = True
+
+        alive = missed <= self.keep
+        self._boxes = np.concatenate([tracks[alive], boxes[~matched]])
+        self._missed = np.concatenate([missed[alive], np.zeros(np.count_nonzero(~matched), np.int64)])
+        self._scores = np.concatenate([track_scores[alive], new_scores[~matched]])
+        out = [tuple(int(v) for v in np.rint(b)) for b in self._boxes]
+        return out if scores is None else (out, self._scores.tolist())
+
+
+# ==============================
+# Per-QG offset hysteresis
+# ==============================
+class QGHysteresis:
+    """
+    Hysteresis on quantOffsets maps, run in frame order: a QG that turns
+    ROI (negative offset) switches at once, but one that stops being ROI
+    keeps its last ROI offset for `hold` more frames. Same rule as
+    roi_x265 --qg-hold.
+    """
+
+    def __init__(self, hold=3):
+        self.hold = hold
+        self._held = None
+        self._left = None
+
+    def __call__(self, offsets):
+        offsets = np.asarray(offsets, np.float32)
+        if self._held is None or self._held.shape != offsets.shape:
+            self._held = np.zeros_like(offsets)
+            self._left = np.zeros(offsets.shape, np.int32)
+
+        roi = offsets < 0
+        self._held[roi] = offsets[roi]
+        self._left[roi] = self.hold + 1
+
+        keep = ~roi & (self._left > 0)
+        out = offsets.copy()
+        out[keep] = self._held[keep]
+        self._left[self._left > 0] -= 1
+        return out
+
+
+def qg_flips(maps):
+    """Mean share of QGs per frame whose offset changes sign from the previous frame."""
+    maps = np.asarray(maps)
+    if len(maps) < 2:
+        return 0.0
+    sign = np.sign(maps)
+    return float(np.mean(sign[1:] != sign[:-1]))
+
+
+def box_qg_signs(frames, width, height, qg=16):
+    """-1 / +1 maps of the QGs each frame's boxes touch (apply_roi_qp's rule)."""
+    rows, cols = qg_grid(width, height, qg)
+    maps = np.ones((len(frames), rows, cols), np.float32)
+    for i, boxes in enumerate(frames):
+        for x1, y1, x2, y2 in boxes:
+            maps[i, max(y1, 0) // qg:-(-y2 // qg), max(x1, 0) // qg:-(-x2 // qg)] = -1.0
+    return maps
+
+
+# ==============================
+# Offline filter CLI
+# ==============================
+#   roi_temporal.py roi/yolov5 --out roi/yolov5_keep3_ema0.5 --keep_alive 3 --ema 0.5
+#   roi_temporal.py roi/motion --out roi/motion_hold3 --qg_hold 3      (.qgm maps)
+# Every <seq>.roi, frame_XXXX_roi.txt directory and <seq>.qgm under the
+# input is filtered into the output directory, keeping its name.
+def smooth_boxes(frames, keep, alpha, scores=None):
+    smoother = BoxSmoother(keep, alpha)
+    if scores is None:
+        return [smoother(b) for b in frames]
+    out = [smoother(b, s) for b, s in zip(frames, scores)]
+    return [b for b, _ in out], [s for _, s in out]
+
+
+def hold_maps(maps, hold):
+    hyst = QGHysteresis(hold)
+    return np.stack([hyst(m) for m in maps]) if len(maps) else np.asarray(maps)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Keep-alive / EMA box smoothing and QG hysteresis for ROI sets")
+    ap.add_argument("input", help="ROI method directory (or one <seq>.roi / <seq>.qgm / sequence dir)")
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--keep_alive", type=int, default=3, help="frames a box outlives its last detection")
+    ap.add_argument("--ema", type=float, default=0.5, help="weight of the new box (1 = no smoothing)")
+    ap.add_argument("--qg_hold", type=int, default=3, help="frames a QG keeps its ROI offset (.qgm)")
+    args = ap.parse_args()
+    os.makedirs(args.out, exist_ok=True)
+
+    paths = [args.input]
+    if os.path.isdir(args.input) and not any(f.endswith("_roi.txt") for f in os.listdir(args.input)):
+        paths = [os.path.join(args.input, f) for f in sorted(os.listdir(args.input))]
+
+    for path in paths:
+        name = os.path.basename(path.rstrip("/\\"))
+        if path.endswith(QGMAP_EXT):
+            qg, maps = read_qg_maps(path)
+            out = hold_maps(maps, args.qg_hold)
+            write_qg_maps(os.path.join(args.out, name), out, qg)
+            print(f"{name}: QG sign flips/frame {qg_flips(maps):.4f} -> {qg_flips(out):.4f}")
+            continue
+
+        if path.endswith(ROI_EXT):
+            container = ROIContainer(path)
+            frames = [container[i] for i in range(len(container))]
+            scores = None
+            if container.scores(0) is not None:
+                scores = [container.scores(i).tolist() for i in range(len(container))]
+            w, h = container.width, container.height
+        elif os.path.isdir(path) and not os.path.exists(path.rstrip("/\\") + ROI_EXT):
+            frames, scores = read_roi_dir(path, weights=True)
+            m = re.search(r"_(\d+)x(\d+)", name)
+            w, h = (int(m.group(1)), int(m.group(2))) if m else (0, 0)
+            name += ROI_EXT
+        else:
+            continue
+
+        if scores is None:
+            out = smooth_boxes(frames, args.keep_alive, args.ema)
+        else:
+            out, scores = smooth_boxes(frames, args.keep_alive, args.ema, scores)
+        write_roi_container(os.path.join(args.out, name), out, w, h, scores=scores)
+        flips = ""
+        if w and h:
+            before, after = box_qg_signs(frames, w, h), box_qg_signs(out, w, h)
+            flips = f", QG sign flips/frame {qg_flips(before):.4f} -> {qg_flips(after):.4f}"
+        print(f"{name}: {sum(map(len, frames))} -> {sum(map(len, out))} boxes{flips}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import numpy as np
+import cv2
+
+from roi_motion import motion_block_mask
+
+
+# ==============================
+# Box tracking between detections
+# ==============================
+def _parabola_min(v):
+    """Offset in [-0.5, 0.5] of the minimum of a parabola through 3 samples."""
+    l, c, r = (float(x) for x in v)
+    d = l - 2.0 * c + r
+    return 0.5 * (l - r) / d if d > 1e-12 else 0.0
+
+
+class BoxTracker:
+    """
+    Carries detector boxes over the frames between two detector calls.
+
+    Every box is moved by block matching its luma patch from the previous
+    frame inside a +-search window of the current one, both at 1/scale
+    resolution (cv2.matchTemplate, squared difference). The tracker
+    reports divergence, and the caller re-detects, when a box no longer
+    matches (normalised error above max_err) or when block motion, as in
+    motion_roi, covers more than new_motion of the frame outside every
+    tracked box: something entered the scene that the boxes do not cover.
+
+        tracker.reset(y, boxes, scores)  # on a detection frame
+        boxes, diverged = tracker.update(y)
+        scores = tracker.scores()        # of those boxes, kept from reset
+    """
+
+    def __init__(self, width, height, scale=4, search=16, max_err=0.25,
+                 block=32, t_motion=35.0, new_motion=0.005):
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.radius = max(1, search // scale)
+        self.max_err = max_err
+        self.block = block
+        self.t_motion = t_motion
+        self.new_motion = new_motion
+        self._size = (max(1, width // scale), max(1, height // scale))
+        self._prev = None
+        self._prev_y = None
+        self._boxes = np.zeros((0, 4), np.float32)
+        self._scores = None
+
+    def _small(self, y):
+        return cv2.resize(y, self._size, interpolation=cv2.INTER_AREA)
+
+    def reset(self, y, boxes, scores=None):
+        """Start tracking `boxes` (x1, y1, x2, y2 pixels) from luma frame y;
+        each box keeps its score (detector confidence), if given, while tracked."""
+        self._prev = self._small(y)
+        self._prev_y = y
+        self._boxes = np.asarray(boxes, np.float32).reshape(-1, 4) / self.scale
+        self._scores = None if scores is None else np.asarray(scores, np.float64)
+
+    def _clipped(self):
+        """Boxes in pixels clipped to the frame, and which are not empty."""
+        b = np.rint(self._boxes * self.scale).astype(np.int64)
+        b[:, [0, 2]] = b[:, [0, 2]].clip(0, self.width)
+        b[:, [1, 3]] = b[:, [1, 3]].clip(0, self.height)
+        return b, (b[:, 2] > b[:, 0]) & (b[:, 3] > b[:, 1])
+
+    def boxes(self):
+        """Current boxes in pixels, clipped to the frame."""
+        b, keep = self._clipped()
+        return [tuple(int(v) for v in r) for r in b[keep]]
+
+    def scores(self):
+        """Scores of the boxes() boxes, None when reset without scores."""
+        if self._scores is None:
+            return None
+        return self._scores[self._clipped()[1]].tolist()
+
+    def _match(self, prev, curr, box):
+        """(dx, dy, error) of one box, in small-frame pixels."""
+        sw, sh = self._size
+        x1, y1, x2, y2 = np.rint(box).astype(int)
+        x1, y1 = max(x1, 0), max(y1, 0)
+        x2, y2 = min(x2, sw), min(y2, sh)
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return 0, 0, 0.0     # too small to match, keep it in place
+
+        r = self.radius
+        sx1, sy1 = max(x1 - r, 0), max(y1 - r, 0)
+        sx2, sy2 = min(x2 + r, sw), min(y2 + r, sh)
+        res = cv2.matchTemplate(curr[sy1:sy2, sx1:sx2], prev[y1:y2, x1:x2],
+                                cv2.TM_SQDIFF_NORMED)
+        err, _, (mx, my), _ = cv2.minMaxLoc(res)
+        # sub-pixel offset from a parabola through the minimum and its
+        # neighbours: at 1/scale resolution most motion is a fraction of a
+        # pixel per frame, and whole-pixel steps would accumulate
+        fx = _parabola_min(res[my, mx - 1:mx + 2]) if 0 < mx < res.shape[1] - 1 else 0.0
+        fy = _parabola_min(res[my - 1:my + 2, mx]) if 0 < my < res.shape[0] - 1 else 0.0
+        return sx1 + mx + fx - x1, sy1 + my + fy - y1, err
+
+    def update(self, y):
+        """
+        Move the boxes to luma frame y. Returns (boxes, diverged); the
+        boxes are still moved when diverged, the caller decides whether
+        to re-detect.
+        """
+        curr = self._small(y)
+        prev, self._prev = self._prev, curr
+        prev_y, self._prev_y = self._prev_y, y
+        if prev is None:
+            return [], True
+
+        diverged = False
+        for i, box in enumerate(self._boxes):
+            dx, dy, err = self._match(prev, curr, box)
+            self._boxes[i] += (dx, dy, dx, dy)
+            diverged |= err > self.max_err
+
+        # motion the boxes do not account for, on the full-resolution luma
+        # (downscaling averages the difference of textured content away)
+        if not diverged and self.new_motion < 1.0:
+            motion = motion_block_mask(prev_y, y, self.block, self.t_motion)
+            if motion.any():
+                covered = np.zeros_like(motion)
+                for x1, y1, x2, y2 in self._boxes * self.scale / self.block:
+                    covered[max(int(y1), 0):int(np.ceil(y2)),
+                            max(int(x1), 0):int(np.ceil(x2))] = 1
+                uncovered = np.count_nonzero(motion & (covered == 0))
+                diverged = uncovered > self.new_motion * motion.size
+
+        return self.boxes(), diverged
+
+
+def detect_and_track(frames, detect, tracker, every):
+    """
+    Detect every `every` frames and track in between.
+
+    frames yields (idx, y) in order; detect(idx) returns the (boxes, scores)
+    of frame idx, scores None when there are none. The detector also runs
+    early when the tracker diverges. Yields (idx, boxes, scores, detected)
+    per frame; tracked boxes keep the score of their detection.
+    """
+    since = every
+    for idx, y in frames:
+        boxes = None
+        if since < every:
+            boxes, diverged = tracker.update(y)
+            scores = tracker.scores()
+            if diverged:
+                boxes = None
+        if boxes is None:
+            boxes, scores = detect(idx)
+            tracker.reset(y, boxes, scores)
+            since = 0
+        since += 1
+        yield idx, boxes, scores, since == 1
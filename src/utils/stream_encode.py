@@ -0,0 +1,296 @@
+import os
+import copy
+import time
+import argparse
+from ultralytics import YOLO
+
+from yuv_reader import YUVReader
+from roi_merge import merge_overlapping_rois
+from roi_saliency import SpectralResidual
+from roi_pipeline import run_pipeline
+from roi_container import ROI_EXT, QGMAP_EXT, write_roi_container, write_qg_maps
+from roi_encoder import RenditionSet, roi_offsets
+from roi_temporal import BoxSmoother, QGHysteresis
+from roi_fusion import QGFusion
+from roi_qgmap import graded_qg_offsets
+from extract_roi import (mask_rois, mask_qg_map, yolo_boxes, yolo_scores, yolo_imgsz,
+                         yuv420_to_rgb_batch, roi_weights)
+
+
+# ==============================
+# Extract + encode in one pass
+# ==============================
+# Each frame is read once, analysed into ROIs / a QG offset map and pushed
+# straight into the in-process encoder (roi_encoder.Encoder): no ROI text
+# files, no second read of the YUV by roi_x265. Stages run on threads
+# (roi_pipeline), so reading, analysis and encoding overlap.
+def make_analyser(args, width, height, model=None, qg_size=None):
+    """
+    analyse(y, u, v) -> (rois, scores, offsets) for consecutive frames of
+    one stream: rois are the merged boxes (the QG map itself with
+    --qg_map), scores the detector confidence per box (None without a
+    detector), offsets the quantOffsets map handed to the encoder, with
+    the scores as per-box weights under --graded. Motion state and the
+    --keep_alive / --ema / --qg_hold filters are kept between calls.
+    Boxes are rasterised on the encoder's qg_size when given (maps from
+    --qg_map / fused_qg are built on --qg_size, which must match it).
+    """
+    args = copy.copy(args)
+    args.width, args.height = width, height
+    sr = SpectralResidual(width, height, args.sal_width)
+    yolo_kwargs = dict(imgsz=yolo_imgsz(args, width, height),
+                       conf=0.25, iou=0.5, half=True, verbose=False)
+    prev = None
+    smoother = BoxSmoother(args.keep_alive, args.ema) if args.keep_alive or args.ema < 1.0 else None
+    hold = QGHysteresis(args.qg_hold) if args.qg_hold else None
+    fuse = None
+    if args.roi_method == 'fused_qg':
+        fuse = QGFusion(width, height, args.qg_size, args.w_motion, args.w_saliency,
+                        args.w_detector, args.t_motion, args.sal_res)
+
+    def analyse(y, u, v):
+        nonlocal prev
+        if fuse is not None:
+            boxes, scores = [], None
+            if model is not None:
+                rgb = yuv420_to_rgb_batch(y[None], u[None], v[None])
+                r = model(rgb[0], **yolo_kwargs)[0]
+                boxes, scores = yolo_boxes(r), yolo_scores(r)
+            offsets = graded_qg_offsets(fuse(y, boxes, scores))
+            if hold is not None:
+                offsets = hold(offsets)
+            return offsets, None, offsets
+        scores = None
+        if model is not None:
+            rgb = yuv420_to_rgb_batch(y[None], u[None], v[None])
+            r = model(rgb[0], **yolo_kwargs)[0]
+            rois, scores = merge_overlapping_rois(yolo_boxes(r), yolo_scores(r))
+        elif args.qg_map:
+            offsets = mask_qg_map(args.roi_method, prev, y, sr, args)
+            prev = y
+            if hold is not None:
+                offsets = hold(offsets)
+            return offsets, None, offsets
+        else:
+            rois = merge_overlapping_rois(mask_rois(args.roi_method, prev, y, sr, args))
+            prev = y
+        if smoother is not None:
+            if scores is None:
+                rois = smoother(rois)
+            else:
+                rois, scores = smoother(rois, scores)
+        offsets = roi_offsets(rois, width, height, qg_size or args.qg_size, weights=scores,
+                              graded=args.graded, feather=args.feather)
+        if hold is not None:
+            offsets = hold(offsets)
+        return rois, scores, offsets
+
+    return analyse
+
+
+def stream_encode(frames, enc, analyse, out, archive=None, depth=4):
+    """
+    Push (y, u, v) frames through analyse -> encode, writing NAL bytes to
+    `out` as the encoder returns them. With a RenditionSet, `out` is a
+    list of files, one per rendition. Per-frame (rois, scores) are
+    appended to `archive` when given. Returns (frames, stage timers).
+    """
+    count = 0
+    if isinstance(enc, RenditionSet):
+        def write(chunks):
+            for f, data in zip(out, chunks):
+                f.write(data)
+    else:
+        write = out.write
+
+    def read():
+        # copies leave the memmap / pipe buffer on the reader thread
+        for y, u, v in frames:
+            yield y.copy(), u.copy(), v.copy()
+
+    def detect(item):
+        y, u, v = item
+        rois, scores, offsets = analyse(y, u, v)
+        return y, u, v, rois, scores, offsets
+
+    def encode(item):
+        nonlocal count
+        y, u, v, rois, scores, offsets = item
+        write(enc.encode(y, u, v, offsets, pts=count))
+        if archive is not None:
+            archive.append((rois, scores))
+        count += 1
+
+    write(enc.headers())
+    timers = run_pipeline(("read", read()),
+                          [("analyse", detect), ("encode", encode)], depth=depth)
+    write(enc.flush())
+    return count, timers
+
+
+def encode_sequence(args, path, name, width, height, model, ladder, roi_dir):
+    """
+    Analyse and encode one sequence into every (preset, qp, out_dir) of
+    the ladder: one read and one analysis per frame for all renditions.
+    """
+    archive = [] if roi_dir else None
+    bitstreams = [os.path.join(out_dir, f"{name}.bin") for _, _, out_dir in ladder]
+
+    start = time.time()
+    outs = []
+    try:
+        with YUVReader(path, width, height) as yuv, \
+             RenditionSet(width, height, [dict(preset=p, qp=q) for p, q, _ in ladder],
+                          fps=args.fps, rc=args.rc, rd_level=args.rd_level,
+                          rdoq_level=args.rdoq_level, psy_rd=args.psy_rd) as enc:
+            if args.qg_map and enc.qg_size != args.qg_size:
+                raise ValueError(f"--qg_size {args.qg_size} != encoder qgSize {enc.qg_size}")
+            analyse = make_analyser(args, width, height, model, enc.qg_size)
+            outs = [open(b, "wb") for b in bitstreams]
+            n, timers = stream_encode(iter(yuv), enc, analyse, outs, archive, args.queue_depth)
+    finally:
+        for out in outs:
+            out.close()
+    elapsed = time.time() - start
+
+    if roi_dir:
+        frames = [rois for rois, _ in archive]
+        if args.qg_map:
+            write_qg_maps(os.path.join(roi_dir, name + QGMAP_EXT), frames, args.qg_size)
+        else:
+            # detector confidences are stored as the per-box scores
+            scores = [s for _, s in archive] if model is not None else None
+            write_roi_container(os.path.join(roi_dir, name + ROI_EXT), frames,
+                                width, height, scores=scores)
+
+    return {
+        "num_frames": n,
+        "total_time": elapsed,
+        "bytes": [os.path.getsize(b) for b in bitstreams],
+        "stages": {t.name: t.ms_per(n) for t in timers},
+    }
+
+
+# ==============================
+# Main
+# ==============================
+def parse_args():
+    ap = argparse.ArgumentParser(description="Extract ROIs and encode in a single pass")
+
+    ap.add_argument("--input_path", type=str, default="input_yuv/class_B")
+    ap.add_argument("--out", default="outputs/output_stream")
+    ap.add_argument("--roi_out", default="",
+                    help="also archive the ROIs as <roi_out>/<method>/<seq>.roi (.qgm with --qg_map)")
+
+    # ROI extraction, as extract_roi.py
+    ap.add_argument("--roi_method", type=str, default="motion",
+                    choices=["motion", "saliency", "fused", "fused_qg",
+                             "yolov5", "yolov8", "yolov9",
+                             "yolov10", "yolov11"])
+    ap.add_argument("--block", type=int, default=32)
+    ap.add_argument("--t_motion", type=float, default=35.0)
+    ap.add_argument("--t_saliency", type=float, default=0.15)
+    ap.add_argument("--sal_width", type=int, default=0)
+    ap.add_argument("--min_area", type=int, default=256)
+    ap.add_argument("--openvino", type=int, default=1)
+    ap.add_argument("--fullresol", type=int, default=0)
+    ap.add_argument("--qg_map", type=int, default=0,
+                    help="offset map straight from the mask (motion/saliency/fused)")
+    ap.add_argument("--qg_size", type=int, default=16)
+    ap.add_argument("--qg_thresh", type=float, default=0.5)
+    ap.add_argument("--graded", type=int, default=0,
+                    help="graded offsets from the boxes, as roi_x265 --graded")
+    ap.add_argument("--feather", type=int, default=2)
+    ap.add_argument("--keep_alive", type=int, default=0,
+                    help="frames a box outlives its last detection (0 = off)")
+    ap.add_argument("--ema", type=float, default=1.0,
+                    help="box EMA weight of the new position (1 = no smoothing)")
+    ap.add_argument("--qg_hold", type=int, default=0,
+                    help="frames a QG keeps its ROI offset, as roi_x265 --qg-hold (0 = off)")
+    ap.add_argument("--fuse_detector", type=str, default="",
+                    choices=["", "yolov5", "yolov8", "yolov9", "yolov10", "yolov11"],
+                    help="detector cue of fused_qg (empty = motion and saliency only)")
+    ap.add_argument("--w_motion", type=float, default=1.0)
+    ap.add_argument("--w_saliency", type=float, default=0.5)
+    ap.add_argument("--w_detector", type=float, default=1.0)
+    ap.add_argument("--sal_res", type=int, default=2)
+    ap.add_argument("--queue_depth", type=int, default=4)
+
+    # encoder, as encode.py
+    ap.add_argument("--qp", type=int, default=32)
+    ap.add_argument("--rc", type=int, default=2)
+    ap.add_argument("--preset", type=str, default="medium")
+    ap.add_argument("--qps", type=str, default="",
+                    help="comma-separated QP ladder, overrides --qp")
+    ap.add_argument("--presets", type=str, default="",
+                    help="comma-separated presets, overrides --preset")
+    ap.add_argument("--fps", type=int, default=15)
+    ap.add_argument("--rd_level", type=int, default=1)
+    ap.add_argument("--rdoq_level", type=int, default=0)
+    ap.add_argument("--psy_rd", type=float, default=2.0)
+
+    args = ap.parse_args()
+    if args.roi_method == 'fused_qg':
+        # archived as .qgm: the fused importance only exists as a map
+        args.qg_map = 1
+        if not args.fuse_detector:
+            args.w_detector = 0.0
+        if args.w_motion + args.w_saliency + args.w_detector <= 0:
+            ap.error("fused_qg needs a positive --w_motion, --w_saliency or --w_detector")
+    if args.qg_map and args.roi_method not in ['motion', 'saliency', 'fused', 'fused_qg']:
+        ap.error("--qg_map needs a mask-based method (motion, saliency, fused, fused_qg)")
+    if (args.keep_alive or args.ema < 1.0) and args.qg_map:
+        ap.error("--keep_alive / --ema smooth boxes, use --qg_hold with --qg_map")
+    if not 0.0 < args.ema <= 1.0:
+        ap.error("--ema must be in (0, 1]")
+    return args
+
+
+def main():
+    args = parse_args()
+    roiname, weights = roi_weights(args)
+
+    model = None
+    if weights is not None:
+        model = YOLO(weights, task='detect')
+        print(f'Loaded pretrained {weights}')
+
+    presets = args.presets.split(",") if args.presets else [args.preset]
+    qps = [int(q) for q in args.qps.split(",")] if args.qps else [args.qp]
+    ladder = []
+    for preset in presets:
+        for qp in qps:
+            out_dir = os.path.join(args.out, f"{roiname}_preset_{preset}_rdo_{args.rd_level}", f"qp{qp}")
+            os.makedirs(out_dir, exist_ok=True)
+            ladder.append((preset, qp, out_dir))
+    roi_dir = os.path.join(args.roi_out, roiname) if args.roi_out else None
+    if roi_dir:
+        os.makedirs(roi_dir, exist_ok=True)
+
+    results = {}
+    for seq in sorted(os.listdir(args.input_path)):
+        name = seq.split('.')[0]
+        _, wxh, _ = name.split('_')
+        w, h = map(int, wxh.split('x'))
+        print(f"\n=== Streaming {name} ===")
+        results[name] = encode_sequence(args, os.path.join(args.input_path, seq),
+                                        name, w, h, model, ladder, roi_dir)
+
+    print("\n==== SUMMARY ====")
+    for name, r in results.items():
+        fps = r["num_frames"] / r["total_time"] if r["total_time"] else 0.0
+        stage_str = " | ".join(f"{n} {ms:.2f}" for n, ms in r["stages"].items())
+        print(f"{name:30s} | {fps:.2f} fps")
+        for (preset, qp, _), size in zip(ladder, r["bytes"]):
+            kbps = size * 8 * args.fps / max(r["num_frames"], 1) / 1000
+            print(f"{'':30s}   {preset} qp{qp}: {kbps:.1f} kbps")
+        print(f"{'':30s}   stages (ms/frame): {stage_str}")
+
+    total = sum(r["num_frames"] for r in results.values())
+    wall = sum(r["total_time"] for r in results.values())
+    if wall:
+        print(f"\nOverall: {total} frames in {wall:.2f}s, {total / wall:.2f} fps")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import os
+import numpy as np
+
+
+# ==============================
+# YUV420p geometry
+# ==============================
+def yuv420_plane_sizes(width, height):
+    """
+    Return (y_size, uv_size, frame_size) in bytes for one 8-bit YUV420p frame.
+    """
+    y_size = width * height
+    uv_size = (width // 2) * (height // 2)
+    return y_size, uv_size, y_size + 2 * uv_size
+
+
+# ==============================
+# Memory-mapped YUV420p reader
+# ==============================
+class YUVReader:
+    """
+    Zero-copy reader for raw 8-bit YUV420p files.
+
+    The file is mapped once with np.memmap and every accessor returns a
+    view into the mapping, so pages are only read from disk when touched
+    and nothing is converted to float unless the caller does it.
+
+        with YUVReader(path, 1920, 1080) as yuv:
+            y, u, v = yuv.planes(10)          # one frame
+            Y, U, V = yuv[0:8]                # frame range (N, H, W)
+            for y, u, v in yuv: ...
+    """
+
+    def __init__(self, path, width, height, num_frames=None):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.y_size, self.uv_size, self.frame_size = yuv420_plane_sizes(width, height)
+
+        n = os.path.getsize(path) // self.frame_size
+        if num_frames is not None:
+            n = min(n, num_frames)
+        self.num_frames = n
+
+        if n > 0:
+            mm = np.memmap(path, dtype=np.uint8, mode="r",
+                           shape=(n, self.frame_size))
+            # plain ndarray view; the mapping stays alive through .base
+            self._frames = np.asarray(mm)
+        else:
+            self._frames = np.empty((0, self.frame_size), np.uint8)
+
+    # ---------- context / container protocol ----------
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._frames = None
+
+    def __len__(self):
+        return self.num_frames
+
+    def __iter__(self):
+        for idx in range(self.num_frames):
+            yield self.planes(idx)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.num_frames)
+            if step != 1:
+                raise ValueError("YUVReader only supports contiguous frame ranges")
+            return self.planes_range(start, stop)
+        return self.planes(key)
+
+    # ---------- single frame ----------
+    def _check(self, idx):
+        if idx < 0:
+            idx += self.num_frames
+        if not 0 <= idx < self.num_frames:
+            raise IndexError(f"frame {idx} out of range [0, {self.num_frames})")
+        return idx
+
+    def frame(self, idx):
+        """Packed I420 frame as a (H*3/2, W) view, ready for cv2 *_I420 conversions."""
+        idx = self._check(idx)
+        return self._frames[idx].reshape(self.height * 3 // 2, self.width)
+
+    def y(self, idx):
+        idx = self._check(idx)
+        return self._frames[idx, :self.y_size].reshape(self.height, self.width)
+
+    def u(self, idx):
+        idx = self._check(idx)
+        s = self.y_size
+        return self._frames[idx, s:s + self.uv_size].reshape(
+            self.height // 2, self.width // 2)
+
+    def v(self, idx):
+        idx = self._check(idx)
+        s = self.y_size + self.uv_size
+        return self._frames[idx, s:s + self.uv_size].reshape(
+            self.height // 2, self.width // 2)
+
+    def planes(self, idx):
+        return self.y(idx), self.u(idx), self.v(idx)
+
+    # ---------- frame ranges ----------
+    def y_range(self, start, stop):
+        raw = self._frames[start:stop]
+        return raw[:, :self.y_size].reshape(-1, self.height, self.width)
+
+    def planes_range(self, start, stop):
+        """(Y, U, V) views of shape (N, H, W) / (N, H/2, W/2) for frames [start, stop)."""
+        raw = self._frames[start:stop]
+        s0, s1 = self.y_size, self.y_size + self.uv_size
+        uv_shape = (-1, self.height // 2, self.width // 2)
+        return (
+            raw[:, :s0].reshape(-1, self.height, self.width),
+            raw[:, s0:s1].reshape(uv_shape),
+            raw[:, s1:s1 + self.uv_size].reshape(uv_shape),
+        )
+
+
+def open_yuv(path, width, height, num_frames=None):
+    """Return a YUVReader, or None if the file does not exist."""
+    if not os.path.exists(path):
+        return None
+    return YUVReader(path, width, height, num_frames)